@@ -0,0 +1,164 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+# Write-ahead journal of a Part2 batch, next to the datasheets. Worker processes each append to
+# their own file (batch_journal.worker<N>.jsonl) so no two processes write the same file.
+JOURNAL_FILENAME = "batch_journal.jsonl"
+JOURNAL_PREFIX = "batch_journal"
+
+# A device that failed this many times is given up on by --resume and listed in the report
+MAX_ATTEMPTS = 3
+
+# -------------------------
+# BATCH JOURNAL
+# -------------------------
+# One JSON line per event, flushed and fsync'd before the batch moves on, so after a crash (or an
+# Excel / Word hang that had to be killed) the journal shows exactly which devices are finished:
+#   {"type": "batch", "batch", "date_text", "backend", "devices", "time"}     once, when a batch starts
+#   {"type": "device", "key", "stage": "start" | "charts" | "docx" | "done" | "failed", "time", ...}
+# "docx" carries the output file and its verified size; "done" the digest of the device's build
+# fingerprint, so a resumed batch does not skip a device whose inputs changed since.
+
+def fingerprint_digest(fingerprint):
+    return hashlib.sha1(json.dumps(fingerprint, sort_keys=True).encode("utf-8")).hexdigest()
+
+def journal_paths(folder):
+    try:
+        names = os.listdir(folder)
+    except OSError:
+        return []
+    return [os.path.join(folder, name) for name in sorted(names) if name.startswith(JOURNAL_PREFIX) and name.endswith(".jsonl")]
+
+class BatchJournal:
+    """Appends fsync'd stage records for the devices of one batch (safe to share between threads)."""
+
+    def __init__(self, folder, digests=None, worker=None):
+        self.folder = folder
+        self.digests = digests or {}
+        self.worker = worker
+        name = JOURNAL_FILENAME if worker is None else f"{JOURNAL_PREFIX}.worker{worker}.jsonl"
+        self.path = os.path.join(folder, name)
+        self.lock = threading.Lock()
+        self.file = None
+
+    @classmethod
+    def start(cls, folder, date_text, backend, digests):
+        """Begin a new batch: the previous batch's journal files are removed."""
+        for path in journal_paths(folder):
+            os.remove(path)
+        journal = cls(folder, digests)
+        journal._write({"type": "batch", "batch": time.strftime("%Y%m%d-%H%M%S"), "date_text": date_text,
+                        "backend": backend, "devices": len(digests), "time": time.time()})
+        return journal
+
+    def for_worker(self, worker):
+        """The arguments a worker process needs to open its own journal file."""
+        return self.folder, self.digests, worker
+
+    def _write(self, record):
+        line = (json.dumps(record) + "\n").encode("utf-8")
+        with self.lock:
+            if self.file is None:
+                self.file = open(self.path, "ab")
+            self.file.write(line)
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def record(self, key, stage, **fields):
+        record = {"type": "device", "key": key, "stage": stage, "time": time.time()}
+        if stage == "done" and key in self.digests:
+            record["fingerprint"] = self.digests[key]
+        record.update(fields)
+        self._write(record)
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+# -------------------------
+# RESUME
+# -------------------------
+def load_journal(folder):
+    """
+    (batch record or None, {key: state}) from every journal file of the folder. state holds
+    attempts, done, output, size, fingerprint and the last error. A line cut short by a crash is ignored.
+    """
+    batch = None
+    devices = {}
+    records = []
+    for path in journal_paths(folder):
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+    for record in sorted(records, key=lambda r: r.get("time", 0)):
+        if record.get("type") == "batch":
+            batch = record
+            continue
+        state = devices.setdefault(record["key"], {"attempts": 0, "done": False, "output": None, "size": None,
+                                                   "fingerprint": None, "error": ""})
+        stage = record["stage"]
+        if stage == "start":
+            state["attempts"] += 1
+            state["done"] = False
+        elif stage == "docx":
+            state["output"], state["size"] = record.get("output"), record.get("size")
+        elif stage == "done":
+            state["done"] = True
+            state["fingerprint"] = record.get("fingerprint")
+        elif stage == "failed":
+            state["error"] = record.get("error", "")
+    return batch, devices
+
+def completed(state, digest):
+    """True if the journal shows the device finished with these inputs and its output is still as written."""
+    if not state["done"] or state["fingerprint"] != digest or not state["output"]:
+        return False
+    try:
+        return os.path.getsize(state["output"]) == state["size"]
+    except OSError:
+        return False
+
+def print_report(folder, keys=None):
+    """List the devices of the batch that never succeeded (all of them in the journal unless keys is given)."""
+    batch, devices = load_journal(folder)
+    if batch is None and not devices:
+        print("No batch journal found.")
+        return []
+    keys = keys if keys is not None else list(devices)
+    never = [key for key in keys if not devices.get(key, {}).get("done")]
+    print(f"Batch {batch['batch'] if batch else '?'}: {len(keys) - len(never)} of {len(keys)} devices finished")
+    if never:
+        print(f"Devices that never succeeded ({len(never)}):")
+        for key in never:
+            state = devices.get(key, {"attempts": 0, "error": "not started"})
+            gave_up = "  (gave up)" if state["attempts"] >= MAX_ATTEMPTS else ""
+            print(f"  {key}: {state['attempts']} attempt(s), last error: {state['error'] or 'interrupted'}{gave_up}")
+        retryable = sum(1 for key in never if devices.get(key, {"attempts": 0})["attempts"] < MAX_ATTEMPTS)
+        if retryable:
+            print(f"Run Part2 again with --resume to retry {retryable} of them.")
+    return never
+
+# -------------------------
+# CLI
+# -------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report on the last Part2 batch from its journal")
+    parser.add_argument("folder", help="the Data Package folder the batch wrote to")
+    args = parser.parse_args(argv)
+    print_report(args.folder)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,108 @@
+import os
+import json
+import hashlib
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+MANIFEST_FILENAME = "build_manifest.json"
+MANIFEST_VERSION = 1
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# -------------------------
+# FILE HASHING
+# -------------------------
+# Content hashes keyed by (path, size, mtime_ns): the templates are hashed once per run, not per device
+_hash_cache = {}
+
+def file_hash(path):
+    """SHA-256 of a file's contents (hex), or None if the file does not exist."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _hash_cache:
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        _hash_cache[key] = digest.hexdigest()
+    return _hash_cache[key]
+
+# -------------------------
+# FINGERPRINTS
+# -------------------------
+def build_fingerprint(raw_files, templates, fields, settings):
+    """
+    Everything an output datasheet depends on:
+      inputs     {phrase: hash of the raw file}      (None when the file is missing)
+      templates  {name: hash of the template file}
+      fields     {name: value} as written into the document (Lot_ID, Dev#, SN, SKU)
+      settings   {name: value} of the chart renderer and image settings
+    """
+    return {
+        "inputs": {phrase: file_hash(path) if path else None for phrase, path in raw_files.items()},
+        "templates": {name: file_hash(path) for name, path in templates.items()},
+        "fields": {name: str(value) for name, value in fields.items()},
+        "settings": {name: value for name, value in settings.items()},
+    }
+
+def stale_reasons(manifest, key, output_path, fingerprint):
+    """
+    Why the output of one device (key, e.g. "Lot_ID Dev#") needs rebuilding.
+    An empty list means it is up to date.
+    """
+    entry = manifest.get(key)
+    if entry is None:
+        return ["new device"]
+
+    reasons = []
+    recorded = entry.get("fingerprint", {})
+    for section in ("inputs", "templates", "fields", "settings"):
+        old, new = recorded.get(section, {}), fingerprint[section]
+        changed = sorted(name for name in set(old) | set(new) if old.get(name) != new.get(name))
+        if changed:
+            reasons.append(f"{section} changed ({', '.join(changed)})")
+    if reasons:
+        return reasons
+
+    if entry.get("output") != os.path.basename(output_path) or not os.path.exists(output_path):
+        return ["output missing"]
+    if file_hash(output_path) != entry.get("output_hash"):
+        return ["output modified"]
+    return []
+
+def record_build(manifest, key, output_path, fingerprint):
+    """Remember the fingerprint a device's output was built from, and the output's own hash."""
+    manifest[key] = {
+        "output": os.path.basename(output_path),
+        "fingerprint": fingerprint,
+        "output_hash": file_hash(output_path),
+    }
+
+# -------------------------
+# MANIFEST LOAD / SAVE
+# -------------------------
+def load_manifest(folder):
+    """Load {device key: entry} from the folder's manifest; empty when missing or unreadable."""
+    manifest_path = os.path.join(folder, MANIFEST_FILENAME)
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if payload.get("version") != MANIFEST_VERSION:
+        return {}
+    return payload.get("outputs", {})
+
+def save_manifest(manifest, folder):
+    """Write the manifest atomically next to the outputs it describes."""
+    manifest_path = os.path.join(folder, MANIFEST_FILENAME)
+    payload = {"version": MANIFEST_VERSION, "outputs": manifest}
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+    return manifest_path
@@ -0,0 +1,150 @@
+import io
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+# Size of Chart1/Chart2 on the template's "Charts" sheet; Excel exports charts at 96 dpi
+CHART_SIZE_INCHES = (7.3, 5.8)
+CHART_DPI = 96
+
+WAVELENGTH_COLOR = "#0000FF"
+SMSR_COLOR = "#FF0000"
+POWER_COLOR = "#0000FF"
+VOLTAGE_COLOR = "#FF0000"
+TEMPERATURE_LINESTYLES = ["-", "--", ":", "-."]
+
+# -------------------------
+# AXIS RULES (shared with the Excel path in update_chart_axes)
+# -------------------------
+def axes_config_from_bounds(bounds, chart_number):
+    """Pick the CHART BOUNDS rows that feed each axis of Chart1 / Chart2."""
+    if chart_number == 1:
+        # Chart 1: Wavelength vs Current (+ SMSR)
+        return {
+            'primary_y': bounds[13],    # Wavelength
+            'primary_x': bounds[7],     # Current
+            'secondary_y': bounds[10],  # SMSR
+        }
+    # Chart 2: LIV Characteristics (Power vs Current + Voltage)
+    return {
+        'primary_y': bounds[8],     # Power
+        'primary_x': bounds[12],    # Current
+        'secondary_y': bounds[9],   # Voltage
+    }
+
+def axis_limits(axes_config, chart_number):
+    """Apply the chart-specific expansions and tick units to the raw axis bounds."""
+    y_min, y_max = axes_config['primary_y']
+    x_min, x_max = axes_config['primary_x']
+    sy_min, sy_max = axes_config['secondary_y']
+
+    if chart_number == 1:
+        # Wavelength chart: very small expansion
+        sy_min = -sy_max  # SMSR axis should start from negative of max
+        y_min = y_min + 0.5  # Expand wavelength min slightly for better view
+        y_max_expanded = y_max
+        sy_max_expanded = sy_max * 1.2  # SMSR can have more room
+        x_max_expanded = x_max * 1.05   # Current: small expansion
+        y_units = (0.5, 0.1)    # 0.5nm major, 0.1nm minor for wavelength
+        sy_units = (10, 2)      # 10dB major, 2dB minor for SMSR
+    else:
+        # LIV chart: moderate expansion for power
+        y_max_expanded = max(y_max * 1, 0.05)  # Power: ensure at least 0.05W
+        sy_max_expanded = sy_max * 1.1  # Voltage: small expansion
+        x_max_expanded = x_max * 1.05   # Current: small expansion
+        y_units = (0.01, 0.002)  # 0.01W major, 0.002W minor for power
+        sy_units = (0.2, 0.05)   # 0.2V major, 0.05V minor for voltage
+
+    return {
+        'primary_y': (y_min, y_max_expanded, *y_units),
+        'primary_x': (x_min, x_max_expanded, 0.01, 0.002),  # 0.01A major, 0.002A minor for current
+        'secondary_y': (sy_min, sy_max_expanded, *sy_units),
+    }
+
+# -------------------------
+# HEADLESS RENDERING (matplotlib)
+# -------------------------
+def _set_axis(axis, which, limits):
+    from matplotlib.ticker import MultipleLocator
+
+    lo, hi, major, minor = limits
+    if which == "x":
+        axis.set_xlim(lo, hi)
+        axis.xaxis.set_major_locator(MultipleLocator(major))
+        axis.xaxis.set_minor_locator(MultipleLocator(minor))
+    else:
+        axis.set_ylim(lo, hi)
+        axis.yaxis.set_major_locator(MultipleLocator(major))
+        axis.yaxis.set_minor_locator(MultipleLocator(minor))
+
+def _new_figure():
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=CHART_SIZE_INCHES, dpi=CHART_DPI)
+    return plt, fig, ax, ax.twinx()
+
+def render_wavelength_smsr_chart(snl, output_path, scale=1.0):
+    """
+    Chart 1: peak wavelength (left) and SMSR (right) vs current, one line per temperature.
+    output_path may be a path or a binary file object; scale multiplies the export dpi.
+    """
+    plt, fig, ax, ax2 = _new_figure()
+    limits = axis_limits(axes_config_from_bounds(snl["bounds"], 1), 1)
+
+    wave_currents, wave_rows = snl["series"]["wavelength"]
+    smsr_currents, smsr_rows = snl["series"]["smsr"]
+    for i, (label, values) in enumerate(zip(snl["labels"], wave_rows)):
+        ax.plot(wave_currents, values, TEMPERATURE_LINESTYLES[i % len(TEMPERATURE_LINESTYLES)], color=WAVELENGTH_COLOR, label=label)
+    for i, (label, values) in enumerate(zip(snl["labels"], smsr_rows)):
+        ax2.plot(smsr_currents, values, TEMPERATURE_LINESTYLES[i % len(TEMPERATURE_LINESTYLES)], color=SMSR_COLOR, label=label)
+
+    _set_axis(ax, "x", limits['primary_x'])
+    _set_axis(ax, "y", limits['primary_y'])
+    _set_axis(ax2, "y", limits['secondary_y'])
+    ax.tick_params(axis="y", which="minor", direction="out")  # xlTickMarkOutside on the wavelength axis
+    ax.yaxis.get_major_formatter().set_useOffset(False)
+
+    ax.set_xlabel("Current (A)")
+    ax.set_ylabel("Wavelength (nm)")
+    ax2.set_ylabel("SMSR (dB)")
+    ax.grid(True, which="major", color="#D9D9D9")
+
+    handles, labels = ax.get_legend_handles_labels()
+    handles2, labels2 = ax2.get_legend_handles_labels()
+    fig.legend(handles + handles2, labels + labels2, loc="upper center", ncol=len(labels) + len(labels2), frameon=False)
+
+    fig.savefig(output_path, dpi=CHART_DPI * scale, format="png")
+    plt.close(fig)
+    return output_path
+
+def render_liv_chart(snl, output_path, scale=1.0):
+    """Chart 2: output power (left) and voltage (right) vs current (arguments as for Chart 1)."""
+    plt, fig, ax, ax2 = _new_figure()
+    limits = axis_limits(axes_config_from_bounds(snl["bounds"], 2), 2)
+
+    ax.plot(*snl["series"]["power"], color=POWER_COLOR)
+    ax2.plot(*snl["series"]["voltage"], color=VOLTAGE_COLOR)
+
+    _set_axis(ax, "x", limits['primary_x'])
+    _set_axis(ax, "y", limits['primary_y'])
+    _set_axis(ax2, "y", limits['secondary_y'])
+
+    ax.set_xlabel("Current (A)")
+    ax.set_ylabel("Output (W)")
+    ax2.set_ylabel("Voltage (V)")
+    ax.grid(True, which="major", color="#D9D9D9")
+
+    fig.savefig(output_path, dpi=CHART_DPI * scale, format="png")
+    plt.close(fig)
+    return output_path
+
+def render_chart_png(render, snl, scale=1.0):
+    """
+    Render a chart straight into PNG bytes. Rendering at CHART_DPI * scale gives the pixel size
+    an upscaled 96 dpi export would have, without a temp file or a resample.
+    """
+    buffer = io.BytesIO()
+    render(snl, buffer, scale)
+    return buffer.getvalue()
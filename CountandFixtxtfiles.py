@@ -1,5 +1,14 @@
 import os
+import sys
+import mmap
+import time
+import shutil
+import argparse
+import tempfile
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+from SweepIndex import scan_sweeps, single_sweep_entry, save_sweep_index
 
 # Define the folder path where the .txt files are located
 folder_path = r'C:\Users\crathod\Documents\Datasheet Automation\Script Output\Other'  # <-- Change this to your target folder
@@ -12,57 +21,213 @@ criteria = {
     "WLT_Wave": "Peak Wavelength vs I &T"
 }
 
-# List to store results
-results = []
-
-# Iterate over all files in the folder
-for filename in os.listdir(folder_path):
-    if filename.endswith('.txt'):
-        file_path = os.path.join(folder_path, filename)
-
-        # Determine which phrase to search for based on filename
-        for key, phrase in criteria.items():
-            if key in filename:
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        lines = f.readlines()
-                    
-                    # Find occurrences of the phrase in the file
-                    phrase_indices = [i for i, line in enumerate(lines) if phrase in line]
-                    count = len(phrase_indices)
-
-                    results.append({
-                        'Filename': filename,
-                        'Keyword': key,
-                        'Phrase': phrase,
-                        'Count': count
-                    })
-
-                    # If phrase occurs more than once, modify the file
-                    if count > 1:
-                        last_occurrence = phrase_indices[-1]  # Get the last occurrence index
-                        modified_lines = lines[last_occurrence:]  # Keep only lines from this point onward
-
-                        # Overwrite the original file with the modified content
-                        with open(file_path, 'w', encoding='utf-8') as f:
-                            f.writelines(modified_lines)
-
-                        print(f"Modified {filename}: Retained lines from {last_occurrence + 1} onwards.")
-
-                except Exception as e:
-                    print(f"Error processing {filename}: {e}")
-                
-                # If a file matches one criterion, we assume it doesn't match others.
+# Files are scanned concurrently; bounded so a network share is not flooded
+max_workers = min(8, (os.cpu_count() or 1) + 4)
+
+# Chunk size used when copying the retained tail of a file
+copy_chunk_size = 1024 * 1024
+
+# By default repeated sweeps are only indexed (SweepIndex sidecar) and the raw files are left as
+# they are; truncate_sweeps restores the old behaviour of cutting every earlier sweep off in place
+truncate_sweeps = False
+
+REPORT_FILENAME = "B.xlsx"
+REPORT_COLUMNS = ['Filename', 'Keyword', 'Phrase', 'Count', 'Last Offset', 'Bytes Removed', 'Seconds']
+
+def phrase_for(filename):
+    """
+    Return (keyword, phrase) for a raw file name, or None if no criterion matches.
+    If a file matches one criterion, we assume it doesn't match others.
+    """
+    for key, phrase in criteria.items():
+        if key in filename:
+            return key, phrase
+    return None
+
+def scan_for_phrase(file_path, phrase):
+    """
+    Count occurrences of phrase with a memory-mapped scan (no line splitting).
+    Returns (count, byte offset of the start of the line holding the last occurrence, file size).
+    """
+    size = os.path.getsize(file_path)
+    if size == 0:
+        return 0, None, 0
+
+    needle = phrase.encode('utf-8')
+    with open(file_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        # Last occurrence first, scanning backward from the end of the file
+        last = mm.rfind(needle)
+        if last < 0:
+            return 0, None, size
+
+        count = 0
+        pos = mm.find(needle)
+        while pos >= 0:
+            count += 1
+            # Count lines, like the line-by-line scan did: skip to the end of this line
+            line_end = mm.find(b"\n", pos + len(needle))
+            if line_end < 0:
                 break
+            pos = mm.find(needle, line_end)
+
+        line_start = mm.rfind(b"\n", 0, last) + 1
+    return count, line_start, size
+
+def keep_tail(file_path, offset):
+    """Replace the file with its bytes from offset onward, via a temp file and an atomic rename."""
+    folder = os.path.dirname(file_path) or "."
+    fd, tmp_path = tempfile.mkstemp(prefix=".fix_", suffix=".tmp", dir=folder)
+    try:
+        with os.fdopen(fd, 'wb') as out, open(file_path, 'rb') as src:
+            src.seek(offset)
+            while True:
+                chunk = src.read(copy_chunk_size)
+                if not chunk:
+                    break
+                out.write(chunk)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def copy_counting_phrase(source_file, destination_file, phrase):
+    """
+    Copy a file in chunks (keeping its timestamps, like shutil.copy2) while counting the phrase,
+    so the copy step already knows which files hold a single sweep.
+    """
+    needle = phrase.encode('utf-8')
+    count = 0
+    overlap = b""
+    with open(source_file, 'rb') as src, open(destination_file, 'wb') as out:
+        while True:
+            chunk = src.read(copy_chunk_size)
+            if not chunk:
+                break
+            out.write(chunk)
+            # Carry the last len(needle) - 1 bytes over so a phrase split across chunks is still found
+            window = overlap + chunk
+            count += window.count(needle)
+            overlap = window[-(len(needle) - 1):] if len(needle) > 1 else b""
+    shutil.copystat(source_file, destination_file)
+    return count
+
+def _report_row(filename, key, phrase, count=0):
+    return {
+        'Filename': filename,
+        'Keyword': key,
+        'Phrase': phrase,
+        'Count': count,
+        'Last Offset': None,
+        'Bytes Removed': 0,
+        'Seconds': 0.0,
+    }
+
+def fix_file(file_path, truncate=False):
+    """
+    Count the sweep header in one file and index its sweeps (or, with truncate, keep only the
+    last sweep). Returns (report row, sweep index entry or None).
+    """
+    filename = os.path.basename(file_path)
+
+    # Determine which phrase to search for based on filename
+    match = phrase_for(filename)
+    if match is None:
+        return None, None
+    key, phrase = match
+
+    start = time.perf_counter()
+    result = _report_row(filename, key, phrase)
+    entry = None
+    try:
+        if truncate:
+            count, last_offset, size = scan_for_phrase(file_path, phrase)
+            result['Count'] = count
+            result['Last Offset'] = last_offset
+
+            # If phrase occurs more than once, keep only the last sweep
+            if count > 1 and last_offset:
+                keep_tail(file_path, last_offset)
+                result['Bytes Removed'] = last_offset
+                print(f"Modified {filename}: Retained bytes from offset {last_offset} onwards ({size - last_offset} of {size} bytes).")
+        else:
+            entry = scan_sweeps(file_path, phrase)
+            result['Count'] = entry['count']
+            if entry['sweeps']:
+                result['Last Offset'] = entry['sweeps'][-1]['offset']
+
+    except Exception as e:
+        print(f"Error processing {filename}: {e}")
+
+    result['Seconds'] = round(time.perf_counter() - start, 4)
+    return result, entry
+
+def update_sweep_indexes(entries):
+    """Merge {file path: entry} into the sweep index sidecar of each folder involved."""
+    by_folder = {}
+    for file_path, entry in entries.items():
+        by_folder.setdefault(os.path.dirname(file_path), {})[os.path.basename(file_path)] = entry
+    for folder, folder_entries in by_folder.items():
+        # save_sweep_index merges with what is on disk at write time, not at some earlier load
+        save_sweep_index(folder_entries, folder)
+
+def fix_files(file_paths, known_counts=None, report_path=None, truncate=None):
+    """
+    Index the sweeps of a list of raw .txt files (or, with truncate, cut them down to the last
+    sweep in place) and return the report rows.
+    known_counts maps file path -> header count already found by the caller (e.g. while copying);
+    files known to hold a single sweep are reported without being opened again.
+    When report_path is given the rows are also written there as the B.xlsx report.
+    """
+    if truncate is None:
+        truncate = truncate_sweeps
+    known_counts = known_counts or {}
+    results = []
+    entries = {}
+    to_scan = []
+    for file_path in file_paths:
+        if not file_path.endswith('.txt'):
+            continue
+        filename = os.path.basename(file_path)
+        match = phrase_for(filename)
+        if match is None:
+            continue
+        known = known_counts.get(file_path)
+        if known is not None and known <= 1:
+            results.append(_report_row(filename, match[0], match[1], known))
+            if not truncate:
+                entries[file_path] = single_sweep_entry(file_path, match[1], known)
+        else:
+            to_scan.append(file_path)
 
-# Create a DataFrame from the results
-df = pd.DataFrame(results)
+    # Process the remaining files with a bounded pool
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for file_path, (result, entry) in zip(to_scan, pool.map(lambda path: fix_file(path, truncate), to_scan)):
+            if result is not None:
+                results.append(result)
+            if entry is not None:
+                entries[file_path] = entry
+    results.sort(key=lambda row: row['Filename'])
+    if entries:
+        update_sweep_indexes(entries)
 
-# Define the output Excel file path
-output_excel = os.path.join(folder_path, "B.xlsx")
+    if report_path:
+        # Write the results to an Excel file
+        pd.DataFrame(results, columns=REPORT_COLUMNS).to_excel(report_path, index=False)
+        print(f"Results have been written to {report_path}")
+    return results
 
-# Write the DataFrame to an Excel file
-df.to_excel(output_excel, index=False)
+def main(folder=folder_path, truncate=None):
+    # Process all .txt files in the folder
+    file_paths = [os.path.join(folder, filename) for filename in sorted(os.listdir(folder)) if filename.endswith('.txt')]
+    batch_start = time.perf_counter()
+    results = fix_files(file_paths, report_path=os.path.join(folder, REPORT_FILENAME), truncate=truncate)
+    print(f"Processing complete: {len(results)} files in {time.perf_counter() - batch_start:.2f} s.")
 
-print(f"Results have been written to {output_excel}")
-print("Processing complete.")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index (or cut down) repeated sweeps in raw .txt files")
+    parser.add_argument("folder", nargs="?", default=folder_path)
+    parser.add_argument("--truncate", action="store_true",
+                        help="old behaviour: rewrite each file keeping only its last sweep")
+    args = parser.parse_args()
+    main(args.folder, args.truncate or None)
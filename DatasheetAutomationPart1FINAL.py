@@ -1,218 +1,327 @@
 import os
+import sys
 import shutil
+import argparse
 import pandas as pd
-import subprocess
-import re
+from concurrent.futures import ThreadPoolExecutor
+
+from DeviceFileIndex import parse_filename, build_device_index, save_device_index
+from SkuResolver import SkuResolver
+from CountandFixtxtfiles import REPORT_FILENAME, phrase_for, scan_for_phrase, copy_counting_phrase, fix_files
+from PipelineTrace import PipelineTrace, set_active_trace, trace_path_for, debug
+
+try:
+    import fcntl  # Reflinks (copy-on-write clones) are only attempted where fcntl exists
+except ImportError:
+    fcntl = None
 
 # -------------------------
 # CONFIGURATION - Set your paths here
 # -------------------------
 source_folder = r"C:\Users\crathod\Documents\Datasheet Automation\Paste Raw Data HERE"  # Folder A - Source folder
 destination_folder = r"C:\Users\crathod\Documents\Datasheet Automation\Script Output"  # Folder B - Destination folder
-fix_script_path = r"C:\Users\crathod\Documents\Datasheet Automation\CountandFixtxtfiles.py"  # Full path to the FIX script
+sku_template_path = r"C:\Users\crathod\Documents\Datasheet Automation\Datasheet Graph Template 1.xlsm"  # Key sheet with the SKUs
 
 # Create subfolders in destination folder
 liv_folder = os.path.join(destination_folder, "LIV")
 smsr_folder = os.path.join(destination_folder, "SMSR")
 other_folder = os.path.join(destination_folder, "Other")
 
-os.makedirs(liv_folder, exist_ok=True)
-os.makedirs(smsr_folder, exist_ok=True)
-os.makedirs(other_folder, exist_ok=True)
+# Ingest settings
+ingest_workers = 8          # Parallel copies; bounded so the network share is not flooded
+ingest_link_mode = "auto"   # "auto": hard link, then reflink, then copy; "copy": always copy
+FICLONE = 0x40049409        # Linux ioctl that clones a file's extents (btrfs, XFS, ...)
 
 # -------------------------
 # SKU LOOKUP FUNCTIONALITY
 # -------------------------
 def load_sku_lookup_table():
-    """Load the SKU lookup table from the Excel template"""
+    """Load the SKU lookup table from the Excel template (compiled once, cached until the template changes)"""
     try:
-        template_path = r"C:\Users\crathod\Documents\Datasheet Automation\Datasheet Graph Template 1.xlsm"
-        key_df = pd.read_excel(template_path, sheet_name='Key')
-        print(f"Loaded SKU lookup table with {len(key_df)} entries")
-        return key_df
+        resolver = SkuResolver.from_template(sku_template_path)
+        print(f"Loaded SKU lookup table with {len(resolver.entries)} entries")
+        return resolver
     except Exception as e:
         print(f"Warning: Could not load SKU lookup table: {e}")
         return None
 
-def find_sku_for_device(lot_id, dev_num, key_df=None):
+def find_sku_for_device(lot_id, dev_num, resolver=None, resolved=None):
     """
     Find the appropriate SKU for a device based on its Lot_ID and Dev#
+    resolved is an entry of SkuResolver.resolve_batch() when the batch was already resolved.
     """
-    if key_df is None:
+    if resolver is None:
         return None
-        
-    # Extract wavelength and device type from Lot_ID
-    # Pattern: "795-DBRL051525B-G11X" -> wavelength=795, type=DBRL
-    match = re.match(r'(\d+(?:\.\d+)?)-([A-Z]+)', lot_id)
-    if not match:
+
+    if resolved is None:
+        resolved = resolver.resolve_batch([lot_id])[lot_id]
+    if resolved is None:
         print(f"Could not parse Lot_ID for SKU lookup: {lot_id}")
         return None
-    
-    wavelength = float(match.group(1))
-    device_type = match.group(2)
-    
-    # Find matching SKUs in the key sheet
-    matching_skus = []
-    
-    for sku in key_df['SKU'].dropna():
-        # Check if SKU starts with the wavelength (allowing for close matches)
-        sku_match = re.match(r'(\d+(?:\.\d+)?)', str(sku))
-        if sku_match:
-            sku_wavelength = float(sku_match.group(1))
-            # Allow for close wavelength matches (within 5nm)
-            if abs(sku_wavelength - wavelength) <= 5:
-                # Check if device type is in the SKU
-                if device_type in str(sku):
-                    # Calculate priority: prefer more specific matches (longer device type names)
-                    # Also prefer closer wavelength matches
-                    wavelength_diff = abs(sku_wavelength - wavelength)
-                    
-                    # Extract the device type part from SKU for specificity scoring
-                    sku_device_part = re.search(r'[A-Z]+(?:LITE)?', str(sku))
-                    specificity_score = len(sku_device_part.group()) if sku_device_part else 0
-                    
-                    # Higher specificity score is better (DBRLITE > DBRL)
-                    matching_skus.append((sku, wavelength_diff, -specificity_score))
-    
-    if matching_skus:
-        # Sort by wavelength closeness, then by specificity (more specific first), then by name length
-        matching_skus.sort(key=lambda x: (x[1], x[2], len(x[0])))
-        best_match = matching_skus[0][0]
-        print(f"Found SKU for {wavelength}nm {device_type}: {best_match} (from {len(matching_skus)} matches)")
+
+    wavelength, device_type, best_match, match_count = resolved
+    if best_match:
+        debug(f"Found SKU for {wavelength}nm {device_type}: {best_match} (from {match_count} matches)")
         return best_match
     else:
         print(f"No matching SKU found for wavelength={wavelength}, type={device_type}")
         return None
 
-# Load the SKU lookup table once
-sku_lookup_table = load_sku_lookup_table()
-
 # -------------------------
 # SECTION 1 - Copy Files & Categorize
 # -------------------------
-for filename in os.listdir(source_folder):
-    source_file = os.path.join(source_folder, filename)
-    destination_file = os.path.join(destination_folder, filename)
-
-    # Copy all files to B
-    shutil.copy2(source_file, destination_file)
-
-    # Now sort into folders based on file type and name
+def classify_file(filename):
+    """
+    Decide where a file from the source folder ends up, before anything is written.
+    Returns the destination folder, or None for file types no later stage reads.
+    """
     if filename.endswith(".jpg"):
         if "LIV_vs_Temp" in filename:
-            shutil.move(destination_file, os.path.join(liv_folder, filename))
+            return liv_folder
         elif "SMSR_vs_Temp" in filename:
-            shutil.move(destination_file, os.path.join(smsr_folder, filename))
+            return smsr_folder
     elif filename.endswith(".txt"):
-        shutil.move(destination_file, os.path.join(other_folder, filename))
+        return other_folder
+    return None
+
+def reflink_file(source_file, destination_file):
+    """Clone source into destination without copying data. Returns False where unsupported."""
+    if fcntl is None:
+        return False
+    try:
+        with open(source_file, 'rb') as src, open(destination_file, 'wb') as out:
+            fcntl.ioctl(out.fileno(), FICLONE, src.fileno())
+    except OSError:
+        if os.path.exists(destination_file):
+            os.remove(destination_file)
+        return False
+    shutil.copystat(source_file, destination_file)
+    return True
+
+def place_file(source_file, destination_file, link_mode=ingest_link_mode):
+    """
+    Write one file to its final destination, once.
+    Hard links and reflinks are tried first (they cost no data transfer when source and
+    destination share a filesystem); otherwise the file is copied with copy2.
+    For raw .txt files the sweep headers are counted too. Returns (method, header count or None).
+    """
+    if os.path.lexists(destination_file):
+        os.remove(destination_file)
+
+    # Hard links are safe: the FIX step replaces truncated files instead of editing them in place
+    method = None
+    if link_mode == "auto":
+        try:
+            os.link(source_file, destination_file)
+            method = "link"
+        except OSError:
+            if reflink_file(source_file, destination_file):
+                method = "reflink"
+
+    filename = os.path.basename(source_file)
+    match = phrase_for(filename) if filename.endswith(".txt") else None
+    if method is None:
+        if match:
+            # Count headers on the way through so the file is read only once
+            return "copy", copy_counting_phrase(source_file, destination_file, match[1])
+        shutil.copy2(source_file, destination_file)
+        return "copy", None
+    if match:
+        return method, scan_for_phrase(destination_file, match[1])[0]
+    return method, None
+
+def ingest_files(skip_unconsumed=False, link_mode=ingest_link_mode, filenames=None):
+    """
+    Copy every file from the source folder straight into LIV/SMSR/Other with a bounded pool.
+    Files of other types go to the Script Output root as before, or are skipped entirely with
+    skip_unconsumed. filenames limits the ingest to those files (the watch daemon's new files).
+    Returns (raw .txt paths in Other, {path: header count}).
+    """
+    for folder in (liv_folder, smsr_folder, other_folder):
+        os.makedirs(folder, exist_ok=True)
 
-print("SECTION 1 complete: Files copied and organized.")
+    jobs = []
+    skipped = 0
+    for filename in (os.listdir(source_folder) if filenames is None else filenames):
+        source_file = os.path.join(source_folder, filename)
+        if not os.path.isfile(source_file):
+            continue
+        folder = classify_file(filename)
+        if folder is None:
+            if skip_unconsumed:
+                skipped += 1
+                continue
+            folder = destination_folder
+        jobs.append((source_file, os.path.join(folder, filename)))
+
+    with ThreadPoolExecutor(max_workers=ingest_workers) as pool:
+        placed = list(pool.map(lambda job: place_file(job[0], job[1], link_mode), jobs))
+
+    # Raw .txt files that end up in "Other", and the sweep header count seen while placing them
+    fix_file_paths = []
+    header_counts = {}
+    methods = {}
+    for (_, destination_file), (method, header_count) in zip(jobs, placed):
+        methods[method] = methods.get(method, 0) + 1
+        if os.path.dirname(destination_file) == other_folder:
+            fix_file_paths.append(destination_file)
+            if header_count is not None:
+                header_counts[destination_file] = header_count
+
+    summary = ", ".join(f"{count} {method}" for method, count in sorted(methods.items()))
+    print(f"SECTION 1 complete: {len(jobs)} files placed ({summary or 'none'}), {skipped} skipped.")
+    return fix_file_paths, header_counts
 
 # -------------------------
 # SECTION 2 - Generate Excel file listing devices in LIV
 # -------------------------
+def list_liv_devices():
+    """[(filename, Lot_ID, Dev#)] of the devices in the LIV folder, first image per device."""
+    device_keys = []
+    device_set = set()  # To avoid duplicates
+
+    for filename in os.listdir(liv_folder):
+        if filename.endswith(".jpg"):
+            try:
+                lot_id, dev_num = parse_filename(filename)
+
+                # Create a unique identifier to avoid duplicates
+                device_key = (lot_id, dev_num)
+
+                if device_key not in device_set:
+                    device_set.add(device_key)
+                    device_keys.append((filename, lot_id, dev_num))
+            except ValueError as e:
+                print(f"Could not parse {filename}: {e}")
+    return device_keys
+
+def device_list_rows(sku_lookup_table, device_keys):
+    """Devices.xlsx rows (blank SN, SKU looked up) for the given devices."""
+    # Resolve the SKUs of the whole batch at once: each distinct Lot_ID wavelength/type is looked up once
+    resolved = sku_lookup_table.resolve_batch([lot_id for _, lot_id, _ in device_keys]) if sku_lookup_table else {}
 
-# Extract Lot_ID and Dev# from filenames and write to Excel
-devices = []
-device_set = set()  # To avoid duplicates
+    devices = []
+    for filename, lot_id, dev_num in device_keys:
+        # Attempt to find SKU for this device
+        sku = find_sku_for_device(lot_id, dev_num, sku_lookup_table, resolved.get(lot_id))
 
-def parse_filename(filename):
+        devices.append({
+            "Lot_ID": lot_id,
+            "Dev#": dev_num,
+            "SN": "",  # Blank column for Serial Number
+            "SKU": sku if sku else ""  # Use found SKU or blank
+        })
+
+        if sku:
+            debug(f"Successfully parsed: {filename} -> Lot_ID: {lot_id}, Dev#: {dev_num}, SKU: {sku}")
+        else:
+            debug(f"Successfully parsed: {filename} -> Lot_ID: {lot_id}, Dev#: {dev_num} (no SKU found)")
+
+    return devices
+
+def save_device_list(df):
+    # Create Excel file with renamed sheet
+    excel_path = os.path.join(destination_folder, "Devices.xlsx")
+    with pd.ExcelWriter(excel_path, engine="xlsxwriter") as writer:
+        df.to_excel(writer, sheet_name="Devices", index=False)
+    return excel_path
+
+def write_device_list(sku_lookup_table):
+    """Extract Lot_ID and Dev# from the LIV image names and write Devices.xlsx."""
+    devices = device_list_rows(sku_lookup_table, list_liv_devices())
+
+    # Create DataFrame
+    df = pd.DataFrame(devices, columns=["Lot_ID", "Dev#", "SN", "SKU"])
+    excel_path = save_device_list(df)
+
+    print(f"SECTION 2 complete: Devices.xlsx created at {excel_path}")
+    return excel_path
+
+def update_device_list(sku_lookup_table):
+    """
+    Append devices that are new in LIV to an existing Devices.xlsx, keeping every row (and the SN
+    and SKU values typed into it) as it is. Returns the number of devices added.
+    """
+    excel_path = os.path.join(destination_folder, "Devices.xlsx")
+    if not os.path.exists(excel_path):
+        write_device_list(sku_lookup_table)
+        return len(list_liv_devices())
+
+    existing = pd.read_excel(excel_path, sheet_name="Devices", dtype=object)
+    known = {(str(lot_id).strip(), str(dev_num).strip()) for lot_id, dev_num in zip(existing["Lot_ID"], existing["Dev#"])}
+    new_keys = [key for key in list_liv_devices() if (key[1], key[2]) not in known]
+    if not new_keys:
+        return 0
+
+    added = pd.DataFrame(device_list_rows(sku_lookup_table, new_keys), columns=["Lot_ID", "Dev#", "SN", "SKU"])
+    save_device_list(pd.concat([existing, added], ignore_index=True))
+    print(f"Devices.xlsx: {len(new_keys)} devices added ({len(existing) + len(new_keys)} total)")
+    return len(new_keys)
+
+# -------------------------
+# SECTION 3 - Run the FIX step
+# -------------------------
+def run_fix_step(fix_file_paths, header_counts, truncate=False):
     """
-    Parse filename to extract Lot_ID and Dev#
-    Example formats:
-    - 795-DBRL051525B-G11X_DryEtch-37-131_0.0900A_LIV_vs_Temp.jpg
-    - 852-DBRL051723C-G2X-25-79_0.1500A_LIV_vs_Temp.jpg
+    In-process, on exactly the files Section 1 placed into "Other"; files already seen to hold a
+    single sweep are not opened again. Repeated sweeps are indexed, not cut off, unless truncate is set.
     """
     try:
-        # Remove the file extension and measurement type suffix
-        base_name = filename.replace(".jpg", "")
-        base_name = base_name.replace("_LIV_vs_Temp", "").replace("_SpecWidth", "").replace("_Wave-SMSR_vs_Temp", "").replace("_WLT_SMSR", "").replace("_WLT_Wave", "")
-        
-        # Remove the current measurement part (e.g., _0.0900A, _0.1500A)
-        if "_0." in base_name:
-            base_name = base_name.split("_0.")[0]
-        
-        # Handle different patterns
-        if "G11X_DryEtch-" in base_name:
-            # Pattern: 795-DBRL051525B-G11X_DryEtch-37-131
-            parts = base_name.split("_DryEtch-")
-            lot_id = parts[0]  # 795-DBRL051525B-G11X
-            dev_num = parts[1]  # 37-131
-        elif "G2X-" in base_name:
-            # Pattern: 852-DBRL051723C-G2X-25-79
-            parts = base_name.split("-")
-            lot_id = "-".join(parts[:3])  # 852-DBRL051723C-G2X
-            dev_num = "-".join(parts[3:5])  # 25-79
-        else:
-            # Generic fallback - look for pattern ending with X followed by dash and device numbers
-            import re
-            # Look for pattern: (anything)X-(digits)-(digits)
-            match = re.match(r'(.+X)(?:_DryEtch)?-(\d+-\d+)', base_name)
-            if match:
-                lot_id = match.group(1)
-                dev_num = match.group(2)
-            else:
-                # Try to split by dashes and find reasonable components
-                parts = base_name.split("-")
-                if len(parts) >= 5:
-                    # Assume first 3 parts are lot_id, last 2 are device
-                    lot_id = "-".join(parts[:3])
-                    dev_num = "-".join(parts[-2:])
-                else:
-                    raise ValueError("Cannot determine lot_id and dev_num from filename structure")
-        
-        return lot_id, dev_num
+        fix_results = fix_files(fix_file_paths, known_counts=header_counts,
+                                report_path=os.path.join(other_folder, REPORT_FILENAME), truncate=truncate)
+        fixed_count = sum(1 for row in fix_results if row['Count'] > 1)
+        skipped_count = sum(1 for path, count in header_counts.items() if count <= 1)
+        print(f"SECTION 3 complete: FIX step checked {len(fix_results)} files "
+              f"({fixed_count} with repeated sweeps {'truncated' if truncate else 'indexed'}, "
+              f"{skipped_count} single-sweep files skipped).")
+        return fix_results
     except Exception as e:
-        raise ValueError(f"Parsing failed: {e}")
-
-for filename in os.listdir(liv_folder):
-    if filename.endswith(".jpg"):
-        try:
-            lot_id, dev_num = parse_filename(filename)
-            
-            # Create a unique identifier to avoid duplicates
-            device_key = (lot_id, dev_num)
-            
-            if device_key not in device_set:
-                device_set.add(device_key)
-                
-                # Attempt to find SKU for this device
-                sku = find_sku_for_device(lot_id, dev_num, sku_lookup_table)
-                
-                devices.append({
-                    "Lot_ID": lot_id,
-                    "Dev#": dev_num,
-                    "SN": "",  # Blank column for Serial Number
-                    "SKU": sku if sku else ""  # Use found SKU or blank
-                })
-                
-                if sku:
-                    print(f"Successfully parsed: {filename} -> Lot_ID: {lot_id}, Dev#: {dev_num}, SKU: {sku}")
-                else:
-                    print(f"Successfully parsed: {filename} -> Lot_ID: {lot_id}, Dev#: {dev_num} (no SKU found)")
-        except ValueError as e:
-            print(f"Could not parse {filename}: {e}")
-
-# Create DataFrame
-df = pd.DataFrame(devices, columns=["Lot_ID", "Dev#", "SN", "SKU"])
-
-# Create Excel file with renamed sheet
-excel_path = os.path.join(destination_folder, "Devices.xlsx")
-with pd.ExcelWriter(excel_path, engine="xlsxwriter") as writer:
-    df.to_excel(writer, sheet_name="Devices", index=False)
-
-print(f"SECTION 2 complete: Devices.xlsx created at {excel_path}")
+        print(f"Error running FIX step: {e}")
+        return []
 
 # -------------------------
-# SECTION 3 - Run the FIX script
+# SECTION 4 - Build the device file index
 # -------------------------
-try:
-    python_executable = r"C:\Users\crathod\Documents\Datasheet Automation\env\Scripts\python.exe"
-    subprocess.run([python_executable, fix_script_path], check=True)
-    print("SECTION 3 complete: FIX script executed.")
-except subprocess.CalledProcessError as e:
-    print(f"Error running FIX script: {e}")
-except FileNotFoundError:
-    print(f"FIX script not found at {fix_script_path}")
-
-print("All sections complete.")
+def build_index():
+    """
+    One pass over "Other" so Part2 can look files up by (Lot_ID, Dev#, type) instead of scanning.
+    Built last: the FIX step writes into "Other", which would mark an earlier index as stale.
+    """
+    device_file_index = build_device_index(other_folder)
+    index_path = save_device_index(device_file_index, other_folder)
+    print(f"SECTION 4 complete: Device file index with {len(device_file_index)} entries saved to {index_path}")
+    return device_file_index
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Datasheet automation part 1: ingest raw data and list devices")
+    parser.add_argument("--skip-unconsumed", action="store_true",
+                        help="do not copy files that no later stage reads (anything but LIV/SMSR .jpg and .txt)")
+    parser.add_argument("--copy-only", action="store_true",
+                        help="always copy files instead of hard linking or reflinking them")
+    parser.add_argument("--truncate-sweeps", action="store_true",
+                        help="rewrite raw files with repeated sweeps to keep only the last one (default: index them)")
+    parser.add_argument("--verbose", action="store_true", help="print every parsed device and SKU match")
+    args = parser.parse_args(argv)
+
+    # Section timings go to the same JSON lines trace as Part2's, next to Devices.xlsx
+    os.makedirs(destination_folder, exist_ok=True)
+    trace = set_active_trace(PipelineTrace(trace_path_for(destination_folder), "Part1", verbose=args.verbose))
+
+    # Load the SKU lookup table once
+    with trace.span("sku_table"):
+        sku_lookup_table = load_sku_lookup_table()
+
+    with trace.span("ingest"):
+        fix_file_paths, header_counts = ingest_files(args.skip_unconsumed, "copy" if args.copy_only else "auto")
+    with trace.span("device_list"):
+        write_device_list(sku_lookup_table)
+    with trace.span("fix", files=len(fix_file_paths)):
+        run_fix_step(fix_file_paths, header_counts, args.truncate_sweeps)
+    with trace.span("index"):
+        build_index()
+
+    trace.summary()
+    print("All sections complete.")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
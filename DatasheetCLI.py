@@ -0,0 +1,379 @@
+import os
+import sys
+import time
+import argparse
+import importlib
+import subprocess
+import configparser
+import zipfile
+import xml.etree.ElementTree as ET
+
+# Only the standard library is imported up front. pandas, NumPy, win32com, python-docx and PIL
+# are loaded by the modules a subcommand imports, so quick commands (status, devices, config)
+# start in a fraction of a second.
+_STARTED = time.perf_counter()
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+CONFIG_FILENAME = "datasheet.ini"
+CONFIG_ENV_VAR = "DATASHEET_CONFIG"
+
+# Used when the config file is missing or leaves a setting out
+DEFAULT_CONFIG = {
+    "paths": {
+        "source_folder": r"C:\Users\crathod\Documents\Datasheet Automation\Paste Raw Data HERE",
+        "output_folder": r"C:\Users\crathod\Documents\Datasheet Automation\Script Output",
+        "excel_template": r"C:\Users\crathod\Documents\Datasheet Automation\Datasheet Graph Template 1.xlsm",
+        "word_template": r"C:\Users\crathod\Documents\Datasheet Automation\Datasheet Template.docx",
+    },
+    "ingest": {
+        "link_mode": "auto",            # auto: hard link, then reflink, then copy; copy: always copy
+        "skip_unconsumed": "no",
+    },
+    "build": {
+        "backend": "excel",             # excel or matplotlib
+        "workers": "1",
+        "measurement_cache": "yes",
+        "workbooks": "no",              # also save each device's filled .xlsm next to its datasheet
+    },
+}
+
+# Module-level path settings of each script, filled from the [paths] section
+MODULE_PATHS = {
+    "DatasheetAutomationPart1FINAL": {
+        "source_folder": "source_folder", "destination_folder": "output_folder", "liv_folder": "liv_folder",
+        "smsr_folder": "smsr_folder", "other_folder": "other_folder", "sku_template_path": "excel_template",
+    },
+    "Datasheet_Automation_Part2_FINAL_V3": {
+        "destination_folder": "output_folder", "data_package_folder": "data_package_folder",
+        "other_folder": "other_folder", "measurement_cache_folder": "measurement_cache_folder",
+        "excel_template_path": "excel_template", "word_template_path": "word_template",
+    },
+    "CountandFixtxtfiles": {"folder_path": "other_folder"},
+    "DatasheetReview": {"input_folder": "data_package_folder"},
+}
+
+# Quick commands must stay under this (interpreter start included) and not load these modules
+STARTUP_BUDGET_SECONDS = 1.0
+QUICK_COMMANDS = [["status"], ["devices"], ["config"]]
+HEAVY_MODULES = ["pandas", "numpy", "win32com", "comtypes", "docx", "PIL", "matplotlib", "openpyxl"]
+
+SPREADSHEET_NS = {"m": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+RELATIONSHIP_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+
+# -------------------------
+# CONFIG FILE
+# -------------------------
+def default_config_path():
+    return os.environ.get(CONFIG_ENV_VAR) or os.path.join(os.path.dirname(os.path.abspath(__file__)), CONFIG_FILENAME)
+
+def load_config(path=None):
+    """The defaults, overridden by the config file when it exists. Returns (config, path read or None)."""
+    config = configparser.ConfigParser(interpolation=None)
+    config.read_dict(DEFAULT_CONFIG)
+    path = path or default_config_path()
+    read = config.read(path, encoding="utf-8")
+    return config, (path if read else None)
+
+def resolved_paths(config):
+    """[paths] plus the folders the scripts derive from the output folder."""
+    paths = dict(config["paths"])
+    output_folder = paths["output_folder"]
+    paths.setdefault("liv_folder", os.path.join(output_folder, "LIV"))
+    paths.setdefault("smsr_folder", os.path.join(output_folder, "SMSR"))
+    paths.setdefault("other_folder", os.path.join(output_folder, "Other"))
+    paths.setdefault("data_package_folder", os.path.join(output_folder, "Data Package"))
+    paths.setdefault("measurement_cache_folder", os.path.join(output_folder, "Measurement Cache"))
+    return paths
+
+def load_module(name, config):
+    """Import a script only now, and point its module-level path settings at the configured folders."""
+    module = importlib.import_module(name)
+    paths = resolved_paths(config)
+    for attribute, key in MODULE_PATHS.get(name, {}).items():
+        setattr(module, attribute, paths[key])
+    return module
+
+def write_config(path, config):
+    with open(path, "w", encoding="utf-8") as f:
+        config.write(f)
+    print(f"Config written to {path}")
+
+# -------------------------
+# QUICK COMMANDS (standard library only)
+# -------------------------
+def read_sheet_rows(xlsx_path, sheet_name):
+    """Rows of one sheet as lists of cell text, read straight from the .xlsx zip (no pandas)."""
+    with zipfile.ZipFile(xlsx_path) as xlsx:
+        shared = []
+        if "xl/sharedStrings.xml" in xlsx.namelist():
+            for item in ET.fromstring(xlsx.read("xl/sharedStrings.xml")).iterfind("m:si", SPREADSHEET_NS):
+                shared.append("".join(text.text or "" for text in item.iter(f"{{{SPREADSHEET_NS['m']}}}t")))
+        workbook = ET.fromstring(xlsx.read("xl/workbook.xml"))
+        rels = ET.fromstring(xlsx.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels}
+        sheet_part = None
+        for sheet in workbook.iterfind("m:sheets/m:sheet", SPREADSHEET_NS):
+            if sheet.get("name") == sheet_name:
+                target = targets[sheet.get(RELATIONSHIP_ID)].lstrip("/")
+                sheet_part = target if target.startswith("xl/") else "xl/" + target
+        if sheet_part is None:
+            raise ValueError(f"No sheet named {sheet_name!r} in {xlsx_path}")
+        rows = []
+        for row in ET.fromstring(xlsx.read(sheet_part)).iterfind("m:sheetData/m:row", SPREADSHEET_NS):
+            cells = {}
+            for cell in row.iterfind("m:c", SPREADSHEET_NS):
+                column = column_index(cell.get("r"))
+                value = cell.find("m:v", SPREADSHEET_NS)
+                if cell.get("t") == "s" and value is not None:
+                    cells[column] = shared[int(value.text)]
+                elif cell.get("t") == "inlineStr":
+                    cells[column] = "".join(text.text or "" for text in cell.iter(f"{{{SPREADSHEET_NS['m']}}}t"))
+                elif value is not None:
+                    cells[column] = value.text or ""
+            rows.append([cells.get(column, "") for column in range(max(cells) + 1)] if cells else [])
+        return rows
+
+def column_index(cell_reference):
+    """'C7' -> 2."""
+    index = 0
+    for char in cell_reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord("A") + 1
+    return index - 1
+
+def read_devices(output_folder):
+    """[{Lot_ID, Dev#, SN, SKU}] from Devices.xlsx, or None when Part1 has not written it yet."""
+    devices_path = os.path.join(output_folder, "Devices.xlsx")
+    if not os.path.exists(devices_path):
+        return None
+    rows = read_sheet_rows(devices_path, "Devices")
+    if not rows:
+        return []
+    header = rows[0]
+    return [{name: (row[i].strip() if i < len(row) else "") for i, name in enumerate(header)} for row in rows[1:] if row]
+
+def cmd_status(config, args):
+    from DeviceFileIndex import INDEX_FILENAME, load_device_index
+    from BuildManifest import load_manifest
+    from DatasheetReview import load_decisions, is_current, list_datasheets
+
+    paths = resolved_paths(config)
+    source_folder, output_folder = paths["source_folder"], paths["output_folder"]
+    other_folder, data_package_folder = paths["other_folder"], paths["data_package_folder"]
+
+    if os.path.isdir(source_folder):
+        print(f"Raw data folder:  {len(os.listdir(source_folder))} files in {source_folder}")
+    else:
+        print(f"Raw data folder:  missing ({source_folder})")
+
+    index_path = os.path.join(output_folder, INDEX_FILENAME)
+    if not os.path.exists(index_path):
+        print("Device index:     not built yet (run ingest)")
+    elif not os.path.isdir(other_folder) or load_device_index(other_folder) is None:
+        print("Device index:     stale - rebuilt by the next build")
+    else:
+        index = load_device_index(other_folder)
+        devices = {(lot_id, dev_num) for lot_id, dev_num, _ in index}
+        print(f"Device index:     {len(index)} files for {len(devices)} devices, up to date")
+
+    devices = read_devices(output_folder)
+    if devices is None:
+        print("Devices.xlsx:     not written yet (run ingest)")
+    else:
+        missing_sku = sum(1 for device in devices if not device.get("SKU"))
+        missing_sn = sum(1 for device in devices if not device.get("SN"))
+        print(f"Devices.xlsx:     {len(devices)} devices ({missing_sku} without SKU, {missing_sn} without SN)")
+
+    if os.path.isdir(data_package_folder):
+        datasheets = list_datasheets(data_package_folder)
+        manifest = load_manifest(data_package_folder)
+        decisions = load_decisions(data_package_folder)
+        current = [record for record in decisions.values() if is_current(record, data_package_folder)]
+        approved = sum(1 for record in current if record["decision"] == "approved")
+        print(f"Datasheets:       {len(datasheets)} in Data Package, {len(manifest)} recorded in the build manifest")
+        print(f"Review:           {approved} approved, {len(current) - approved} rejected, "
+              f"{len(datasheets) - len(current)} not reviewed")
+    else:
+        print("Datasheets:       none built yet (run build)")
+
+def cmd_devices(config, args):
+    from BuildManifest import load_manifest
+
+    paths = resolved_paths(config)
+    devices = read_devices(paths["output_folder"])
+    if devices is None:
+        print("Devices.xlsx not found - run ingest first.")
+        return 1
+    manifest = load_manifest(paths["data_package_folder"])
+    for device in devices:
+        if args.missing_sku and device.get("SKU"):
+            continue
+        built = "built" if f"{device['Lot_ID']} {device['Dev#']}" in manifest else ""
+        print(f"{device['Lot_ID']:24s} {device['Dev#']:8s} {device.get('SN', ''):12s} {device.get('SKU', '') or '(no SKU)':20s} {built}")
+    print(f"{len(devices)} devices")
+
+def cmd_config(config, args):
+    if args.write:
+        write_config(args.write, config)
+        return
+    for section in config.sections():
+        print(f"[{section}]")
+        values = resolved_paths(config) if section == "paths" else config[section]
+        for name, value in values.items():
+            print(f"{name} = {value}")
+        print()
+
+# -------------------------
+# PIPELINE COMMANDS (import their scripts on demand)
+# -------------------------
+def cmd_ingest(config, args):
+    part1 = load_module("DatasheetAutomationPart1FINAL", config)
+    argv = list(args.args)
+    if config["ingest"].get("link_mode") == "copy":
+        argv.insert(0, "--copy-only")
+    if config.getboolean("ingest", "skip_unconsumed"):
+        argv.insert(0, "--skip-unconsumed")
+    return part1.main(argv)
+
+def cmd_fix(config, args):
+    fixer = load_module("CountandFixtxtfiles", config)
+    return fixer.main(args.folder or fixer.folder_path)
+
+def cmd_resolve_sku(config, args):
+    from SkuResolver import SkuResolver
+
+    paths = resolved_paths(config)
+    lot_ids = args.lot_ids
+    if not lot_ids:
+        devices = read_devices(paths["output_folder"]) or []
+        lot_ids = [device["Lot_ID"] for device in devices]
+    resolver = SkuResolver.from_template(paths["excel_template"])
+    for lot_id, result in resolver.resolve_batch(lot_ids).items():
+        if result is None:
+            print(f"{lot_id:24s} (cannot parse Lot_ID)")
+        else:
+            wavelength, device_type, sku, matches = result
+            print(f"{lot_id:24s} {wavelength:g} nm {device_type:10s} {sku or '(no SKU)':20s} {matches} candidates")
+
+def cmd_build(config, args):
+    load_module("DatasheetAutomationPart1FINAL", config)
+    part2 = load_module("Datasheet_Automation_Part2_FINAL_V3", config)
+    argv = ["--backend", config["build"]["backend"], "--workers", config["build"]["workers"]]
+    if not config.getboolean("build", "measurement_cache"):
+        argv.append("--no-measurement-cache")
+    if config.getboolean("build", "workbooks"):
+        argv.append("--xlsm")
+    return part2.main(argv + args.args)
+
+def cmd_watch(config, args):
+    load_module("DatasheetAutomationPart1FINAL", config)
+    part2 = load_module("Datasheet_Automation_Part2_FINAL_V3", config)
+    part2.write_workbooks = config.getboolean("build", "workbooks")
+    watcher = importlib.import_module("DatasheetWatch")
+    argv = ["--backend", config["build"]["backend"]]
+    if config["ingest"].get("link_mode") == "copy":
+        argv.append("--copy-only")
+    if config.getboolean("ingest", "skip_unconsumed"):
+        argv.append("--skip-unconsumed")
+    return watcher.main(argv + args.args)
+
+def cmd_queue(config, args):
+    part2 = load_module("Datasheet_Automation_Part2_FINAL_V3", config)
+    part2.chart_backend = config["build"]["backend"]
+    part2.write_workbooks = config.getboolean("build", "workbooks")
+    return importlib.import_module("JobQueue").main(args.args)
+
+def cmd_review(config, args):
+    review = load_module("DatasheetReview", config)
+    return review.main([review.input_folder] + args.args)
+
+def cmd_bench(config, args):
+    bench = importlib.import_module("bench.run")
+    return bench.main(["--excel-template", resolved_paths(config)["excel_template"],
+                       "--word-template", resolved_paths(config)["word_template"]] + args.args)
+
+# -------------------------
+# STARTUP CHECK
+# -------------------------
+def cmd_startup(config, args):
+    """Time the quick commands in fresh interpreters (as a user would start them) against the budget."""
+    over_budget = []
+    for command in QUICK_COMMANDS:
+        argv = [sys.executable, os.path.abspath(__file__)] + (["--config", args.config] if args.config else [])
+        times = []
+        timing_line = ""
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            completed = subprocess.run(argv + ["--timing"] + command, capture_output=True, text=True)
+            times.append(time.perf_counter() - start)
+            lines = completed.stdout.strip().splitlines()
+            timing_line = lines[-1] if lines else completed.stderr.strip()
+        median = sorted(times)[len(times) // 2]
+        flag = ""
+        if median > STARTUP_BUDGET_SECONDS or "heavy modules: none" not in timing_line:
+            flag = "  OVER BUDGET"
+            over_budget.append(" ".join(command))
+        print(f"  {' '.join(command):10s} median {median * 1000:6.0f} ms of {args.runs} runs  ({timing_line}){flag}")
+    print(f"Budget: {STARTUP_BUDGET_SECONDS * 1000:.0f} ms per quick command, no heavy imports")
+    return 1 if over_budget else 0
+
+# -------------------------
+# CLI
+# -------------------------
+def build_parser():
+    parser = argparse.ArgumentParser(prog="DatasheetCLI", description="Datasheet automation: one entry point for every step")
+    parser.add_argument("--config", help=f"settings file (default: ${CONFIG_ENV_VAR} or {CONFIG_FILENAME} next to this script)")
+    parser.add_argument("--timing", action="store_true", help="print startup and command time and which heavy modules loaded")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    def add(name, function, help_text, passthrough=False):
+        command = commands.add_parser(name, help=help_text, description=help_text, add_help=not passthrough)
+        # Options of a passthrough command go to the underlying script's own parser (see its --help)
+        command.set_defaults(function=function, passthrough=passthrough)
+        return command
+
+    add("status", cmd_status, "raw data, device index, Devices.xlsx, datasheets and review progress at a glance")
+    add("devices", cmd_devices, "list the devices in Devices.xlsx").add_argument(
+        "--missing-sku", action="store_true", help="only devices without a SKU")
+    config_command = add("config", cmd_config, "show the effective settings")
+    config_command.add_argument("--write", metavar="PATH", help="write the effective settings to a new config file")
+    add("ingest", cmd_ingest, "Part1: sort raw files, list devices, fix and index the raw data", passthrough=True)
+    add("fix", cmd_fix, "run the raw .txt FIX step on a folder").add_argument(
+        "folder", nargs="?", help="folder of raw .txt files (default: Script Output/Other)")
+    add("resolve-sku", cmd_resolve_sku, "show the SKU each Lot_ID resolves to").add_argument(
+        "lot_ids", nargs="*", help="Lot_IDs (default: every device in Devices.xlsx)")
+    add("build", cmd_build, "Part2: create the datasheets that are missing or out of date", passthrough=True)
+    add("queue", cmd_queue, "job queue for several workers / machines: enqueue, worker, status, collect",
+        passthrough=True)
+    add("watch", cmd_watch, "watch the raw data folder and build datasheets as files arrive", passthrough=True)
+    add("review", cmd_review, "review generated datasheets", passthrough=True)
+    add("bench", cmd_bench, "end-to-end benchmark on synthetic data", passthrough=True)
+    add("startup", cmd_startup, "measure the startup time of the quick commands").add_argument(
+        "--runs", type=int, default=5)
+    return parser
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and not args.passthrough:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.args = extra
+    config, config_path = load_config(args.config)
+    if args.config and config_path is None:
+        print(f"Config file {args.config} not found - using the defaults")
+
+    command_start = time.perf_counter()
+    try:
+        status = args.function(config, args)
+    finally:
+        if args.timing:
+            heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+            print(f"startup {(command_start - _STARTED) * 1000:.0f} ms, command {(time.perf_counter() - command_start) * 1000:.0f} ms, "
+                  f"heavy modules: {', '.join(heavy) or 'none'}")
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
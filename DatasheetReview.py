@@ -0,0 +1,354 @@
+import os
+import re
+import sys
+import io
+import json
+import time
+import zipfile
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+from WordTemplate import TEXT_FIELDS, IMAGE_SLOTS, DOCUMENT_PART, DOCUMENT_RELS_PART, PARAGRAPH_PATTERN, TEXT_NODE_PATTERN
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+# Folder of generated datasheets to review (Part2's Data Package)
+input_folder = r"P:\Christian Williams\1-Datasheet Creation\Script Output\Data Package"
+
+# Decisions are appended to this file in the reviewed folder; the latest line per datasheet wins
+DECISIONS_FILENAME = "review_decisions.jsonl"
+
+# Previews prepared ahead of (and kept behind) the current datasheet
+PREFETCH_AHEAD = 4
+KEEP_BEHIND = 2
+PREFETCH_WORKERS = 2
+
+# Each chart preview is scaled to fit this box (pixels)
+PREVIEW_SIZE = (620, 420)
+
+# Datasheets are named "{SN} {SKU} {Dev#}.docx" by Part2
+OUTPUT_NAME_PATTERN = re.compile(r'^(?P<sn>\S+) (?P<sku>\S+) (?P<dev>\S+)\.docx$')
+DATE_PATTERN = re.compile(r'\b\d{2}/\d{2}/\d{4}\b')
+EMBED_PATTERN = re.compile(r'r:embed="([^"]+)"')
+RELATIONSHIP_PATTERN = re.compile(r'<Relationship ([^>]*?)/?>')
+ATTRIBUTE_PATTERN = re.compile(r'(\w+)="([^"]*)"')
+
+# -------------------------
+# PREVIEWS
+# -------------------------
+# A preview is read straight from the docx zip: the paragraph text, the fields Part2 filled in and
+# the chart images in document order - no Word, no layout engine.
+
+def document_text(document_xml):
+    """Text of every paragraph in word/document.xml (tables included)."""
+    paragraphs = []
+    for paragraph in PARAGRAPH_PATTERN.findall(document_xml):
+        text = "".join(match.group(2) for match in TEXT_NODE_PATTERN.finditer(paragraph))
+        if text.strip():
+            paragraphs.append(text)
+    return paragraphs
+
+def image_parts(docx, document_xml):
+    """Zip names of the pictures in the body, in the order they appear."""
+    rels_xml = docx.read(DOCUMENT_RELS_PART).decode("utf-8")
+    targets = {}
+    for attributes in RELATIONSHIP_PATTERN.findall(rels_xml):
+        attributes = dict(ATTRIBUTE_PATTERN.findall(attributes))
+        targets[attributes.get("Id")] = attributes.get("Target", "")
+    parts = []
+    for rel_id in EMBED_PATTERN.findall(document_xml):
+        target = targets.get(rel_id, "")
+        part = target.lstrip("/") if target.startswith("/") else "word/" + target
+        if part in docx.namelist() and part not in parts:
+            parts.append(part)
+    return parts
+
+def check_fields(filename, paragraphs):
+    """Expected fields (from the file name) and any problems a reviewer should see first."""
+    match = OUTPUT_NAME_PATTERN.match(filename)
+    fields = match.groupdict() if match else {}
+    text = "\n".join(paragraphs)
+    issues = [f"placeholder {name} left in the document" for name in TEXT_FIELDS + IMAGE_SLOTS if name in text]
+    for name, value in fields.items():
+        if value not in text:
+            issues.append(f"{name.upper()} {value} from the file name is not in the document")
+    dates = DATE_PATTERN.findall(text)
+    fields["date"] = dates[0] if dates else ""
+    return fields, issues
+
+def load_preview(path, preview_size=PREVIEW_SIZE):
+    """Read one datasheet into a preview dict with chart images already decoded and scaled."""
+    from PIL import Image
+
+    start = time.perf_counter()
+    with zipfile.ZipFile(path) as docx:
+        document_xml = docx.read(DOCUMENT_PART).decode("utf-8")
+        paragraphs = document_text(document_xml)
+        images = []
+        for part in image_parts(docx, document_xml):
+            image = Image.open(io.BytesIO(docx.read(part)))
+            image.thumbnail(preview_size, Image.Resampling.LANCZOS)
+            images.append(image.convert("RGB"))
+    fields, issues = check_fields(os.path.basename(path), paragraphs)
+    if len(images) < len(IMAGE_SLOTS):
+        issues.append(f"{len(images)} of {len(IMAGE_SLOTS)} chart images")
+    return {"path": path, "fields": fields, "issues": issues, "paragraphs": paragraphs, "images": images,
+            "seconds": time.perf_counter() - start}
+
+def error_preview(path, error):
+    return {"path": path, "fields": {}, "issues": [f"could not read the datasheet: {error}"], "paragraphs": [],
+            "images": [], "seconds": 0.0}
+
+class PreviewCache:
+    """
+    Previews around the current position, prepared by background threads. get() waits only when
+    the reviewer pages faster than the prefetch, which keeps paging effectively instant.
+    """
+
+    def __init__(self, paths, ahead=PREFETCH_AHEAD, behind=KEEP_BEHIND, workers=PREFETCH_WORKERS):
+        self.paths = paths
+        self.ahead = ahead
+        self.behind = behind
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="preview")
+        self.futures = {}
+        self.lock = threading.Lock()
+
+    def _load(self, index):
+        try:
+            return load_preview(self.paths[index])
+        except Exception as e:
+            return error_preview(self.paths[index], e)
+
+    def _submit(self, index):
+        if 0 <= index < len(self.paths) and index not in self.futures:
+            self.futures[index] = self.pool.submit(self._load, index)
+
+    def get(self, index):
+        """The preview at index; also queues the next few and drops those far behind."""
+        with self.lock:
+            self._submit(index)
+            for offset in range(1, self.ahead + 1):
+                self._submit(index + offset)
+            self._submit(index - 1)
+            for stale in [i for i in self.futures if i < index - self.behind or i > index + self.ahead]:
+                self.futures.pop(stale).cancel()
+            future = self.futures[index]
+        return future.result()
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+# -------------------------
+# DECISIONS
+# -------------------------
+def decisions_path_for(folder):
+    return os.path.join(folder, DECISIONS_FILENAME)
+
+def load_decisions(folder):
+    """{filename: latest decision record} from the decisions file (missing file -> {})."""
+    decisions = {}
+    try:
+        with open(decisions_path_for(folder), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line cut short by a crash
+                decisions[record["file"]] = record
+    except OSError:
+        pass
+    return decisions
+
+def record_decision(folder, filename, decision, note=""):
+    """Append one decision; the datasheet's size/mtime are kept so a rebuilt file can be spotted."""
+    path = os.path.join(folder, filename)
+    stat = os.stat(path)
+    record = {"file": filename, "decision": decision, "note": note, "time": datetime.now().isoformat(timespec="seconds"),
+              "reviewer": os.environ.get("USERNAME") or os.environ.get("USER", ""),
+              "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+    with open(decisions_path_for(folder), "a", encoding="utf-8") as f:
+        f.write(json.dumps(record) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    return record
+
+def is_current(record, folder):
+    """True if the decision was made on the datasheet as it is now (not on an older build)."""
+    try:
+        stat = os.stat(os.path.join(folder, record["file"]))
+    except OSError:
+        return False
+    return record.get("size") == stat.st_size and record.get("mtime_ns") == stat.st_mtime_ns
+
+def list_datasheets(folder):
+    return [f for f in sorted(os.listdir(folder)) if f.endswith(".docx") and not f.startswith("~$")]
+
+# -------------------------
+# REVIEW WINDOW
+# -------------------------
+class ReviewApp:
+    """Tk window: fields and chart previews of one datasheet, Approve / Reject / Back / Skip."""
+
+    def __init__(self, root, folder, filenames, start_index=0):
+        import tkinter as tk
+
+        self.root = root
+        self.folder = folder
+        self.filenames = filenames
+        self.index = start_index
+        self.decisions = load_decisions(folder)
+        self.cache = PreviewCache([os.path.join(folder, f) for f in filenames])
+        self.photos = []
+
+        root.title("Datasheet Review")
+        self.header = tk.Label(root, font=("Arial", 12, "bold"), anchor="w", justify="left")
+        self.header.pack(fill="x", padx=10, pady=(10, 0))
+        self.status = tk.Label(root, font=("Arial", 10), anchor="w", justify="left")
+        self.status.pack(fill="x", padx=10)
+        self.issues = tk.Label(root, font=("Arial", 10), fg="red", anchor="w", justify="left")
+        self.issues.pack(fill="x", padx=10)
+
+        images = tk.Frame(root)
+        images.pack(fill="both", expand=True, padx=10, pady=10)
+        self.image_labels = [tk.Label(images) for _ in IMAGE_SLOTS]
+        for label in self.image_labels:
+            label.pack(side="left", expand=True)
+
+        buttons = tk.Frame(root)
+        buttons.pack(pady=(0, 10))
+        for text, command in (("Back (Left)", self.back), ("Reject (R)", self.reject),
+                              ("Approve & Next (Enter)", self.approve), ("Skip (Right)", self.skip),
+                              ("Open in Word (O)", self.open_document)):
+            tk.Button(buttons, text=text, font=("Arial", 12), command=command).pack(side="left", padx=5)
+
+        root.bind("<Return>", lambda event: self.approve())
+        root.bind("<Right>", lambda event: self.skip())
+        root.bind("<Left>", lambda event: self.back())
+        root.bind("r", lambda event: self.reject())
+        root.bind("o", lambda event: self.open_document())
+        root.protocol("WM_DELETE_WINDOW", self.close)
+        self.show(self.index)
+
+    def show(self, index):
+        from PIL import ImageTk
+
+        self.index = index
+        filename = self.filenames[index]
+        preview = self.cache.get(index)
+        fields = preview["fields"]
+        self.header.config(text=f"{index + 1}/{len(self.filenames)}  Dev# {fields.get('dev', '?')}   "
+                                f"SN {fields.get('sn', '?')}   SKU {fields.get('sku', '?')}   {fields.get('date', '')}")
+        record = self.decisions.get(filename)
+        if record is None:
+            status = "Not reviewed"
+        else:
+            status = f"{record['decision'].capitalize()} by {record['reviewer'] or '?'} at {record['time']}"
+            if record.get("note"):
+                status += f": {record['note']}"
+            if not is_current(record, self.folder):
+                status += "  (datasheet rebuilt since)"
+        self.status.config(text=f"{filename}   {status}")
+        self.issues.config(text="\n".join(preview["issues"]))
+
+        # PhotoImage has to be created on the Tk thread; the decoding and scaling was done in the background
+        self.photos = [ImageTk.PhotoImage(image) for image in preview["images"]]
+        for label, photo in zip(self.image_labels, self.photos + [None] * len(self.image_labels)):
+            label.config(image=photo or "")
+
+    def decide(self, decision, note=""):
+        filename = self.filenames[self.index]
+        self.decisions[filename] = record_decision(self.folder, filename, decision, note)
+        self.skip()
+
+    def approve(self):
+        self.decide("approved")
+
+    def reject(self):
+        from tkinter import simpledialog
+
+        note = simpledialog.askstring("Reject", "Reason for rejecting this datasheet:", parent=self.root)
+        if note is not None:
+            self.decide("rejected", note)
+
+    def skip(self):
+        if self.index < len(self.filenames) - 1:
+            self.show(self.index + 1)
+        else:
+            self.finish()
+
+    def back(self):
+        if self.index > 0:
+            self.show(self.index - 1)
+
+    def open_document(self):
+        """Open the full document in Word for a closer look (Windows only)."""
+        if hasattr(os, "startfile"):
+            os.startfile(os.path.join(self.folder, self.filenames[self.index]))
+
+    def finish(self):
+        from tkinter import messagebox
+
+        counts = {}
+        for filename in self.filenames:
+            decision = self.decisions.get(filename, {}).get("decision", "not reviewed")
+            counts[decision] = counts.get(decision, 0) + 1
+        messagebox.showinfo("Review Complete", "\n".join(f"{d.capitalize()}: {n}" for d, n in sorted(counts.items())))
+        self.close()
+
+    def close(self):
+        self.cache.close()
+        self.root.destroy()
+
+def first_unreviewed(folder, filenames, decisions):
+    for index, filename in enumerate(filenames):
+        record = decisions.get(filename)
+        if record is None or not is_current(record, folder):
+            return index
+    return 0
+
+def check_previews(folder, filenames):
+    """Headless pass: build every preview as the window would and print timings and issues."""
+    cache = PreviewCache([os.path.join(folder, f) for f in filenames])
+    start = time.perf_counter()
+    waits = []
+    try:
+        for index, filename in enumerate(filenames):
+            wait_start = time.perf_counter()
+            preview = cache.get(index)
+            waits.append(time.perf_counter() - wait_start)
+            for issue in preview["issues"]:
+                print(f"{filename}: {issue}")
+    finally:
+        cache.close()
+    elapsed = time.perf_counter() - start
+    print(f"{len(filenames)} previews in {elapsed:.2f} s; wait per page max {max(waits) * 1000:.1f} ms, "
+          f"mean {sum(waits) / len(waits) * 1000:.1f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Review generated datasheets from lightweight previews")
+    parser.add_argument("folder", nargs="?", default=input_folder, help="folder of generated .docx datasheets")
+    parser.add_argument("--all", action="store_true", help="start at the first datasheet, not the first unreviewed one")
+    parser.add_argument("--check", action="store_true", help="build every preview without a window and list problems")
+    args = parser.parse_args(argv)
+
+    filenames = list_datasheets(args.folder)
+    if not filenames:
+        print("No Word documents found in the specified folder.")
+        return
+
+    if args.check:
+        check_previews(args.folder, filenames)
+        return
+
+    import tkinter as tk
+
+    start_index = 0 if args.all else first_unreviewed(args.folder, filenames, load_decisions(args.folder))
+    root = tk.Tk()
+    ReviewApp(root, args.folder, filenames, start_index)
+    root.mainloop()
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
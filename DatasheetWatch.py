@@ -0,0 +1,311 @@
+import os
+import sys
+import json
+import time
+import select
+import struct
+import argparse
+import ctypes
+import ctypes.util
+from datetime import datetime
+
+import DatasheetAutomationPart1FINAL as part1
+import Datasheet_Automation_Part2_FINAL_V3 as part2
+from DeviceFileIndex import load_or_build_device_index, update_device_index, save_device_index
+from PipelineTrace import PipelineTrace, set_active_trace, trace_path_for
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+# A file is ingested once its size and mtime have not changed for this long (copies over the
+# network arrive in pieces, and Explorer creates the file before it writes it)
+SETTLE_SECONDS = 2.0
+POLL_INTERVAL_SECONDS = 1.0
+
+# Source files already ingested: {filename: [size, mtime_ns]}, so a restart only ingests what is new
+WATCH_STATE_FILENAME = "watch_state.json"
+
+# inotify (Linux): events that mean a file in the folder was written, created or moved in
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# -------------------------
+# FOLDER WATCHERS
+# -------------------------
+def file_stamp(path):
+    """(size, mtime_ns) of a file, or None if it is gone or not a regular file."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns) if os.path.isfile(path) else None
+
+class InotifyWatcher:
+    """Names of files written in a folder, from the kernel's inotify events (read through ctypes)."""
+
+    def __init__(self, folder):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {folder}")
+
+    def wait(self, timeout):
+        """Block up to timeout seconds; return the set of file names with events."""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        names = set()
+        if not readable:
+            return names
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return names
+        offset = 0
+        while offset + INOTIFY_EVENT.size <= len(data):
+            _, _, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            if name:
+                names.add(os.fsdecode(name))
+        return names
+
+    def close(self):
+        os.close(self.fd)
+
+class PollingWatcher:
+    """Names of files that appeared or changed since the last scan (any OS, network shares included)."""
+
+    def __init__(self, folder, interval=POLL_INTERVAL_SECONDS):
+        self.folder = folder
+        self.interval = interval
+        self.stamps = self._scan()
+
+    def _scan(self):
+        stamps = {}
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    stamps[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return stamps
+
+    def wait(self, timeout):
+        time.sleep(min(timeout, self.interval))
+        stamps = self._scan()
+        changed = {name for name, stamp in stamps.items() if self.stamps.get(name) != stamp}
+        self.stamps = stamps
+        return changed
+
+    def close(self):
+        pass
+
+def open_watcher(folder, polling=False):
+    if not polling and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(folder)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}) - polling instead")
+    return PollingWatcher(folder)
+
+class Debouncer:
+    """Holds changed files back until their size and mtime have been stable for settle seconds."""
+
+    def __init__(self, folder, settle=SETTLE_SECONDS):
+        self.folder = folder
+        self.settle = settle
+        self.pending = {}  # name -> (stamp, time the stamp was last seen to change)
+
+    def touch(self, names):
+        now = time.monotonic()
+        for name in names:
+            self.pending[name] = (file_stamp(os.path.join(self.folder, name)), now)
+
+    def settled(self):
+        """Pending files that are complete; files that vanished are dropped."""
+        now = time.monotonic()
+        ready = []
+        for name, (stamp, changed_at) in list(self.pending.items()):
+            current = file_stamp(os.path.join(self.folder, name))
+            if current is None:
+                del self.pending[name]
+            elif current != stamp:
+                self.pending[name] = (current, now)
+            elif now - changed_at >= self.settle and _readable(os.path.join(self.folder, name)):
+                del self.pending[name]
+                ready.append(name)
+        return sorted(ready)
+
+def _readable(path):
+    """False while another process still holds the file open for writing (Windows refuses the open)."""
+    try:
+        with open(path, "rb"):
+            return True
+    except OSError:
+        return False
+
+# -------------------------
+# WARM STATE
+# -------------------------
+class WatchDaemon:
+    """
+    Part1 + Part2 kept in one process between batches: the SKU resolver, Key sheet rows, compiled
+    Word template, device file index, measurement cache and (for the Excel backend) the open
+    template session are loaded once and reused for every batch of new files.
+    """
+
+    def __init__(self, backend, skip_unconsumed=False, link_mode=part1.ingest_link_mode, verbose=False):
+        self.backend = backend
+        self.skip_unconsumed = skip_unconsumed
+        self.link_mode = link_mode
+        self.verbose = verbose
+        self.state_path = os.path.join(part1.destination_folder, WATCH_STATE_FILENAME)
+        self.ingested = self._load_state()
+        self.resolver = None
+        self.key_rows = None
+        self.template_stamp = None
+        self.device_file_index = None
+        self.devices_stamp = None
+        self.excel = None
+        self.session = None
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return {name: tuple(stamp) for name, stamp in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.ingested, f)
+        os.replace(tmp_path, self.state_path)
+
+    def unprocessed(self):
+        """Source files that are new or changed since they were last ingested (for start-up)."""
+        return sorted(name for name in os.listdir(part1.source_folder)
+                      if file_stamp(os.path.join(part1.source_folder, name)) not in (None, self.ingested.get(name)))
+
+    def warm_up(self):
+        """(Re)load the SKU table and Key rows when the Excel template changed; open Excel once."""
+        stamp = file_stamp(part1.sku_template_path)
+        if stamp != self.template_stamp:
+            self.resolver = part1.load_sku_lookup_table()
+            self.key_rows = part2.load_key_rows(part2.excel_template_path)
+            self.template_stamp = stamp
+        if self.device_file_index is None:
+            self.device_file_index = load_or_build_device_index(part1.other_folder)
+        if self.backend == "excel" and self.session is None:
+            self.excel = part2.open_excel()
+            self.session = part2.ExcelSession(self.excel, part2.excel_template_path).open()
+
+    def ingest(self, names):
+        """Part1 on just the new files: place, list new devices, FIX and index them incrementally."""
+        start = time.perf_counter()
+        fix_file_paths, header_counts = part1.ingest_files(self.skip_unconsumed, self.link_mode, names)
+        part1.run_fix_step(fix_file_paths, header_counts)
+        update_device_index(self.device_file_index, [os.path.basename(path) for path in fix_file_paths])
+        save_device_index(self.device_file_index, part1.other_folder)
+        try:
+            part1.update_device_list(self.resolver)
+        except PermissionError:
+            # Devices.xlsx is open in Excel; the new devices are added on the next batch
+            print("Devices.xlsx is open - new devices will be listed once it is closed")
+        for name in names:
+            stamp = file_stamp(os.path.join(part1.source_folder, name))
+            if stamp is not None:
+                self.ingested[name] = stamp
+        self._save_state()
+        print(f"Ingested {len(names)} files in {time.perf_counter() - start:.1f} s")
+
+    def build(self):
+        """Part2 for the devices whose datasheets are missing or out of date."""
+        devices_path = os.path.join(part2.destination_folder, "Devices.xlsx")
+        stamp = file_stamp(devices_path)
+        if stamp is None:
+            return
+        self.devices_stamp = stamp
+        try:
+            device_rows = [part2.device_fields(row) for _, row in part2.load_devices().iterrows()]
+        except (OSError, ValueError) as e:
+            print(f"Could not read Devices.xlsx ({e}) - retrying on the next change")
+            return
+
+        os.makedirs(part2.data_package_folder, exist_ok=True)
+        manifest = part2.load_manifest(part2.data_package_folder)
+        stale_rows, fingerprints = part2.stale_devices(manifest, device_rows, self.device_file_index, self.backend,
+                                                       verbose=self.verbose, workbooks=part2.write_workbooks)
+        if not stale_rows:
+            return
+
+        trace = set_active_trace(PipelineTrace(trace_path_for(part2.destination_folder), "Watch", len(stale_rows),
+                                               self.verbose))
+        start = time.perf_counter()
+        date_text = datetime.now().strftime("%m/%d/%Y")
+        results = part2.process_devices(stale_rows, self.device_file_index, self.key_rows, self.backend,
+                                        date_text=date_text, session=self.session, workbooks=part2.write_workbooks)
+        part2.record_results(manifest, results, fingerprints)
+        part2.print_batch_summary(results, time.perf_counter() - start)
+        trace.summary()
+
+    def devices_changed(self):
+        """True when Devices.xlsx was edited (an SN or SKU typed in) since the last build."""
+        return file_stamp(os.path.join(part2.destination_folder, "Devices.xlsx")) != self.devices_stamp
+
+    def run_batch(self, names):
+        self.warm_up()
+        if names:
+            self.ingest(names)
+        self.build()
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.excel.Quit()
+
+def watch(backend, polling=False, skip_unconsumed=False, link_mode=part1.ingest_link_mode, verbose=False, once=False):
+    for folder in (part1.source_folder, part1.liv_folder, part1.smsr_folder, part1.other_folder):
+        os.makedirs(folder, exist_ok=True)
+    daemon = WatchDaemon(backend, skip_unconsumed, link_mode, verbose)
+    watcher = open_watcher(part1.source_folder, polling)
+    debouncer = Debouncer(part1.source_folder)
+    print(f"Watching {part1.source_folder} ({type(watcher).__name__}, {backend} backend) - Ctrl+C to stop")
+    try:
+        # Files pasted while the daemon was not running
+        debouncer.touch(daemon.unprocessed())
+        while True:
+            debouncer.touch(watcher.wait(POLL_INTERVAL_SECONDS / 2 if debouncer.pending else POLL_INTERVAL_SECONDS))
+            ready = debouncer.settled()
+            if ready or daemon.devices_changed():
+                if ready:
+                    print(f"{datetime.now():%H:%M:%S} {len(ready)} new or changed files")
+                daemon.run_batch(ready)
+            if once and not debouncer.pending:
+                break
+    except KeyboardInterrupt:
+        print("Stopping watch.")
+    finally:
+        watcher.close()
+        daemon.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch the raw data folder and build datasheets as files arrive")
+    parser.add_argument("--backend", choices=["excel", "matplotlib"], default=part2.chart_backend)
+    parser.add_argument("--poll", action="store_true", help="poll the folder instead of using inotify")
+    parser.add_argument("--skip-unconsumed", action="store_true", help="do not copy files no later stage reads")
+    parser.add_argument("--copy-only", action="store_true", help="always copy files instead of linking them")
+    parser.add_argument("--once", action="store_true", help="process what is there (and settles), then exit")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args(argv)
+    watch(args.backend, args.poll, args.skip_unconsumed, "copy" if args.copy_only else "auto", args.verbose, args.once)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,196 +1,90 @@
 import os
-import shutil
+import sys
+import io
+import time
+import queue
+import argparse
+import threading
 import pandas as pd
 
 from datetime import datetime
-import win32com.client as win32
-from docx import Document
 from PIL import Image
-from docx.shared import Inches
+
+from DeviceFileIndex import load_or_build_device_index, find_device_file
+from BuildManifest import build_fingerprint, stale_reasons, record_build, load_manifest, save_manifest
+from BatchJournal import MAX_ATTEMPTS, BatchJournal, fingerprint_digest, load_journal, completed, print_report
+from ChartRenderer import CHART_SIZE_INCHES, CHART_DPI, axis_limits, axes_config_from_bounds, render_wavelength_smsr_chart, render_liv_chart, render_chart_png
+from MeasurementParser import parse_measurement_file, excel_blocks
+from MeasurementCache import MeasurementCache
+from SweepIndex import load_sweep_index, sweep_for
+from CountandFixtxtfiles import phrase_for
+from SnlCalculation import load_key_rows, compute_snl, compare_bounds
+from ExcelSession import ExcelSession
+from WordTemplate import load_word_template
+from XlsmWriter import load_xlsm_template
+from PipelineTrace import set_active_trace, active_trace, trace_path_for, span, debug
+from PipelineProfiler import PROFILE_ENV_VAR, PROFILE_FOLDER_NAME, make_trace
 
 # -------------------------
 # CONFIGURATION - Paths
 # -------------------------
 destination_folder = r"C:\Users\crathod\Documents\Datasheet Automation\Script Output"
 data_package_folder = os.path.join(destination_folder, "Data Package")
+other_folder = os.path.join(destination_folder, "Other")
 excel_template_path = r"C:\Users\crathod\Documents\Datasheet Automation\Datasheet Graph Template 1.xlsm"
 word_template_path = r"C:\Users\crathod\Documents\Datasheet Automation\Datasheet Template.docx"
-os.makedirs(data_package_folder, exist_ok=True)
-
-# -------------------------
-# Load Devices.xlsx
-# -------------------------
-devices_file = os.path.join(destination_folder, "Devices.xlsx")
-devices_df = pd.read_excel(devices_file, sheet_name="Devices")
-# Don't drop rows with empty SN - we'll handle that in processing
-devices_df = devices_df.dropna(subset=["Lot_ID", "Dev#", "SKU"])
-
-# -------------------------
-# Helpers
-# -------------------------
-def find_device_file(lot_id, dev_num, phrase):
-    for filename in os.listdir(os.path.join(destination_folder, "Other")):
-        if lot_id in filename and dev_num in filename and phrase in filename:
-            return os.path.join(destination_folder, "Other", filename)
-    return None
-
-def paste_text_file_fast(sheet, start_row, start_column, lot_id, dev_num, phrase):
-    file_path = find_device_file(lot_id, dev_num, phrase)
-    if not file_path:
-        print(f"File not found for {phrase} - skipping.")
-        return None
-
-    with open(file_path, 'r') as f:
-        lines = [line.strip() for line in f.readlines()]
 
-    data = [line.split() for line in lines]
-    num_rows = len(data)
-    num_cols = max(len(row) for row in data)
+# Chart backend: "excel" exports Chart1/Chart2 through win32com (Windows + Excel only),
+# "matplotlib" draws the same charts headless from the raw files
+chart_backend = "excel"
 
-    for row in data:
-        while len(row) < num_cols:
-            row.append("")
+# Raw files pasted into the "snl" sheet: (phrase, start row)
+RAW_FILE_ROWS = [("WLT_Wave", 17), ("WLT_SMSR", 46), ("LIV_vs_Temp", 79)]
 
-    start_cell = sheet.Cells(start_row, start_column)
-    end_cell = sheet.Cells(start_row + num_rows - 1, start_column + num_cols - 1)
-    sheet.Range(start_cell, end_cell).Value = data
+# Size of the SMSR + 5 formula block (rows 74-76, columns A:AY) in the "snl" sheet
+SMSR_FORMULA_ROWS = 3
+SMSR_FORMULA_COLUMNS = 51
 
-    print(f"Fast-pasted {len(data)} rows for {phrase} starting at row {start_row}, column {start_column}")
-    return file_path
+# Parsed raw files are cached by content hash, so re-runs and re-renders skip text parsing
+measurement_cache_folder = os.path.join(destination_folder, "Measurement Cache")
+measurement_cache_max_mb = 2000
+measurement_cache_float32 = False  # halves the cache, but Excel would get rounded numbers pasted
 
-def clear_old_data(sheet):
-    """Clear specific rows before pasting new data."""
-    print("Clearing old data in rows 69-72 and 40-43...")
-    sheet.Range("A69:CB72").ClearContents()
-    sheet.Range("A40:CB43").ClearContents()
-    print("Old data cleared.\n")
+# Raw files holding a repeated measurement are read at this sweep (-1: the latest, 0: the first, ...)
+# using the sweep index Part1's FIX step writes next to "Other"
+raw_sweep = -1
 
-def resize_image(input_path, output_path, scale_percent):
-    with Image.open(input_path) as img:
-        new_width = int(img.width * (scale_percent / 100))
-        new_height = int(img.height * (scale_percent / 100))
-        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-        img.save(output_path)
-
-def update_chart_axes(sheet, chart, chart_number):
-    if chart_number == 1:
-        # Chart 1: Wavelength vs Current (+ SMSR)
-        axes_config = {
-            'primary_y': (sheet.Cells(13, 4).Value, sheet.Cells(13, 5).Value),  # Wavelength
-            'primary_x': (sheet.Cells(7, 4).Value, sheet.Cells(7, 5).Value),    # Current
-            'secondary_y': (sheet.Cells(10, 4).Value, sheet.Cells(10, 5).Value) # SMSR
-        }
-    elif chart_number == 2:
-        # Chart 2: LIV Characteristics (Power vs Current + Voltage)
-        axes_config = {
-            'primary_y': (sheet.Cells(8, 4).Value, sheet.Cells(8, 5).Value),    # Power
-            'primary_x': (sheet.Cells(12, 4).Value, sheet.Cells(12, 5).Value),  # Current
-            'secondary_y': (sheet.Cells(9, 4).Value, sheet.Cells(9, 5).Value)   # Voltage
-        }
+# Settings callers such as DatasheetCLI override on this module. Pool workers started with
+# "spawn" (the Windows default) re-import the module, so run_parallel hands them these values
+WORKER_SETTINGS = ["destination_folder", "data_package_folder", "other_folder", "excel_template_path",
+                   "word_template_path", "measurement_cache_folder", "measurement_cache_max_mb",
+                   "measurement_cache_float32", "raw_sweep"]
 
-    try:
-        chart.Parent.Activate()
-
-        y_min, y_max = axes_config['primary_y']
-        x_min, x_max = axes_config['primary_x']
-        sy_min, sy_max = axes_config['secondary_y']
-        
-        print(f"Chart {chart_number} - Original values:")
-        print(f"  Primary Y: {y_min} to {y_max}")
-        print(f"  Secondary Y: {sy_min} to {sy_max}")
-        print(f"  X: {x_min} to {x_max}")
-        
-        # Chart-specific expansions
-        if chart_number == 1:
-            # Wavelength chart: very small expansion
-            sy_min = -sy_max  # SMSR axis should start from negative of max
-            y_min = y_min + 0.5 # Expand wavelength min slightly for better view
-            y_max_expanded = y_max  # Only +2nm as you specified
-            sy_max_expanded = sy_max * 1.2  # SMSR can have more room
-            x_max_expanded = x_max * 1.05   # Current: small expansion
-            
-        else:
-            # LIV chart: moderate expansion for power
-            y_max_expanded = max(y_max * 1, 0.05)  # Power: ensure at least 0.05W
-            sy_max_expanded = sy_max * 1.1  # Voltage: small expansion
-            x_max_expanded = x_max * 1.05   # Current: small expansion
-        
-        # Set axes WITH custom units (full manual control)
-        chart.Axes(2).MinimumScale = y_min
-        chart.Axes(2).MaximumScale = y_max_expanded
-        chart.Axes(1).MinimumScale = x_min
-        chart.Axes(1).MaximumScale = x_max_expanded
-
-        # Custom units for Primary Y-axis (Left Y - Wavelength/Power)
-        if chart_number == 1:
-            # Chart 1: Wavelength axis - use smaller, precise units
-            chart.Axes(2).MajorUnit = 0.5  # 0.5nm intervals for wavelength
-            chart.Axes(2).MinorUnit = 0.1  # 0.1nm minor intervals
-            
-            # Ensure minor ticks are visible on wavelength axis
-            try:
-                chart.Axes(2).MinorTickMark = 2  # xlTickMarkOutside - show minor ticks outside
-                chart.Axes(2).HasMinorGridlines = False  # Don't show minor gridlines (cleaner look)
-                print(f"  Wavelength axis minor ticks enabled: 0.1nm intervals")
-            except Exception as e:
-                print(f"  Minor tick configuration failed: {e}")
-            
-        else:
-            # Chart 2: Power axis - use appropriate power units
-            chart.Axes(2).MajorUnit = 0.01  # 0.01W intervals for power
-            chart.Axes(2).MinorUnit = 0.002  # 0.002W minor intervals
+# Chart images are inserted at 130% of the 96 dpi export size (more pixels in the same
+# 6 inch width) - matplotlib renders at that size directly, Excel exports are upscaled in memory
+IMAGE_SCALE_PERCENT = 130
+IMAGE_WIDTH_INCHES = 6
 
-        # Custom units for X-axis (Current) - same for both charts
-        chart.Axes(1).MajorUnit = 0.01   # 0.01A intervals for current
-        chart.Axes(1).MinorUnit = 0.002  # 0.002A minor intervals
+# Also save each device's filled graph workbook (.xlsm) next to its datasheet (or pass --xlsm).
+# It is written headless from the template: only the "snl" data rows and the SKU are patched,
+# the VBA project is copied as it is and Excel recalculates the formulas when it opens the file.
+write_workbooks = False
 
-        try:
-            chart.Axes(2, 2).MinimumScale = sy_min
-            chart.Axes(2, 2).MaximumScale = sy_max_expanded
-            
-            # Custom units for Secondary Y-axis (Right Y - SMSR/Voltage)
-            if chart_number == 1:
-                # Chart 1: SMSR axis
-                chart.Axes(2, 2).MajorUnit = 10  # 10dB intervals for SMSR
-                chart.Axes(2, 2).MinorUnit = 2   # 2dB minor intervals
-            else:
-                # Chart 2: Voltage axis
-                chart.Axes(2, 2).MajorUnit = 0.2  # 0.2V intervals for voltage
-                chart.Axes(2, 2).MinorUnit = 0.05  # 0.05V minor intervals
-            
-            print(f"  Secondary Y major unit: {chart.Axes(2, 2).MajorUnit}")
-            
-        except Exception as e:
-            print(f"  (No secondary Y axis for Chart{chart_number}: {e})")
-
-    except Exception as e:
-        print(f"Failed to set axes for Chart{chart_number}: {e}")
-        import traceback
-        traceback.print_exc()
-
-def replace_text_in_runs(paragraph, search_text, replace_text):
-    for run in paragraph.runs:
-        run.text = run.text.replace(search_text, replace_text)
-
-def replace_text_in_document(doc, replacements):
-    for para in doc.paragraphs:
-        for search_text, replace_text in replacements.items():
-            replace_text_in_runs(para, search_text, replace_text)
-
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                for para in cell.paragraphs:
-                    for search_text, replace_text in replacements.items():
-                        replace_text_in_runs(para, search_text, replace_text)
+# Devices waiting between two pipeline stages; bounds memory to a handful of devices' data and images
+PIPELINE_QUEUE_SIZE = 2
 
 # -------------------------
-# Process Each Device
+# Helpers
 # -------------------------
-excel = win32.Dispatch("Excel.Application")
-excel.Visible = False
-
-for _, row in devices_df.iterrows():
+def load_devices():
+    """Load Devices.xlsx written by Part1."""
+    devices_file = os.path.join(destination_folder, "Devices.xlsx")
+    devices_df = pd.read_excel(devices_file, sheet_name="Devices")
+    # Don't drop rows with empty SN - we'll handle that in processing
+    return devices_df.dropna(subset=["Lot_ID", "Dev#", "SKU"])
+
+def device_fields(row):
+    """Return (lot_id, dev_num, sn, sku) for one Devices.xlsx row."""
     lot_id = str(row["Lot_ID"]).strip()
     dev_num = str(row["Dev#"]).strip()
     # Handle SN: if it's empty or NaN, use dev_num as fallback
@@ -200,125 +94,717 @@ for _, row in devices_df.iterrows():
     else:
         sn = str(int(sn_raw)).strip()
     sku = str(row["SKU"]).strip()
+    return lot_id, dev_num, sn, sku
+
+def find_raw_files(device_file_index, lot_id, dev_num):
+    """Resolve the WLT_Wave / WLT_SMSR / LIV_vs_Temp files of one device ({phrase: path or None})."""
+    return {phrase: find_device_file(device_file_index, other_folder, lot_id, dev_num, phrase) for phrase, _ in RAW_FILE_ROWS}
+
+def output_path_for(dev_num, sn, sku):
+    return os.path.join(data_package_folder, f"{sn} {sku} {dev_num}.docx")
+
+def workbook_path_for(dev_num, sn, sku):
+    return os.path.join(data_package_folder, f"{sn} {sku} {dev_num}.xlsm")
+
+def manifest_key(fields):
+    """Build manifest entries are per device, so an SN or SKU correction shows up as a changed field."""
+    return f"{fields[0]} {fields[1]}"
+
+def renderer_settings(backend, workbooks=False):
+    """Settings that change how the charts and images in a datasheet look (and which files are written)."""
+    settings = {"backend": backend, "image_scale_percent": IMAGE_SCALE_PERCENT, "image_width_inches": IMAGE_WIDTH_INCHES}
+    if backend == "matplotlib":
+        settings.update(chart_size_inches=list(CHART_SIZE_INCHES), chart_dpi=CHART_DPI)
+    if raw_sweep != -1:
+        # Only recorded when changed, so datasheets built from the latest sweep stay up to date
+        settings["raw_sweep"] = raw_sweep
+    if workbooks:
+        settings["xlsm"] = True
+    return settings
+
+def device_fingerprint(raw_files, fields, backend, workbooks=False):
+    """
+    Hashes and values one datasheet is built from, for the build manifest. The date printed on
+    the datasheet is left out: a datasheet is not stale just because the day changed.
+    """
+    lot_id, dev_num, sn, sku = fields
+    templates = {"excel": excel_template_path, "word": word_template_path}
+    return build_fingerprint(raw_files, templates, {"Lot_ID": lot_id, "Dev#": dev_num, "SN": sn, "SKU": sku},
+                             renderer_settings(backend, workbooks))
+
+def open_measurement_cache(enabled=True):
+    if not enabled:
+        return None
+    return MeasurementCache(measurement_cache_folder, int(measurement_cache_max_mb * 10 ** 6), measurement_cache_float32)
+
+def parse_raw_files(raw_files, cache=None, sweeps=None):
+    """
+    Parse each resolved raw file once ({phrase: parsed block or None}); the blocks feed both snl and Excel.
+    sweeps is the sweep index of "Other": files with repeated sweeps are read at raw_sweep only.
+    """
+    blocks = {}
+    for phrase, file_path in raw_files.items():
+        blocks[phrase] = None
+        if not file_path:
+            continue
+        try:
+            with span("parse", phrase=phrase) as fields:
+                match = phrase_for(os.path.basename(file_path))
+                sweep = sweep_for(sweeps or {}, file_path, match[1], raw_sweep) if match else None
+                if sweep is not None:
+                    fields["sweep_offset"] = sweep["offset"]
+                if cache is None:
+                    blocks[phrase] = parse_measurement_file(file_path, sweep)
+                else:
+                    hits = cache.hits
+                    blocks[phrase] = cache.load(file_path, sweep)
+                    fields["cache"] = "hit" if cache.hits > hits else "miss"
+        except (ValueError, IndexError) as e:
+            print(f"Could not parse {os.path.basename(file_path)}: {e}")
+    return blocks
+
+def paste_text_file_fast(session, start_row, start_column, block, phrase):
+    if block is None:
+        print(f"File not found for {phrase} - skipping.")
+        return None
 
-    print(f"Processing Device: Lot={lot_id}, Dev={dev_num}, SN={sn}, SKU={sku}")
-
-    wb = excel.Workbooks.Open(excel_template_path)
-    sheet = wb.Sheets("snl")
+    # Header rows go in as text, the numeric block as typed floats
+    for offset, rows in excel_blocks(block):
+        session.write_block(start_row + offset, start_column, rows)
 
-    clear_old_data(sheet)
+    debug(f"Fast-pasted {len(block['header']) + len(block['layout'])} rows for {phrase} starting at row {start_row}, column {start_column}")
+    return block["path"]
 
-    paste_text_file_fast(sheet, 17, 1, lot_id, dev_num, "WLT_Wave")
-    paste_text_file_fast(sheet, 46, 1, lot_id, dev_num, "WLT_SMSR")
-    paste_text_file_fast(sheet, 79, 1, lot_id, dev_num, "LIV_vs_Temp")
+def upscale_png(data, scale_percent):
+    """Resize PNG bytes in memory (Excel's Chart.Export has no resolution setting)."""
+    with Image.open(io.BytesIO(data)) as img:
+        new_width = int(img.width * (scale_percent / 100))
+        new_height = int(img.height * (scale_percent / 100))
+        img = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def read_chart_bounds(session):
+    """Read the CHART BOUNDS block (D7:E13) that Excel calculated, in one COM call."""
+    values = session.read_range("D7:E13")
+    return {7 + i: (lo, hi) for i, (lo, hi) in enumerate(values)}
+
+def write_snl_values(session, snl):
+    """
+    Write the formula results Excel would have calculated for the chart series (calculation stays
+    manual). The session puts the formulas back before a later device is calculated by Excel.
+    """
+    # Rows 74-76 hold =row70+5 .. =row72+5 through column AY; cells past the data evaluate to 5
+    smsr_currents, smsr_rows = snl["series"]["smsr"]
+    width = max(SMSR_FORMULA_COLUMNS, smsr_rows.shape[1])
+    block = [[5.0] * width for _ in range(SMSR_FORMULA_ROWS)]
+    for i, values in enumerate(smsr_rows[:SMSR_FORMULA_ROWS]):
+        block[i][:len(values)] = values.tolist()
+    session.write_values(74, 1, block)
+
+    # L3:L5 series names: CONCAT(temperature, " C")
+    labels = (snl["labels"] + [" C"] * SMSR_FORMULA_ROWS)[:SMSR_FORMULA_ROWS]
+    session.write_values(3, 12, [[label] for label in labels])
+
+def update_chart_axes(session, chart_number, bounds):
+    axes_config = axes_config_from_bounds(bounds, chart_number)
 
-    sheet.Cells(1, 2).Value = sku
+    try:
+        debug(f"Chart {chart_number} - Original values:\n"
+              f"  Primary Y: {axes_config['primary_y'][0]} to {axes_config['primary_y'][1]}\n"
+              f"  Secondary Y: {axes_config['secondary_y'][0]} to {axes_config['secondary_y'][1]}\n"
+              f"  X: {axes_config['primary_x'][0]} to {axes_config['primary_x'][1]}")
 
-    # Control Excel calculation timing
-    print("Performing Excel calculations...")
-    original_calculation = excel.Calculation
-    excel.Calculation = -4135  # xlCalculationManual
-    sheet.Calculate()
-    excel.CalculateFull()
-    
-    # Small delay to ensure calculations complete
-    import time
-    time.sleep(0.5)
+        # Chart-specific expansions and custom units (shared with the headless renderer)
+        limits = axis_limits(axes_config, chart_number)
 
-    charts_sheet = wb.Sheets("Charts")
-    chart1 = charts_sheet.ChartObjects("Chart1").Chart
-    chart2 = charts_sheet.ChartObjects("Chart2").Chart
+        # Chart 1 shows 0.1nm minor ticks outside the wavelength axis, without minor gridlines
+        writes = session.apply_axis_limits(chart_number, limits, minor_ticks_outside=(chart_number == 1))
+        debug(f"  Axis properties written: {writes}")
 
-    # Set axes with expanded bounds and units control
-    print("Setting chart axes...")
-    update_chart_axes(sheet, chart1, 1)
-    update_chart_axes(sheet, chart2, 2)
-    
-    # Verify axes settings before export
-    print("Verifying axis settings...")
-    try:
-        print(f"Chart1 verification - Left Y Max: {chart1.Axes(2).MaximumScale}")
-        print(f"Chart1 verification - Right Y Max: {chart1.Axes(2, 2).MaximumScale}")
-        print(f"Chart2 verification - Left Y Max: {chart2.Axes(2).MaximumScale}")
     except Exception as e:
-        print(f"Verification warning: {e}")
-    
-    # Small delay before export to ensure settings are applied
-    time.sleep(0.5)
+        print(f"Failed to set axes for Chart{chart_number}: {e}")
+        import traceback
+        traceback.print_exc()
 
-    liv_chart_path = os.path.join(destination_folder, "temp_chart_liv.png")
-    smsr_chart_path = os.path.join(destination_folder, "temp_chart_smsr.png")
+# -------------------------
+# Chart backends
+# -------------------------
+def calculate_snl(key_rows, blocks, sku):
+    """Compute the "snl" values with NumPy from the parsed raw files."""
+    missing = [phrase for phrase, block in blocks.items() if block is None]
+    if missing:
+        raise FileNotFoundError(f"Raw files not found: {', '.join(missing)}")
+    if sku not in key_rows:
+        raise KeyError(f"SKU {sku} not found in the Key sheet")
+
+    return compute_snl(blocks["WLT_Wave"], blocks["WLT_SMSR"], blocks["LIV_vs_Temp"], key_rows[sku])
+
+def export_charts_excel(session, blocks, sku, snl, cross_check=False):
+    """
+    Fill the open Excel template for one device and export Chart1 / Chart2 as PNG bytes (at
+    Excel's export size; the write stage upscales them).
+    With snl values from NumPy Excel never recalculates; without them (or when cross-checking)
+    the workbook's own calculation chain is run.
+    """
+    with span("excel_paste"):
+        session.reset()
+        for phrase, start_row in RAW_FILE_ROWS:
+            paste_text_file_fast(session, start_row, 1, blocks[phrase], phrase)
+        session.set_cell(1, 2, sku)
+
+    if snl is None or cross_check:
+        debug("Performing Excel calculations...")
+        with span("excel_calculate"):
+            session.calculate()
+        if snl is not None:
+            mismatches = compare_bounds(read_chart_bounds(session), snl["bounds"])
+            for mismatch in mismatches:
+                print(f"  SNL CROSS-CHECK MISMATCH {mismatch}")
+            if not mismatches:
+                print("  SNL cross-check: NumPy matches Excel")
+
+    if snl is not None:
+        with span("excel_snl_write"):
+            write_snl_values(session, snl)
+        bounds = snl["bounds"]
+    else:
+        bounds = read_chart_bounds(session)
 
-    print("Exporting charts...")
-    chart1.Export(liv_chart_path)
-    chart2.Export(smsr_chart_path)
+    # Set axes with expanded bounds and units control
+    debug("Setting chart axes...")
+    with span("excel_axes"):
+        update_chart_axes(session, 1, bounds)
+        update_chart_axes(session, 2, bounds)
+
+    debug("Exporting charts...")
+    with span("excel_export"):
+        return session.export_png(1), session.export_png(2)
+
+def export_charts_matplotlib(snl):
+    """Draw Chart1 / Chart2 headless from the NumPy "snl" values, as PNG bytes at the final size."""
+    debug("Rendering charts...")
+    scale = IMAGE_SCALE_PERCENT / 100
+    with span("render"):
+        return render_chart_png(render_wavelength_smsr_chart, snl, scale), render_chart_png(render_liv_chart, snl, scale)
 
-    # Restore calculation mode
-    excel.Calculation = original_calculation
+# -------------------------
+# Word document
+# -------------------------
+def build_word_document(output_path, dev_num, sn, sku, liv_chart_png, smsr_chart_png, date_text=None):
+    debug(f"Creating Word document: {output_path}")
 
-    wb.Close(SaveChanges=False)
+    try:
+        # The template is compiled once per process; each document is written in one zip pass
+        template = load_word_template(word_template_path)
 
-    resized_liv_chart_path = liv_chart_path.replace(".png", "_resized.png")
-    resized_smsr_chart_path = smsr_chart_path.replace(".png", "_resized.png")
-    resize_image(liv_chart_path, resized_liv_chart_path, 130)
-    resize_image(smsr_chart_path, resized_smsr_chart_path, 130)
+        if date_text is None:
+            date_text = datetime.now().strftime("%m/%d/%Y")
+        replacements = {"DEV-HERE": dev_num, "SN-HERE": sn, "SKU-HERE": sku, "TODAYS-DATE": date_text}
+
+        # Images are swapped by name: the LIV slot gets Chart2, the SMSR slot gets Chart1
+        images = {"LIV-IMAGE-HERE": smsr_chart_png, "SMSR-IMAGE-HERE": liv_chart_png}
+        with span("docx"):
+            template.write(output_path, replacements, images, width_inches=IMAGE_WIDTH_INCHES)
+        debug(f"Images inserted: {len([slot for slot in template.image_slots if slot in images])}")
+        debug(f"Word document saved successfully: {output_path}")
 
-    output_path = os.path.join(data_package_folder, f"{sn} {sku} {dev_num}.docx")
-    print(f"Creating Word document: {output_path}")
-    
-    try:
-        # Copy Word template
-        shutil.copyfile(word_template_path, output_path)
-        print(f"Template copied successfully")
-        
-        # Open document
-        python_doc = Document(output_path)
-        print(f"Document opened successfully")
-
-        # Replace text placeholders
-        replacements = {"DEV-HERE": dev_num, "SN-HERE": sn, "SKU-HERE": sku, "TODAYS-DATE": datetime.now().strftime("%m/%d/%Y")}
-        replace_text_in_document(python_doc, replacements)
-        print(f"Text replacements completed")
-
-        # Insert images
-        images_inserted = 0
-        for para in python_doc.paragraphs:
-            if "LIV-IMAGE-HERE" in para.text:
-                para.text = ""
-                para.add_run().add_picture(resized_smsr_chart_path, width=Inches(6))
-                images_inserted += 1
-                print(f"Inserted LIV chart: {resized_smsr_chart_path}")
-            elif "SMSR-IMAGE-HERE" in para.text:
-                para.text = ""
-                para.add_run().add_picture(resized_liv_chart_path, width=Inches(6))
-                images_inserted += 1
-                print(f"Inserted SMSR chart: {resized_liv_chart_path}")
-        
-        print(f"Images inserted: {images_inserted}")
-
-        # Save document
-        python_doc.save(output_path)
-        print(f"Word document saved successfully: {output_path}")
-        
         # Verify file exists and has size > 0
         if os.path.exists(output_path):
             file_size = os.path.getsize(output_path)
-            print(f"File exists with size: {file_size} bytes")
-        else:
-            print("ERROR: File was not created!")
-            
+            debug(f"File exists with size: {file_size} bytes")
+            return file_size > 0
+        print("ERROR: File was not created!")
+        return False
+
     except Exception as e:
         print(f"ERROR creating Word document: {e}")
         import traceback
         traceback.print_exc()
+        return False
 
-    os.remove(liv_chart_path)
-    os.remove(smsr_chart_path)
-    os.remove(resized_liv_chart_path)
-    os.remove(resized_smsr_chart_path)
-    
-    print(f"Completed device {dev_num}\n" + "="*50 + "\n")
+# -------------------------
+# Device stages
+# -------------------------
+# One device is a job dict that moves through three stages, each bound by a different resource:
+#   prepare  disk + NumPy   resolve and parse the raw files, compute snl
+#   render   Excel / CPU    fill the template and export the charts (or draw them with matplotlib)
+#   write    CPU + disk     upscale the images and write the Word document (and the .xlsm workbook)
+# A failing stage marks its job as failed; later stages pass the job through untouched.
+# With a batch journal, the start, exported charts, written docx and outcome of every device are
+# journaled as they happen, so --resume can continue an interrupted batch.
+
+def new_job(fields, journal=None, workbook=False):
+    lot_id, dev_num, sn, sku = fields
+    job = {
+        "fields": fields,
+        "result": {"Lot_ID": lot_id, "Dev#": dev_num, "SN": sn, "SKU": sku, "status": "ok", "error": "", "output": ""},
+        "blocks": None,
+        "snl": None,
+        "charts": None,
+        "start": time.perf_counter(),
+        "cpu": 0.0,
+        "journal": journal,
+        "workbook": workbook,
+    }
+    journal_stage(job, "start")
+    return job
+
+def journal_stage(job, stage, **fields):
+    if job["journal"] is not None:
+        job["journal"].record(manifest_key(job["fields"]), stage, **fields)
+
+def prepare_device(job, device_file_index, key_rows, backend, cache=None, sweeps=None):
+    lot_id, dev_num, sn, sku = job["fields"]
+    debug(f"Processing Device: Lot={lot_id}, Dev={dev_num}, SN={sn}, SKU={sku}")
+    with span("lookup"):
+        raw_files = find_raw_files(device_file_index, lot_id, dev_num)
+    job["blocks"] = parse_raw_files(raw_files, cache, sweeps)
+    try:
+        with span("snl"):
+            job["snl"] = calculate_snl(key_rows, job["blocks"], sku)
+    except (FileNotFoundError, KeyError, ValueError) as e:
+        if backend != "excel":
+            print(f"ERROR rendering charts for {dev_num}: {e} - skipping device\n")
+            job["result"].update(status="skipped", error=str(e))
+            return
+        print(f"NumPy snl calculation unavailable ({e}) - falling back to Excel calculation")
+
+def render_device(job, backend, session, snl_cross_check=False):
+    # Chart images stay in memory from export to docx
+    if backend == "excel":
+        job["charts"] = export_charts_excel(session, job["blocks"], job["fields"][3], job["snl"], snl_cross_check)
+    else:
+        job["charts"] = export_charts_matplotlib(job["snl"])
+    job["upscale"] = backend == "excel"
+    # The parsed raw files are kept for the workbook when one is written
+    if not job["workbook"]:
+        job["blocks"] = None
+    job["snl"] = None
+    journal_stage(job, "charts")
+
+def write_device(job, date_text=None):
+    lot_id, dev_num, sn, sku = job["fields"]
+    liv_chart_png, smsr_chart_png = job["charts"]
+    job["charts"] = None
+    if job["upscale"]:
+        with span("image_upscale"):
+            liv_chart_png = upscale_png(liv_chart_png, IMAGE_SCALE_PERCENT)
+            smsr_chart_png = upscale_png(smsr_chart_png, IMAGE_SCALE_PERCENT)
+
+    output_path = output_path_for(dev_num, sn, sku)
+    job["result"]["output"] = output_path
+    if not build_word_document(output_path, dev_num, sn, sku, liv_chart_png, smsr_chart_png, date_text):
+        job["result"].update(status="error", error="Word document was not written")
+        return
+    # The size lets a resumed batch check the document is still the one that was written
+    journal_stage(job, "docx", output=output_path, size=os.path.getsize(output_path))
+    if job["workbook"]:
+        write_workbook(job)
+
+def write_workbook(job):
+    """Save the device's filled graph workbook, patched from the template without Excel."""
+    lot_id, dev_num, sn, sku = job["fields"]
+    blocks = job["blocks"]
+    job["blocks"] = None
+    with span("xlsm"):
+        load_xlsm_template(excel_template_path).write(workbook_path_for(dev_num, sn, sku), sku,
+                                                     [(start_row, blocks[phrase]) for phrase, start_row in RAW_FILE_ROWS])
+
+def run_stage(job, stage, *args):
+    """Run one stage of a job unless an earlier stage failed or skipped it. Errors stay with the device."""
+    if job["result"]["status"] != "ok":
+        return
+    cpu_start = time.thread_time()
+    try:
+        stage(job, *args)
+    except Exception as e:
+        print(f"ERROR processing device {job['fields'][1]}: {e}")
+        import traceback
+        traceback.print_exc()
+        job["result"].update(status="error", error=str(e))
+        job["blocks"] = job["snl"] = job["charts"] = None
+    finally:
+        job["cpu"] += time.thread_time() - cpu_start
+
+def finish_job(job, trace):
+    """Result of a finished job; records the whole-device span (inside the job's trace.device block)."""
+    result = job["result"]
+    wall = time.perf_counter() - job["start"]
+    result["seconds"] = round(wall, 3)
+    trace.record("device", wall, job["cpu"], result["status"])
+    if result["status"] == "ok":
+        journal_stage(job, "done")
+    else:
+        journal_stage(job, "failed", error=result["error"])
+    debug(f"Completed device {job['fields'][1]}\n" + "="*50 + "\n")
+    trace.device_done()
+    return result
 
-excel.Quit()
+# -------------------------
+# Process Each Device
+# -------------------------
+def open_excel(new_instance=False):
+    """Start Excel through COM. Worker processes each need their own instance (DispatchEx)."""
+    import win32com.client as win32
+    excel = win32.DispatchEx("Excel.Application") if new_instance else win32.Dispatch("Excel.Application")
+    excel.Visible = False
+    return excel
+
+def process_device(fields, device_file_index, key_rows, backend, session, snl_cross_check=False, date_text=None, cache=None,
+                   sweeps=None, journal=None, workbooks=False):
+    """Build the datasheet of one device, one stage after the other. Returns a result dict for the batch summary."""
+    trace = active_trace()
+    job = new_job(fields, journal, workbooks)
+    with trace.device(fields[0], fields[1], fields[3]):
+        run_stage(job, prepare_device, device_file_index, key_rows, backend, cache, sweeps)
+        run_stage(job, render_device, backend, session, snl_cross_check)
+        run_stage(job, write_device, date_text)
+        return finish_job(job, trace)
+
+def _put(q, item, stop):
+    """Queue.put that gives up once the pipeline is stopping (so no stage blocks forever)."""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+def _get(q, stop):
+    """Queue.get that returns None (end of stream) once the pipeline is stopping and the queue is empty."""
+    while True:
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return None
+
+def process_devices_pipelined(device_rows, device_file_index, key_rows, backend, session, snl_cross_check=False,
+                              date_text=None, cache=None, sweeps=None, journal=None, workbooks=False):
+    """
+    Overlap the stages of consecutive devices: while device N renders, device N+1 is parsed and
+    device N-1 is written. Rendering stays on the calling thread, which owns the Excel instance;
+    the bounded queues between the stages keep at most a few devices in memory.
+    """
+    trace = active_trace()
+    prepared = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    rendered = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+    stop = threading.Event()
+    results = []
+    errors = []
+
+    def prepare_all():
+        try:
+            for fields in device_rows:
+                if stop.is_set():
+                    break
+                job = new_job(fields, journal, workbooks)
+                with trace.device(fields[0], fields[1], fields[3]):
+                    run_stage(job, prepare_device, device_file_index, key_rows, backend, cache, sweeps)
+                if not _put(prepared, job, stop):
+                    break
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            _put(prepared, None, stop)
+
+    def write_all():
+        try:
+            while True:
+                job = _get(rendered, stop)
+                if job is None:
+                    break
+                fields = job["fields"]
+                with trace.device(fields[0], fields[1], fields[3]):
+                    run_stage(job, write_device, date_text)
+                    results.append(finish_job(job, trace))
+        except BaseException as e:
+            errors.append(e)
+            stop.set()
+
+    threads = [threading.Thread(target=prepare_all, name="prepare", daemon=True),
+               threading.Thread(target=write_all, name="write", daemon=True)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            job = _get(prepared, stop)
+            if job is None:
+                break
+            fields = job["fields"]
+            with trace.device(fields[0], fields[1], fields[3]):
+                run_stage(job, render_device, backend, session, snl_cross_check)
+            if not _put(rendered, job, stop):
+                break
+        _put(rendered, None, stop)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return results
+
+def process_devices(device_rows, device_file_index, key_rows, backend, snl_cross_check=False, new_excel_instance=False, date_text=None,
+                    measurement_cache=True, sequential=False, session=None, journal=None, workbooks=False):
+    """
+    Process a list of (lot_id, dev_num, sn, sku) tuples with one rendering backend.
+    Stages of consecutive devices overlap unless sequential is set (debug mode: one device at a time).
+    A long-running caller (the watch daemon) passes its own open ExcelSession to keep Excel warm.
+    With a BatchJournal every device's progress is journaled for --resume; with workbooks each
+    device's filled .xlsm is saved next to its datasheet.
+    """
+    trace = active_trace()
+    cache = open_measurement_cache(measurement_cache)
+    sweeps = load_sweep_index(other_folder)
+    excel = None
+    if session is None and backend == "excel":
+        excel = open_excel(new_excel_instance)
+        if trace.profiler is not None:
+            excel = trace.profiler.wrap_com(excel)
+        # The template is opened once per batch (per worker) and reset between devices
+        session = ExcelSession(excel, excel_template_path).open()
+    try:
+        if sequential:
+            results = [process_device(fields, device_file_index, key_rows, backend, session, snl_cross_check, date_text, cache,
+                                      sweeps, journal, workbooks)
+                       for fields in device_rows]
+        else:
+            results = process_devices_pipelined(device_rows, device_file_index, key_rows, backend, session,
+                                                snl_cross_check, date_text, cache, sweeps, journal, workbooks)
+    finally:
+        if excel is not None:
+            session.close()
+            excel.Quit()
+        if cache is not None:
+            cache.summary()
+            cache.save_stamps()
+            cache.evict()
+    return results
+
+def apply_worker_settings(settings):
+    """Pool initializer: take over the parent's WORKER_SETTINGS values."""
+    globals().update(settings)
+
+def worker_main(worker_id, device_rows, device_file_index, key_rows, backend, snl_cross_check=False, date_text=None,
+                verbose=False, profile_spec=None, measurement_cache=True, sequential=False, journal_spec=None,
+                workbooks=False):
+    """
+    Process-pool entry point: each worker owns its backend (and its own Excel instance).
+    Returns (results, spans); the spans are written to the trace file by the parent process.
+    journal_spec (from BatchJournal.for_worker) gives the worker its own journal file.
+    """
+    trace = set_active_trace(make_trace(profile_spec, os.path.join(destination_folder, PROFILE_FOLDER_NAME),
+                                        total_devices=len(device_rows), verbose=verbose, label=f"worker {worker_id}",
+                                        prefix=f"worker{worker_id}-"))
+    journal = BatchJournal(*journal_spec) if journal_spec else None
+    try:
+        results = process_devices(device_rows, device_file_index, key_rows, backend,
+                                  snl_cross_check, new_excel_instance=True, date_text=date_text,
+                                  measurement_cache=measurement_cache, sequential=sequential, journal=journal,
+                                  workbooks=workbooks)
+    finally:
+        if journal is not None:
+            journal.close()
+    if trace.profiler is not None:
+        trace.profiler.summary()
+    return results, trace.spans
+
+def run_parallel(device_rows, device_file_index, key_rows, backend, workers, snl_cross_check=False, date_text=None,
+                 profile_spec=None, measurement_cache=True, sequential=False, journal=None, workbooks=False):
+    """Split the devices across a process pool and merge the per-worker results and trace spans."""
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    trace = active_trace()
+    chunks = [device_rows[i::workers] for i in range(workers)]
+    chunks = [chunk for chunk in chunks if chunk]
+    results = []
+    settings = {name: globals()[name] for name in WORKER_SETTINGS}
+    with ProcessPoolExecutor(max_workers=len(chunks), initializer=apply_worker_settings, initargs=(settings,)) as pool:
+        futures = {pool.submit(worker_main, i, chunk, device_file_index, key_rows, backend, snl_cross_check, date_text,
+                               trace.verbose, profile_spec, measurement_cache, sequential,
+                               journal.for_worker(i) if journal is not None else None, workbooks): chunk
+                   for i, chunk in enumerate(chunks)}
+        for future in as_completed(futures):
+            try:
+                worker_results, spans = future.result()
+                results.extend(worker_results)
+                trace.extend(spans)
+                trace.flush()
+            except Exception as e:
+                # The whole worker died (e.g. Excel crashed) - mark its devices as failed
+                print(f"ERROR worker failed: {e}")
+                results.extend({"Lot_ID": f[0], "Dev#": f[1], "SN": f[2], "SKU": f[3], "status": "error",
+                                "error": f"worker failed: {e}", "output": "", "seconds": 0} for f in futures[future])
+    return results
+
+def print_batch_summary(results, elapsed):
+    """Print one summary for the whole batch, including every device that did not complete."""
+    ok = [r for r in results if r["status"] == "ok"]
+    failed = [r for r in results if r["status"] != "ok"]
+    print("="*50)
+    print(f"Batch summary: {len(ok)} of {len(results)} datasheets created in {elapsed:.1f} s"
+          + (f" ({len(results) / elapsed:.2f} devices/s)" if elapsed > 0 else ""))
+    for r in failed:
+        print(f"  {r['status'].upper()}: Lot={r['Lot_ID']}, Dev={r['Dev#']}: {r['error']}")
+    return failed
+
+def stale_devices(manifest, device_rows, device_file_index, backend, force=False, verbose=False, workbooks=False):
+    """
+    Devices whose inputs, templates, fields or settings changed since their last build.
+    Returns (stale rows, {manifest key: fingerprint}) and prints how many are up to date and why the rest are not.
+    """
+    fingerprints = {}
+    stale_rows = []
+    reason_counts = {}
+    for fields in device_rows:
+        lot_id, dev_num, sn, sku = fields
+        output_path = output_path_for(dev_num, sn, sku)
+        fingerprint = device_fingerprint(find_raw_files(device_file_index, lot_id, dev_num), fields, backend, workbooks)
+        reasons = ["--force"] if force else stale_reasons(manifest, manifest_key(fields), output_path, fingerprint)
+        if reasons:
+            if verbose:
+                print(f"Rebuilding {os.path.basename(output_path)}: {'; '.join(reasons)}")
+            for reason in reasons:
+                kind = reason.split(" (")[0]
+                reason_counts[kind] = reason_counts.get(kind, 0) + 1
+            fingerprints[manifest_key(fields)] = fingerprint
+            stale_rows.append(fields)
+    print(f"{len(device_rows) - len(stale_rows)} of {len(device_rows)} datasheets up to date, {len(stale_rows)} to build"
+          + (f" ({', '.join(f'{reason}: {count}' for reason, count in reason_counts.items())})" if reason_counts else ""))
+    return stale_rows, fingerprints
+
+def resume_rows(stale_rows, journal_states, digests):
+    """
+    Split a resumed batch into the devices still to build and the results of those the journal
+    settles: finished with the same inputs (output still the size it was written at), or failed
+    MAX_ATTEMPTS times already. Returns (rows to build, settled results).
+    """
+    rows = []
+    settled = []
+    for fields in stale_rows:
+        key = manifest_key(fields)
+        state = journal_states.get(key)
+        result = {"Lot_ID": fields[0], "Dev#": fields[1], "SN": fields[2], "SKU": fields[3], "status": "ok", "error": "",
+                  "output": "", "seconds": 0}
+        if state is not None and completed(state, digests[key]):
+            settled.append(dict(result, output=state["output"]))
+        elif state is not None and state["attempts"] >= MAX_ATTEMPTS:
+            settled.append(dict(result, status="error",
+                                error=f"gave up after {state['attempts']} attempts: {state['error'] or 'interrupted'}"))
+        else:
+            rows.append(fields)
+    finished = sum(1 for result in settled if result["status"] == "ok")
+    print(f"Resume: {finished} devices already finished, {len(settled) - finished} given up, {len(rows)} to build")
+    return rows, settled
+
+def record_results(manifest, results, fingerprints):
+    """Record what was built; failed devices stay out of the manifest so they are retried next run."""
+    for result in results:
+        key = manifest_key((result["Lot_ID"], result["Dev#"]))
+        if result["status"] == "ok" and key in fingerprints:
+            record_build(manifest, key, result["output"], fingerprints[key])
+    save_manifest(manifest, data_package_folder)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Create datasheets for every device in Devices.xlsx")
+    parser.add_argument("--backend", choices=["excel", "matplotlib"], default=chart_backend,
+                        help="chart renderer: Excel COM export or headless matplotlib")
+    parser.add_argument("--snl-cross-check", action="store_true",
+                        help="excel backend: also run Excel's calculation and compare it with the NumPy values")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes (each runs its own renderer; best with --backend matplotlib)")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild every datasheet, even those the build manifest shows are up to date")
+    parser.add_argument("--verbose", action="store_true",
+                        help="print every step of every device (timings always go to the trace file)")
+    parser.add_argument("--sequential", action="store_true",
+                        help="debug mode: run each device's stages one after the other instead of overlapping devices")
+    parser.add_argument("--no-measurement-cache", action="store_true",
+                        help="parse every raw file from text instead of using the parsed measurement cache")
+    parser.add_argument("--xlsm", action="store_true", default=write_workbooks,
+                        help="also save each device's filled graph workbook (.xlsm), written without Excel")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"continue the last batch from its journal: skip devices it finished, retry failed ones "
+                             f"(up to {MAX_ATTEMPTS} attempts each)")
+    parser.add_argument("--profile", metavar="SPEC", default=os.environ.get(PROFILE_ENV_VAR),
+                        help=f"profile stages or devices, e.g. \"mode=sample;stages=parse,excel_axes;every=10\" "
+                             f"(default: ${PROFILE_ENV_VAR}; off when unset)")
+    args = parser.parse_args(argv)
+
+    os.makedirs(data_package_folder, exist_ok=True)
+    devices_df = load_devices()
+    device_rows = [device_fields(row) for _, row in devices_df.iterrows()]
+
+    # Load the device file index written by Part1 (rebuilt if stale)
+    device_file_index = load_or_build_device_index(other_folder)
+
+    # A resumed batch keeps the date of the batch it continues, so its datasheets match the rest
+    date_text = datetime.now().strftime("%m/%d/%Y")
+    batch, journal_states = load_journal(data_package_folder) if args.resume else (None, {})
+    if args.resume:
+        if batch is None:
+            print("No batch journal to resume - starting a new batch")
+        else:
+            date_text = batch["date_text"]
+            print(f"Resuming batch {batch['batch']} ({batch['devices']} devices, dated {date_text})")
+
+    # Only devices whose inputs, templates, fields or settings changed since their last build are rebuilt
+    manifest = load_manifest(data_package_folder)
+    stale_rows, fingerprints = stale_devices(manifest, device_rows, device_file_index, args.backend,
+                                             args.force, args.verbose, args.xlsm)
+
+    if not stale_rows:
+        print("All datasheets created successfully.")
+        return
+
+    digests = {key: fingerprint_digest(fingerprint) for key, fingerprint in fingerprints.items()}
+    batch_keys = [manifest_key(fields) for fields in stale_rows]
+    results = []
+    if batch is not None:
+        stale_rows, results = resume_rows(stale_rows, journal_states, digests)
+        journal = BatchJournal(data_package_folder, digests)
+    else:
+        journal = BatchJournal.start(data_package_folder, date_text, args.backend, digests)
+
+    trace = None
+    start = time.perf_counter()
+    try:
+        if stale_rows:
+            key_rows = load_key_rows(excel_template_path)
+
+            # Per-stage, per-device spans go to a JSON lines file next to Devices.xlsx
+            # With --profile the selected stages are also profiled into Script Output/profile
+            trace = set_active_trace(make_trace(args.profile, os.path.join(destination_folder, PROFILE_FOLDER_NAME),
+                                                trace_path_for(destination_folder), "Part2", len(stale_rows), args.verbose))
+
+            if args.workers > 1:
+                print(f"Processing {len(stale_rows)} devices with {args.workers} workers ({args.backend} backend)...")
+                results += run_parallel(stale_rows, device_file_index, key_rows, args.backend, args.workers, args.snl_cross_check,
+                                        date_text, args.profile, not args.no_measurement_cache, args.sequential, journal,
+                                        args.xlsm)
+            else:
+                results += process_devices(stale_rows, device_file_index, key_rows, args.backend, args.snl_cross_check,
+                                           date_text=date_text, measurement_cache=not args.no_measurement_cache,
+                                           sequential=args.sequential, journal=journal, workbooks=args.xlsm)
+    finally:
+        journal.close()
+
+    record_results(manifest, results, fingerprints)
+
+    failed = print_batch_summary(results, time.perf_counter() - start)
+    if trace is not None:
+        trace.summary()
+    if failed:
+        print_report(data_package_folder, batch_keys)
+    else:
+        print("All datasheets created successfully.")
 
-print("All datasheets created successfully.")
+if __name__ == "__main__":
+    main(sys.argv[1:])
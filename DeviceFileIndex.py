@@ -0,0 +1,186 @@
+import os
+import re
+import json
+import tempfile
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+INDEX_FILENAME = "device_index.json"
+INDEX_VERSION = 1
+
+# Filename keywords for the raw measurement files in "Script Output/Other".
+# Order matters: the first keyword found in a filename decides its type.
+MEASUREMENT_TYPES = ["LIV_vs_Temp", "WLT_SMSR", "WLT_Wave", "SpecWidth"]
+
+# -------------------------
+# FILENAME PARSING
+# -------------------------
+def parse_filename(filename):
+    """
+    Parse filename to extract Lot_ID and Dev#
+    Example formats:
+    - 795-DBRL051525B-G11X_DryEtch-37-131_0.0900A_LIV_vs_Temp.jpg
+    - 852-DBRL051723C-G2X-25-79_0.1500A_LIV_vs_Temp.jpg
+    - 852-DBRL051723C-G2X-25-79_WLT_Wave.txt
+    """
+    try:
+        # Remove the file extension and measurement type suffix
+        base_name = os.path.splitext(filename)[0]
+        base_name = base_name.replace("_LIV_vs_Temp", "").replace("_SpecWidth", "").replace("_Wave-SMSR_vs_Temp", "").replace("_WLT_SMSR", "").replace("_WLT_Wave", "")
+
+        # Remove the current measurement part (e.g., _0.0900A, _0.1500A)
+        if "_0." in base_name:
+            base_name = base_name.split("_0.")[0]
+
+        # Handle different patterns
+        if "G11X_DryEtch-" in base_name:
+            # Pattern: 795-DBRL051525B-G11X_DryEtch-37-131
+            parts = base_name.split("_DryEtch-")
+            lot_id = parts[0]  # 795-DBRL051525B-G11X
+            dev_num = parts[1]  # 37-131
+        elif "G2X-" in base_name:
+            # Pattern: 852-DBRL051723C-G2X-25-79
+            parts = base_name.split("-")
+            lot_id = "-".join(parts[:3])  # 852-DBRL051723C-G2X
+            dev_num = "-".join(parts[3:5])  # 25-79
+        else:
+            # Generic fallback - look for pattern: (anything)X-(digits)-(digits)
+            match = re.match(r'(.+X)(?:_DryEtch)?-(\d+-\d+)', base_name)
+            if match:
+                lot_id = match.group(1)
+                dev_num = match.group(2)
+            else:
+                # Try to split by dashes and find reasonable components
+                parts = base_name.split("-")
+                if len(parts) >= 5:
+                    # Assume first 3 parts are lot_id, last 2 are device
+                    lot_id = "-".join(parts[:3])
+                    dev_num = "-".join(parts[-2:])
+                else:
+                    raise ValueError("Cannot determine lot_id and dev_num from filename structure")
+
+        return lot_id, dev_num
+    except Exception as e:
+        raise ValueError(f"Parsing failed: {e}")
+
+def measurement_type(filename):
+    """Return the measurement keyword of a raw file name, or None if it has none."""
+    for keyword in MEASUREMENT_TYPES:
+        if keyword in filename:
+            return keyword
+    return None
+
+# -------------------------
+# INDEX BUILD / LOAD / SAVE
+# -------------------------
+def folder_stamp(folder):
+    """Cheap fingerprint of a folder; changes whenever files are added, removed or renamed."""
+    stat = os.stat(folder)
+    return {"mtime_ns": stat.st_mtime_ns, "count": len(os.listdir(folder))}
+
+def add_to_index(index, filename):
+    """Add one raw .txt file to the index. Returns the key it was stored under, or None."""
+    if not filename.endswith(".txt"):
+        return None
+    phrase = measurement_type(filename)
+    if phrase is None:
+        return None
+    try:
+        lot_id, dev_num = parse_filename(filename)
+    except ValueError:
+        return None
+    key = (lot_id, dev_num, phrase)
+    # Keep the first file per key (sorted order) so lookups are deterministic
+    if key not in index:
+        index[key] = filename
+    return key
+
+def build_device_index(folder, filenames=None):
+    """
+    Build {(Lot_ID, Dev#, measurement type): filename} in one pass over the folder.
+    Pass filenames to index a known list without listing the folder again.
+    """
+    if filenames is None:
+        filenames = os.listdir(folder)
+    index = {}
+    for filename in sorted(filenames):
+        add_to_index(index, filename)
+    return index
+
+def update_device_index(index, filenames):
+    """
+    Add newly arrived files to an existing index in place, keeping the same first-in-sorted-order
+    choice build_device_index would make. Returns the keys that were touched.
+    """
+    touched = set()
+    for filename in sorted(filenames):
+        key = add_to_index(index, filename)
+        if key is not None:
+            index[key] = min(index[key], filename)
+            touched.add(key)
+    return touched
+
+def save_device_index(index, folder, index_path=None):
+    """Persist the index next to the folder it describes."""
+    if index_path is None:
+        index_path = os.path.join(os.path.dirname(folder), INDEX_FILENAME)
+    payload = {
+        "version": INDEX_VERSION,
+        "folder": os.path.abspath(folder),
+        "stamp": folder_stamp(folder),
+        "entries": [[lot_id, dev_num, phrase, filename] for (lot_id, dev_num, phrase), filename in sorted(index.items())],
+    }
+    # A unique temp file per writer: two processes rebuilding at once must not share one
+    fd, tmp_path = tempfile.mkstemp(prefix=".device_index_", suffix=".tmp", dir=os.path.dirname(index_path) or ".")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, index_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return index_path
+
+def load_device_index(folder, index_path=None):
+    """Load the persisted index. Returns None when it is missing, unreadable or stale."""
+    if index_path is None:
+        index_path = os.path.join(os.path.dirname(folder), INDEX_FILENAME)
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if payload.get("version") != INDEX_VERSION or payload.get("stamp") != folder_stamp(folder):
+        return None
+    return {(lot_id, dev_num, phrase): filename for lot_id, dev_num, phrase, filename in payload["entries"]}
+
+def load_or_build_device_index(folder, index_path=None):
+    """Load the persisted index, rebuilding (and re-saving) it if it is missing or stale."""
+    index = load_device_index(folder, index_path)
+    if index is None:
+        print("Device index missing or stale - rebuilding...")
+        index = build_device_index(folder)
+        save_device_index(index, folder, index_path)
+        print(f"Device index rebuilt with {len(index)} entries")
+    return index
+
+# -------------------------
+# LOOKUP
+# -------------------------
+def find_device_file(index, folder, lot_id, dev_num, phrase, index_path=None):
+    """Exact (Lot_ID, Dev#, phrase) lookup. Returns the full path or None (index_path as for load_or_build_device_index)."""
+    filename = index.get((lot_id, dev_num, phrase))
+    if filename is None:
+        return None
+    file_path = os.path.join(folder, filename)
+    if not os.path.exists(file_path):
+        # The index went stale between load and lookup - rebuild it once
+        index.clear()
+        index.update(build_device_index(folder))
+        save_device_index(index, folder, index_path)
+        filename = index.get((lot_id, dev_num, phrase))
+        return os.path.join(folder, filename) if filename else None
+    return file_path
@@ -0,0 +1,214 @@
+import os
+import time
+import shutil
+import tempfile
+
+# -------------------------
+# Excel constants (win32com does not expose them without makepy)
+# -------------------------
+XL_CALCULATION_MANUAL = -4135
+XL_CALCULATION_STATE_DONE = 0
+XL_TICK_MARK_OUTSIDE = 2
+XL_CATEGORY = 1
+XL_VALUE = 2
+XL_SECONDARY = 2
+
+# Ranges cleared before every device, as clear_old_data() always did
+BASELINE_CLEAR_RANGES = ["A69:CB72", "A40:CB43"]
+
+# Formula cells Part2 overwrites with its NumPy results (series labels, SMSR + 5 block). They are
+# saved when the template opens and put back before Excel calculates a device itself.
+FORMULA_RANGES = ["L3:L5", "A74:AY76"]
+
+class ExcelSession:
+    """
+    One open copy of the graph template, reused for every device in a batch.
+    Opens the workbook once, resets the "snl" data ranges between devices, waits on Excel's
+    calculation state instead of sleeping, and skips axis property writes that would not
+    change anything.
+    """
+
+    def __init__(self, excel, template_path, poll_interval=0.01, calculation_timeout=60):
+        self.excel = excel
+        self.template_path = template_path
+        self.poll_interval = poll_interval
+        self.calculation_timeout = calculation_timeout
+        self.workbook = None
+        self.sheet = None
+        self.charts = {}
+        self.axes = {}
+        self.axis_values = {}
+        self.dirty_ranges = []
+        self.saved_formulas = {}
+        self.overwritten_ranges = []
+        self.original_calculation = None
+        self.export_folder = None
+        self.export_count = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def open(self):
+        """Open the template and look up the sheet, charts and axes once."""
+        self.workbook = self.excel.Workbooks.Open(self.template_path)
+        # Chart.Export can only write to a file: each session gets its own folder, so concurrent
+        # runs never overwrite each other's images
+        self.export_folder = tempfile.mkdtemp(prefix="datasheet_charts_")
+        self.sheet = self.workbook.Sheets("snl")
+        self.saved_formulas = {address: self.sheet.Range(address).Formula for address in FORMULA_RANGES}
+        self.overwritten_ranges = []
+
+        # Calculation is driven explicitly (or not at all when the NumPy snl values are used)
+        self.original_calculation = self.excel.Calculation
+        self.excel.Calculation = XL_CALCULATION_MANUAL
+
+        charts_sheet = self.workbook.Sheets("Charts")
+        for chart_number in (1, 2):
+            chart = charts_sheet.ChartObjects(f"Chart{chart_number}").Chart
+            self.charts[chart_number] = chart
+            self.axes[chart_number] = {
+                'primary_x': chart.Axes(XL_CATEGORY),
+                'primary_y': chart.Axes(XL_VALUE),
+            }
+            try:
+                self.axes[chart_number]['secondary_y'] = chart.Axes(XL_VALUE, XL_SECONDARY)
+            except Exception as e:
+                print(f"  (No secondary Y axis for Chart{chart_number}: {e})")
+        return self
+
+    def close(self):
+        """Restore the calculation mode and close the template without saving."""
+        if self.workbook is None:
+            return
+        try:
+            if self.original_calculation is not None:
+                self.excel.Calculation = self.original_calculation
+        finally:
+            self.workbook.Close(SaveChanges=False)
+            self.workbook = None
+            if self.export_folder:
+                shutil.rmtree(self.export_folder, ignore_errors=True)
+                self.export_folder = None
+
+    # -------------------------
+    # Sheet data
+    # -------------------------
+    def reset(self):
+        """Clear everything the previous device wrote so the next paste starts from the template."""
+        for address in BASELINE_CLEAR_RANGES + self.dirty_ranges:
+            self.sheet.Range(address).ClearContents()
+        self.dirty_ranges = []
+
+    def write_block(self, start_row, start_column, data, track=True):
+        """Write a rectangular list of rows in one COM call."""
+        num_rows = len(data)
+        num_cols = len(data[0]) if data else 0
+        if not num_rows or not num_cols:
+            return None
+        start_cell = self.sheet.Cells(start_row, start_column)
+        end_cell = self.sheet.Cells(start_row + num_rows - 1, start_column + num_cols - 1)
+        block = self.sheet.Range(start_cell, end_cell)
+        block.Value = data
+        if track:
+            self.dirty_ranges.append(block.Address)
+        return block
+
+    def write_values(self, start_row, start_column, data):
+        """Write computed results over template formulas (FORMULA_RANGES); restore_formulas() undoes it."""
+        block = self.write_block(start_row, start_column, data, track=False)
+        if block is not None:
+            self.overwritten_ranges.append(block.Address)
+        return block
+
+    def restore_formulas(self):
+        """Put back the template formulas write_values() covered (the written block may be wider)."""
+        if not self.overwritten_ranges:
+            return False
+        for address in self.overwritten_ranges:
+            self.sheet.Range(address).ClearContents()
+        for address, formulas in self.saved_formulas.items():
+            self.sheet.Range(address).Formula = formulas
+        self.overwritten_ranges = []
+        return True
+
+    def set_cell(self, row, column, value):
+        self.sheet.Cells(row, column).Value = value
+
+    def read_range(self, address):
+        return self.sheet.Range(address).Value
+
+    # -------------------------
+    # Calculation
+    # -------------------------
+    def calculate(self):
+        """Run the workbook's own calculation chain and wait until Excel reports it is done."""
+        # A previous device in the session may have left NumPy values where the formulas belong
+        self.restore_formulas()
+        self.sheet.Calculate()
+        self.excel.CalculateFull()
+        self.wait_for_calculation()
+
+    def wait_for_calculation(self):
+        """Poll Application.CalculationState until xlDone instead of sleeping a fixed time."""
+        deadline = time.monotonic() + self.calculation_timeout
+        while self.excel.CalculationState != XL_CALCULATION_STATE_DONE:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Excel still calculating after {self.calculation_timeout} s")
+            time.sleep(self.poll_interval)
+
+    # -------------------------
+    # Charts
+    # -------------------------
+    def _set_axis_property(self, chart_number, axis_name, prop, value):
+        """Write one axis property unless the session already set it to the same value."""
+        key = (chart_number, axis_name, prop)
+        if self.axis_values.get(key) == value:
+            return False
+        setattr(self.axes[chart_number][axis_name], prop, value)
+        self.axis_values[key] = value
+        return True
+
+    def apply_axis_limits(self, chart_number, limits, minor_ticks_outside=False):
+        """
+        Apply axis_limits() output to a chart. Returns the number of COM writes made.
+        Axis objects are looked up once per session and unchanged properties are skipped.
+        """
+        self.charts[chart_number].Parent.Activate()
+        writes = 0
+        for axis_name in ('primary_y', 'primary_x', 'secondary_y'):
+            if axis_name not in self.axes[chart_number]:
+                continue
+            lo, hi, major, minor = limits[axis_name]
+            # Move MaximumScale first when the new range lies above the old one, so Excel never
+            # sees Minimum > Maximum in between
+            if lo > self.axis_values.get((chart_number, axis_name, 'MaximumScale'), lo):
+                order = (('MaximumScale', hi), ('MinimumScale', lo))
+            else:
+                order = (('MinimumScale', lo), ('MaximumScale', hi))
+            for prop, value in order + (('MajorUnit', major), ('MinorUnit', minor)):
+                writes += self._set_axis_property(chart_number, axis_name, prop, value)
+
+        if minor_ticks_outside:
+            writes += self._set_axis_property(chart_number, 'primary_y', 'MinorTickMark', XL_TICK_MARK_OUTSIDE)
+            writes += self._set_axis_property(chart_number, 'primary_y', 'HasMinorGridlines', False)
+        return writes
+
+    def export(self, chart_number, output_path):
+        self.wait_for_calculation()
+        self.charts[chart_number].Export(output_path)
+        return output_path
+
+    def export_png(self, chart_number):
+        """Export a chart and return the PNG bytes; the file only lives in the session's folder."""
+        self.export_count += 1
+        path = os.path.join(self.export_folder, f"chart{chart_number}_{self.export_count}.png")
+        self.export(chart_number, path)
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        finally:
+            os.remove(path)
@@ -0,0 +1,244 @@
+import re
+import struct
+import zlib
+from collections import Counter
+
+# -------------------------
+# Fake Excel COM object model
+# -------------------------
+# A stand-in for win32com's Excel.Application with just the surface Part2 and ExcelSession use.
+# Every COM call is counted in FakeExcelApplication.calls, so the orchestration logic can be
+# exercised (and its round trips counted) on Linux without Excel.
+
+def _column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+def _column_letters(number):
+    letters = ""
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def _parse_address(address):
+    """'A17:E43' or '$A$17:$E$43' -> (row1, col1, row2, col2)."""
+    cells = re.findall(r'\$?([A-Z]+)\$?(\d+)', address)
+    (c1, r1), (c2, r2) = cells[0], cells[-1]
+    return int(r1), _column_number(c1), int(r2), _column_number(c2)
+
+def _tiny_png():
+    """A valid 1x1 white PNG, written by Chart.Export so image code downstream keeps working."""
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(b"\x00\xff\xff\xff")) + chunk(b"IEND", b"")
+
+class _Counted:
+    """Counts every attribute write on the object as one COM property call."""
+
+    def __init__(self, app, name):
+        object.__setattr__(self, "_app", app)
+        object.__setattr__(self, "_name", name)
+
+    def __setattr__(self, attr, value):
+        self._app.calls[f"{self._name}.{attr}"] += 1
+        object.__setattr__(self, attr, value)
+
+class FakeRange(_Counted):
+    def __init__(self, sheet, row1, col1, row2, col2):
+        super().__init__(sheet._app, "Range")
+        object.__setattr__(self, "_sheet", sheet)
+        object.__setattr__(self, "_bounds", (row1, col1, row2, col2))
+
+    @property
+    def Address(self):
+        row1, col1, row2, col2 = self._bounds
+        return f"${_column_letters(col1)}${row1}:${_column_letters(col2)}${row2}"
+
+    @property
+    def Value(self):
+        self._app.calls["Range.Value.get"] += 1
+        row1, col1, row2, col2 = self._bounds
+        return tuple(tuple(self._sheet.cells.get((r, c)) for c in range(col1, col2 + 1)) for r in range(row1, row2 + 1))
+
+    @Value.setter
+    def Value(self, data):
+        # The write itself is counted by _Counted.__setattr__
+        row1, col1, row2, col2 = self._bounds
+        if not isinstance(data, (list, tuple)):
+            data = [[data] * (col2 - col1 + 1)] * (row2 - row1 + 1)
+        for r, values in enumerate(data):
+            for c, value in enumerate(values):
+                self._sheet.cells[(row1 + r, col1 + c)] = value
+
+    @property
+    def Formula(self):
+        # Excel returns the formula of formula cells and the value (as text) of the others
+        self._app.calls["Range.Formula.get"] += 1
+        row1, col1, row2, col2 = self._bounds
+        return tuple(tuple("" if self._sheet.cells.get((r, c)) is None else str(self._sheet.cells[(r, c)])
+                           for c in range(col1, col2 + 1)) for r in range(row1, row2 + 1))
+
+    @Formula.setter
+    def Formula(self, data):
+        row1, col1, row2, col2 = self._bounds
+        for r, values in enumerate(data):
+            for c, value in enumerate(values):
+                if value == "":
+                    self._sheet.cells.pop((row1 + r, col1 + c), None)
+                else:
+                    self._sheet.cells[(row1 + r, col1 + c)] = value
+
+    def ClearContents(self):
+        self._app.calls["Range.ClearContents"] += 1
+        row1, col1, row2, col2 = self._bounds
+        for key in [k for k in self._sheet.cells if row1 <= k[0] <= row2 and col1 <= k[1] <= col2]:
+            del self._sheet.cells[key]
+
+class FakeSheet:
+    def __init__(self, app, name):
+        self._app = app
+        self.name = name
+        self.cells = {}
+        self.charts = {}
+
+    def Cells(self, row, column):
+        self._app.calls["Cells"] += 1
+        return FakeRange(self, row, column, row, column)
+
+    def Range(self, first, last=None):
+        self._app.calls["Range"] += 1
+        if isinstance(first, str):
+            return FakeRange(self, *_parse_address(first))
+        row1, col1, _, _ = first._bounds
+        _, _, row2, col2 = (last or first)._bounds
+        return FakeRange(self, row1, col1, row2, col2)
+
+    def Calculate(self):
+        self._app.calls["Sheet.Calculate"] += 1
+
+    def ChartObjects(self, name):
+        self._app.calls["ChartObjects"] += 1
+        if name not in self.charts:
+            self.charts[name] = FakeChartObject(self._app, name)
+        return self.charts[name]
+
+class FakeAxis(_Counted):
+    def __init__(self, app):
+        super().__init__(app, "Axis")
+
+class FakeChart:
+    def __init__(self, app, parent):
+        self._app = app
+        self.Parent = parent
+        self._axes = {}
+
+    def Axes(self, axis_type, axis_group=1):
+        self._app.calls["Chart.Axes"] += 1
+        return self._axes.setdefault((axis_type, axis_group), FakeAxis(self._app))
+
+    def Export(self, path):
+        self._app.calls["Chart.Export"] += 1
+        with open(path, "wb") as f:
+            f.write(_tiny_png())
+        return True
+
+class FakeChartObject:
+    def __init__(self, app, name):
+        self._app = app
+        self.name = name
+        self.Chart = FakeChart(app, self)
+
+    def Activate(self):
+        self._app.calls["ChartObject.Activate"] += 1
+
+class FakeWorkbook:
+    def __init__(self, app, path):
+        self._app = app
+        self.path = path
+        self.closed = False
+        self._sheets = {}
+
+    def Sheets(self, name):
+        self._app.calls["Workbook.Sheets"] += 1
+        if name not in self._sheets:
+            self._sheets[name] = FakeSheet(self._app, name)
+            self._sheets[name].cells.update(self._app.sheet_cells.get(name, {}))
+        return self._sheets[name]
+
+    def Close(self, SaveChanges=False):
+        self._app.calls["Workbook.Close"] += 1
+        self.closed = True
+
+class FakeWorkbooks:
+    def __init__(self, app):
+        self._app = app
+        self.opened = []
+
+    def Open(self, path):
+        self._app.calls["Workbooks.Open"] += 1
+        workbook = FakeWorkbook(self._app, path)
+        self.opened.append(workbook)
+        return workbook
+
+class FakeExcelApplication:
+    """
+    Drop-in for win32com.client.Dispatch("Excel.Application").
+    calculating_polls makes CalculationState report xlCalculating for that many reads
+    after each CalculateFull(), to exercise wait_for_calculation(). sheet_cells
+    ({sheet name: {(row, column): value}}) is what every opened workbook starts with.
+    """
+
+    def __init__(self, calculating_polls=0, sheet_cells=None):
+        self.calls = Counter()
+        self.sheet_cells = sheet_cells or {}
+        self.Workbooks = FakeWorkbooks(self)
+        self.Visible = False
+        self._calculation = -4105  # xlCalculationAutomatic
+        self.calculating_polls = calculating_polls
+        self._pending_polls = 0
+
+    @property
+    def Calculation(self):
+        return self._calculation
+
+    @Calculation.setter
+    def Calculation(self, value):
+        self.calls["Application.Calculation"] += 1
+        self._calculation = value
+
+    @property
+    def CalculationState(self):
+        self.calls["Application.CalculationState"] += 1
+        if self._pending_polls:
+            self._pending_polls -= 1
+            return 1  # xlCalculating
+        return 0  # xlDone
+
+    def CalculateFull(self):
+        self.calls["Application.CalculateFull"] += 1
+        self._pending_polls = self.calculating_polls
+
+    def Quit(self):
+        self.calls["Application.Quit"] += 1
+
+if __name__ == "__main__":
+    # Drive an ExcelSession over a few fake devices and show the COM round trips it makes
+    import os
+    import tempfile
+    from ExcelSession import ExcelSession
+
+    excel = FakeExcelApplication(calculating_polls=3)
+    limits = {'primary_y': (778.7, 782.2, 0.5, 0.1), 'primary_x': (0.18, 0.255, 0.01, 0.002), 'secondary_y': (-50, 60, 10, 2)}
+    with ExcelSession(excel, "template.xlsm") as session:
+        for device in range(5):
+            session.reset()
+            session.write_block(17, 1, [["Peak", "Wavelength"], [device, 1.0]])
+            session.calculate()
+            session.apply_axis_limits(1, limits, minor_ticks_outside=True)
+            session.export(1, os.path.join(tempfile.gettempdir(), "fake_chart.png"))
+    for call, count in sorted(excel.calls.items()):
+        print(f"{call:32s} {count}")
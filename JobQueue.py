@@ -0,0 +1,471 @@
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+
+from BatchJournal import MAX_ATTEMPTS, fingerprint_digest
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+# The queue is one SQLite file next to Devices.xlsx on the shared drive; workers on any machine
+# that can open it claim devices from it. No broker or server process is involved.
+QUEUE_FILENAME = "job_queue.sqlite"
+
+# A worker holds a lease on the device it builds and renews it every HEARTBEAT_SECONDS. A lease
+# not renewed for LEASE_SECONDS (worker killed, machine off) is reclaimed by the next worker that
+# looks for work. A device takes seconds, so the lease is generous. The heartbeat thread keeps
+# running while the build itself hangs (e.g. on Excel), so it stops renewing once one device has
+# held the lease for MAX_BUILD_SECONDS; the lease then expires and the device is reclaimed.
+LEASE_SECONDS = 300
+HEARTBEAT_SECONDS = 30
+MAX_BUILD_SECONDS = 1800
+
+# An idle worker looks for reclaimable or new jobs this often
+IDLE_POLL_SECONDS = 5
+
+# How long a write waits for another worker's transaction. Network shares do not support SQLite's
+# WAL mode, so the default rollback journal is used and every change is a short transaction.
+BUSY_TIMEOUT_SECONDS = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS batch (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    name TEXT, date_text TEXT, backend TEXT, workbooks INTEGER, created REAL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    position INTEGER,
+    lot_id TEXT, dev_num TEXT, sn TEXT, sku TEXT,
+    fingerprint TEXT, digest TEXT,
+    state TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT, lease_until REAL, heartbeat REAL,
+    started REAL, finished REAL, seconds REAL,
+    output TEXT, error TEXT,
+    collected INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, position);
+"""
+
+# -------------------------
+# JOB QUEUE
+# -------------------------
+# One row per device. state moves queued -> leased -> done, or back to queued when the build
+# failed (until MAX_ATTEMPTS) or the lease expired; after MAX_ATTEMPTS it ends as failed.
+# A device skipped for missing raw files fails at once - building it again cannot help.
+
+def default_worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+class JobQueue:
+    """The SQLite job queue of one batch. Connections are per thread, as sqlite3 requires."""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+        columns = [row["name"] for row in self.db.execute("PRAGMA table_info(jobs)")]
+        if "collected" not in columns:
+            # Queue files written before collect marked its jobs
+            self.db.execute("ALTER TABLE jobs ADD COLUMN collected INTEGER NOT NULL DEFAULT 0")
+
+    def close(self):
+        self.db.close()
+
+    def _transaction(self):
+        """BEGIN IMMEDIATE takes the write lock up front, so two workers never claim the same job."""
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def batch(self):
+        row = self.db.execute("SELECT * FROM batch WHERE id = 1").fetchone()
+        return dict(row) if row is not None else None
+
+    def live_leases(self, now=None):
+        now = now or time.time()
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE state = 'leased' AND lease_until >= ?", (now,)).fetchone()[0]
+
+    def uncollected(self):
+        """Devices built since the last collect (their datasheets are not in the build manifest yet)."""
+        return self.db.execute("SELECT COUNT(*) FROM jobs WHERE state = 'done' AND collected = 0").fetchone()[0]
+
+    def mark_collected(self, keys):
+        self.db.executemany("UPDATE jobs SET collected = 1 WHERE key = ?", [(key,) for key in keys])
+
+    def enqueue(self, device_rows, fingerprints, keys, date_text, backend, workbooks=False):
+        """
+        Start a new batch with one queued job per device (fingerprints and keys are per device,
+        in the order of device_rows). Refused while workers still hold leases on the current batch
+        or devices it built have not been collected.
+        """
+        self._transaction()
+        try:
+            leased = self.live_leases()
+            if leased:
+                raise RuntimeError(f"{leased} devices of the current batch are still being built - "
+                                   f"wait for the workers or until their leases expire")
+            uncollected = self.uncollected()
+            if uncollected:
+                raise RuntimeError(f"{uncollected} devices of the current batch were built but not collected - "
+                                   f"run collect first")
+            self.db.execute("DELETE FROM jobs")
+            self.db.execute("INSERT OR REPLACE INTO batch VALUES (1, ?, ?, ?, ?, ?)",
+                            (time.strftime("%Y%m%d-%H%M%S"), date_text, backend, int(workbooks), time.time()))
+            self.db.executemany(
+                "INSERT INTO jobs (key, position, lot_id, dev_num, sn, sku, fingerprint, digest) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(key, position, *fields, json.dumps(fingerprints[key]), fingerprint_digest(fingerprints[key]))
+                 for position, (fields, key) in enumerate(zip(device_rows, keys))])
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def _reclaim_expired(self, now):
+        """Expired leases go back to the queue (or fail for good after MAX_ATTEMPTS). Inside a transaction."""
+        return self.db.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+            "error = 'lease of ' || worker || ' expired', worker = NULL, lease_until = NULL "
+            "WHERE state = 'leased' AND lease_until < ?", (MAX_ATTEMPTS, now)).rowcount
+
+    def claim(self, worker, lease_seconds=LEASE_SECONDS):
+        """Lease the next queued device to worker. Returns the job row as a dict, or None when nothing is queued."""
+        now = time.time()
+        self._transaction()
+        try:
+            reclaimed = self._reclaim_expired(now)
+            row = self.db.execute("SELECT * FROM jobs WHERE state = 'queued' ORDER BY position LIMIT 1").fetchone()
+            if row is not None:
+                self.db.execute("UPDATE jobs SET state = 'leased', attempts = attempts + 1, worker = ?, lease_until = ?, "
+                                "heartbeat = ?, started = ?, error = NULL WHERE key = ?",
+                                (worker, now + lease_seconds, now, now, row["key"]))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        if reclaimed:
+            print(f"Reclaimed {reclaimed} expired lease(s)")
+        return dict(row, attempts=row["attempts"] + 1) if row is not None else None
+
+    def heartbeat(self, key, worker, lease_seconds=LEASE_SECONDS):
+        """Renew the lease; False when the worker no longer holds it (it expired and was reclaimed)."""
+        now = time.time()
+        return self.db.execute("UPDATE jobs SET lease_until = ?, heartbeat = ? WHERE key = ? AND worker = ? AND state = 'leased'",
+                               (now + lease_seconds, now, key, worker)).rowcount == 1
+
+    def complete(self, key, worker, result):
+        """
+        Record the outcome of a leased device (a Part2 result dict). Failed builds are queued again
+        until MAX_ATTEMPTS. Returns False when the lease was lost and the result discarded.
+        """
+        if result["status"] == "ok":
+            state = "'done'"
+        elif result["status"] == "skipped":
+            state = "'failed'"
+        else:
+            state = f"CASE WHEN attempts >= {MAX_ATTEMPTS} THEN 'failed' ELSE 'queued' END"
+        return self.db.execute(
+            f"UPDATE jobs SET state = {state}, worker = CASE WHEN ? = 'ok' THEN worker END, lease_until = NULL, "
+            "finished = ?, seconds = ?, output = ?, error = ? WHERE key = ? AND worker = ? AND state = 'leased'",
+            (result["status"], time.time(), result.get("seconds"), result.get("output"), result.get("error") or None,
+             key, worker)).rowcount == 1
+
+    def counts(self):
+        """{state: devices}, with leases that already expired counted as 'expired'."""
+        counts = {"queued": 0, "leased": 0, "expired": 0, "done": 0, "failed": 0}
+        for row in self.db.execute("SELECT CASE WHEN state = 'leased' AND lease_until < ? THEN 'expired' ELSE state END, "
+                                   "COUNT(*) FROM jobs GROUP BY 1", (time.time(),)):
+            counts[row[0]] = row[1]
+        return counts
+
+    def jobs(self, states=None):
+        query = "SELECT * FROM jobs"
+        if states:
+            query += f" WHERE state IN ({', '.join('?' * len(states))})"
+        return [dict(row) for row in self.db.execute(query + " ORDER BY position", tuple(states or ()))]
+
+    def workers(self):
+        """Per worker: devices done, seconds spent on them and the device it holds now."""
+        rows = self.db.execute(
+            "SELECT worker, SUM(state = 'done'), SUM(CASE WHEN state = 'done' THEN seconds ELSE 0 END), "
+            "MAX(CASE WHEN state = 'leased' THEN dev_num END), MAX(heartbeat) FROM jobs WHERE worker IS NOT NULL "
+            "GROUP BY worker ORDER BY worker").fetchall()
+        return [{"worker": row[0], "done": row[1], "seconds": row[2] or 0.0, "current": row[3], "heartbeat": row[4]}
+                for row in rows]
+
+def print_progress(queue, list_jobs=False):
+    batch = queue.batch()
+    if batch is None:
+        print(f"No batch in {queue.path}")
+        return None
+    counts = queue.counts()
+    total = sum(counts.values())
+    elapsed = time.time() - batch["created"]
+    print(f"Batch {batch['name']} ({batch['backend']} backend, dated {batch['date_text']}): "
+          f"{counts['done']} of {total} done, {counts['leased']} building, {counts['queued']} queued, "
+          f"{counts['failed']} failed" + (f", {counts['expired']} lease(s) expired" if counts["expired"] else ""))
+    remaining = counts["queued"] + counts["leased"] + counts["expired"]
+    if counts["done"] and remaining:
+        rate = counts["done"] / elapsed
+        print(f"  {rate * 60:.1f} devices/min since the batch was queued, about {remaining / rate / 60:.0f} min left")
+    for worker in queue.workers():
+        current = f", building {worker['current']}" if worker["current"] else ""
+        seen = f", last heartbeat {time.time() - worker['heartbeat']:.0f} s ago" if worker["heartbeat"] else ""
+        print(f"  {worker['worker']}: {worker['done']} done in {worker['seconds']:.0f} s{current}{seen}")
+    now = time.time()
+    for job in queue.jobs(None if list_jobs else ["failed"]):
+        error = f": {job['error']}" if job["error"] else ""
+        state = "expired" if job["state"] == "leased" and job["lease_until"] < now else job["state"]
+        print(f"  {state.upper():7s} {job['lot_id']} {job['dev_num']} ({job['attempts']} attempt(s)){error}")
+    return counts
+
+# -------------------------
+# WORKER
+# -------------------------
+class Heartbeat:
+    """Background thread renewing the lease of the device the worker is building (own connection)."""
+
+    def __init__(self, path, worker, lease_seconds, interval, max_seconds=MAX_BUILD_SECONDS):
+        self.path = path
+        self.worker = worker
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.key = None
+        self.held_since = None
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        queue = JobQueue(self.path)
+        try:
+            while not self.stopped.wait(self.interval):
+                key = self.key
+                if key is None:
+                    continue
+                if time.time() - self.held_since > self.max_seconds:
+                    print(f"{key} has been building for over {self.max_seconds:.0f} s - letting its lease expire")
+                    self.key = None
+                elif not queue.heartbeat(key, self.worker, self.lease_seconds):
+                    print(f"Lost the lease on {key} - another worker will build it")
+                    self.key = None
+        finally:
+            queue.close()
+
+    def hold(self, key):
+        """Renew key's lease from now on (for at most max_seconds)."""
+        self.held_since = time.time()
+        self.key = key
+
+    def release(self):
+        self.key = None
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+def run_worker(queue_path, worker=None, lease_seconds=LEASE_SECONDS, wait=False, max_jobs=None, verbose=False,
+               max_build_seconds=MAX_BUILD_SECONDS):
+    """
+    Claim, build and complete devices until the queue is drained (with wait, keep polling for new
+    batches). The renderer, Key rows, device index and caches are set up once per worker.
+    """
+    import Datasheet_Automation_Part2_FINAL_V3 as part2
+    from DeviceFileIndex import load_or_build_device_index
+    from PipelineTrace import PipelineTrace, set_active_trace, trace_path_for
+
+    worker = worker or default_worker_name()
+    queue = JobQueue(queue_path)
+    heartbeat = Heartbeat(queue_path, worker, lease_seconds, min(HEARTBEAT_SECONDS, lease_seconds / 3), max_build_seconds)
+    trace = set_active_trace(PipelineTrace(trace_path_for(part2.destination_folder), "JobQueue", None, verbose,
+                                           label=worker))
+    setup = None
+    built = 0
+    print(f"Worker {worker} on {queue_path}")
+    try:
+        while max_jobs is None or built < max_jobs:
+            job = queue.claim(worker, lease_seconds)
+            if job is None:
+                counts = queue.counts()
+                if not wait and not counts["leased"] and not counts["expired"]:
+                    break
+                # Devices other workers hold may still come back when their leases expire
+                time.sleep(IDLE_POLL_SECONDS)
+                continue
+
+            batch = queue.batch()
+            if setup is None or setup["backend"] != batch["backend"]:
+                if setup is not None:
+                    setup["close"]()
+                setup = worker_setup(part2, load_or_build_device_index, batch["backend"])
+            fields = (job["lot_id"], job["dev_num"], job["sn"], job["sku"])
+            print(f"{datetime.now():%H:%M:%S} {worker} building {job['lot_id']} {job['dev_num']} (attempt {job['attempts']})")
+            heartbeat.hold(job["key"])
+            try:
+                result = part2.process_device(fields, setup["device_file_index"], setup["key_rows"], batch["backend"],
+                                              setup["session"], date_text=batch["date_text"], cache=setup["cache"],
+                                              sweeps=setup["sweeps"], workbooks=bool(batch["workbooks"]))
+            except Exception as e:
+                result = {"status": "error", "error": str(e)}
+            finally:
+                heartbeat.release()
+            if not queue.complete(job["key"], worker, result):
+                print(f"Lease on {job['dev_num']} expired while it was built - result discarded")
+            built += 1
+            trace.flush()
+    finally:
+        heartbeat.close()
+        if setup is not None:
+            setup["close"]()
+        queue.close()
+        trace.flush()
+    print(f"Worker {worker} finished: {built} device(s) built")
+    return built
+
+def worker_setup(part2, load_or_build_device_index, backend):
+    """What Part2's process_devices sets up once per batch: index, Key rows, caches and the renderer."""
+    setup = {
+        "backend": backend,
+        "device_file_index": load_or_build_device_index(part2.other_folder),
+        "key_rows": part2.load_key_rows(part2.excel_template_path),
+        "cache": part2.open_measurement_cache(),
+        "sweeps": part2.load_sweep_index(part2.other_folder),
+        "session": None,
+    }
+    excel = None
+    if backend == "excel":
+        excel = part2.open_excel(new_instance=True)
+        setup["session"] = part2.ExcelSession(excel, part2.excel_template_path).open()
+
+    def close():
+        if excel is not None:
+            setup["session"].close()
+            excel.Quit()
+        if setup["cache"] is not None:
+            setup["cache"].save_stamps()
+            setup["cache"].evict()
+    setup["close"] = close
+    return setup
+
+# -------------------------
+# ENQUEUE / COLLECT
+# -------------------------
+def enqueue_stale(queue_path, backend, force=False, workbooks=False, verbose=False):
+    """Queue every device of Devices.xlsx whose datasheet is missing or out of date (as Part2 decides)."""
+    import Datasheet_Automation_Part2_FINAL_V3 as part2
+    from DeviceFileIndex import load_or_build_device_index
+
+    os.makedirs(part2.data_package_folder, exist_ok=True)
+    queue = JobQueue(queue_path)
+    try:
+        uncollected = queue.uncollected()
+    finally:
+        queue.close()
+    if uncollected:
+        # Otherwise the devices the last batch built would look stale and be queued again
+        print(f"Collecting the {uncollected} devices the last batch built first")
+        collect(queue_path)
+
+    device_rows = [part2.device_fields(row) for _, row in part2.load_devices().iterrows()]
+    device_file_index = load_or_build_device_index(part2.other_folder)
+    date_text = datetime.now().strftime("%m/%d/%Y")
+    manifest = part2.load_manifest(part2.data_package_folder)
+    stale_rows, fingerprints = part2.stale_devices(manifest, device_rows, device_file_index, backend, force, verbose,
+                                                   workbooks)
+    queue = JobQueue(queue_path)
+    try:
+        queue.enqueue(stale_rows, fingerprints, [part2.manifest_key(fields) for fields in stale_rows], date_text,
+                      backend, workbooks)
+        print(f"Queued {len(stale_rows)} devices in {queue_path}")
+    finally:
+        queue.close()
+    return len(stale_rows)
+
+def collect(queue_path):
+    """Record the devices the workers finished in the build manifest (one writer) and summarise the batch."""
+    import Datasheet_Automation_Part2_FINAL_V3 as part2
+
+    queue = JobQueue(queue_path)
+    try:
+        batch = queue.batch()
+        if batch is None:
+            print(f"No batch in {queue_path}")
+            return []
+        jobs = queue.jobs()
+        counts = queue.counts()
+    finally:
+        queue.close()
+
+    results = [{"Lot_ID": job["lot_id"], "Dev#": job["dev_num"], "SN": job["sn"], "SKU": job["sku"],
+                "status": "ok" if job["state"] == "done" else "error", "error": job["error"] or job["state"],
+                "output": job["output"] or "", "seconds": job["seconds"] or 0}
+               for job in jobs if job["state"] in ("done", "failed")]
+    fingerprints = {job["key"]: json.loads(job["fingerprint"]) for job in jobs}
+    manifest = part2.load_manifest(part2.data_package_folder)
+    part2.record_results(manifest, results, fingerprints)
+    queue = JobQueue(queue_path)
+    try:
+        queue.mark_collected(job["key"] for job in jobs if job["state"] in ("done", "failed"))
+    finally:
+        queue.close()
+    elapsed = max((job["finished"] or 0 for job in jobs), default=batch["created"]) - batch["created"]
+    failed = part2.print_batch_summary(results, max(elapsed, 0.0))
+    unfinished = counts["queued"] + counts["leased"] + counts["expired"]
+    if unfinished:
+        print(f"{unfinished} devices are not finished yet - collect again once the workers are done")
+    return failed
+
+# -------------------------
+# CLI
+# -------------------------
+def main(argv=None):
+    import Datasheet_Automation_Part2_FINAL_V3 as part2
+
+    parser = argparse.ArgumentParser(description="SQLite job queue for building datasheets with several workers")
+    parser.add_argument("--queue", help=f"queue file (default: {QUEUE_FILENAME} next to Devices.xlsx)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="start a batch: queue every device that needs building")
+    enqueue_parser.add_argument("--backend", choices=["excel", "matplotlib"], default=part2.chart_backend)
+    enqueue_parser.add_argument("--force", action="store_true", help="queue every device, even up-to-date ones")
+    enqueue_parser.add_argument("--xlsm", action="store_true", default=part2.write_workbooks,
+                                help="also save each device's filled graph workbook (.xlsm)")
+    enqueue_parser.add_argument("--verbose", action="store_true")
+
+    worker_parser = commands.add_parser("worker", help="claim and build devices until the queue is drained")
+    worker_parser.add_argument("--name", help="worker name in the queue (default: host:pid)")
+    worker_parser.add_argument("--lease", type=float, default=LEASE_SECONDS, help="lease length in seconds")
+    worker_parser.add_argument("--max-build", type=float, default=MAX_BUILD_SECONDS,
+                               help="stop renewing the lease of a device that builds longer than this (seconds)")
+    worker_parser.add_argument("--wait", action="store_true", help="keep polling for new batches instead of exiting")
+    worker_parser.add_argument("--max-jobs", type=int, help="exit after building this many devices")
+    worker_parser.add_argument("--verbose", action="store_true")
+
+    status_parser = commands.add_parser("status", help="progress of the current batch, per worker")
+    status_parser.add_argument("--jobs", action="store_true", help="list every device, not only failed ones")
+
+    commands.add_parser("collect", help="record finished devices in the build manifest and summarise the batch")
+    args = parser.parse_args(argv)
+
+    queue_path = args.queue or os.path.join(part2.destination_folder, QUEUE_FILENAME)
+    if args.command == "enqueue":
+        enqueue_stale(queue_path, args.backend, args.force, args.xlsm, args.verbose)
+    elif args.command == "worker":
+        run_worker(queue_path, args.name, args.lease, args.wait, args.max_jobs, args.verbose, args.max_build)
+    elif args.command == "status":
+        queue = JobQueue(queue_path)
+        try:
+            print_progress(queue, args.jobs)
+        finally:
+            queue.close()
+    else:
+        collect(queue_path)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,242 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from BuildManifest import file_hash
+from MeasurementParser import PARSER_VERSION, parse_measurement_file
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 2000 * 10 ** 6
+
+# Content hashes of the raw files by path, size and mtime, so a warm run hashes only changed files
+STAMPS_FILENAME = "file_stamps.json"
+
+# Arrays of a block, stored back to back in one .npy so a hit is a single memory-mapped file
+ARRAY_NAMES = ["temperatures", "currents", "rows", "extra"]
+
+# -------------------------
+# PARSED MEASUREMENT CACHE
+# -------------------------
+# Entries are keyed by the raw file's SHA-256 and the parser version, so renaming or copying a raw
+# file still hits and a parser change misses. Each entry is <key>.npy (all numbers) plus <key>.json
+# (header tokens, counts, line layout and array shapes); the .json is written last and marks the entry complete.
+# Entry mtimes are bumped on every hit, which makes eviction least-recently-used.
+# The raw file's hash is looked up by (path, size, mtime_ns) in file_stamps.json first and only
+# computed when the file changed, so a warm run does not read every raw file just to hash it.
+
+class MeasurementCache:
+    """
+    Cache of parsed raw measurement blocks in a folder.
+    float32 halves the size, but values keep only ~7 significant digits (fine for charts; the
+    Excel backend pastes the numbers, so it should keep float64).
+    """
+
+    def __init__(self, folder, max_bytes=DEFAULT_MAX_BYTES, float32=False):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.dtype = np.float32 if float32 else np.float64
+        self.hits = 0
+        self.misses = 0
+        self.total_bytes = None
+        os.makedirs(folder, exist_ok=True)
+        self.stamps_path = os.path.join(folder, STAMPS_FILENAME)
+        self.stamps = self._load_stamps()
+        self.new_stamps = {}
+
+    def _load_stamps(self):
+        """{path: [size, mtime_ns, content hash]} of the raw files hashed by earlier runs."""
+        try:
+            with open(self.stamps_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def content_hash(self, file_path):
+        """SHA-256 of a raw file, from the stamps while its size and mtime are unchanged."""
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        path = os.path.abspath(file_path)
+        stamp = self.stamps.get(path)
+        if stamp is not None and stamp[0] == stat.st_size and stamp[1] == stat.st_mtime_ns:
+            return stamp[2]
+        content_hash = file_hash(file_path)
+        if content_hash is not None:
+            self.stamps[path] = self.new_stamps[path] = [stat.st_size, stat.st_mtime_ns, content_hash]
+        return content_hash
+
+    def save_stamps(self):
+        """Merge this run's new stamps into the stamps file (other processes may have added theirs)."""
+        if not self.new_stamps:
+            return
+        stamps = self._load_stamps()
+        stamps.update(self.new_stamps)
+        tmp_path = self.stamps_path + f".{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(stamps, f)
+            os.replace(tmp_path, self.stamps_path)
+        except OSError as e:
+            print(f"Warning: Could not write {self.stamps_path}: {e}")
+            return
+        self.stamps = stamps
+        self.new_stamps = {}
+
+    def key_for(self, content_hash, sweep=None):
+        key = f"{content_hash[:40]}-p{PARSER_VERSION}-c{CACHE_VERSION}-{np.dtype(self.dtype).name}"
+        # A file with several sweeps has one entry per sweep that was read
+        return key if sweep is None else f"{key}-s{sweep['offset']}"
+
+    def _paths(self, key):
+        return os.path.join(self.folder, key + ".npy"), os.path.join(self.folder, key + ".json")
+
+    def load(self, file_path, sweep=None):
+        """Parsed block of file_path (or of one sweep of it): from the cache when its content was parsed before, else parsed and stored."""
+        content_hash = self.content_hash(file_path)
+        if content_hash is None:
+            raise FileNotFoundError(file_path)
+        key = self.key_for(content_hash, sweep)
+        block = self._read(key)
+        if block is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            block = parse_measurement_file(file_path, sweep)
+            self._write(key, block)
+        block["path"] = file_path
+        return block
+
+    def _read(self, key):
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            data = np.load(data_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return None
+        now = time.time()
+        try:
+            os.utime(meta_path, (now, now))
+        except OSError:
+            pass
+
+        block = {"header": meta["header"], "counts": tuple(meta["counts"]), "layout": meta["layout"]}
+        offset = 0
+        for name in ARRAY_NAMES:
+            shape = tuple(meta["shapes"][name])
+            size = int(np.prod(shape))
+            block[name] = data[offset:offset + size].reshape(shape)
+            offset += size
+        return block
+
+    def _write(self, key, block):
+        data_path, meta_path = self._paths(key)
+        arrays = [np.asarray(block[name], dtype=self.dtype) for name in ARRAY_NAMES]
+        meta = {"header": block["header"], "counts": list(block["counts"]), "layout": block["layout"],
+                "shapes": {name: list(array.shape) for name, array in zip(ARRAY_NAMES, arrays)}}
+        try:
+            tmp_path = data_path + f".{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.concatenate([array.ravel() for array in arrays]))
+            os.replace(tmp_path, data_path)
+            tmp_path = meta_path + f".{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp_path, meta_path)
+        except OSError as e:
+            # A full or read-only cache folder only costs the cache, not the run
+            print(f"Warning: Could not write measurement cache entry {key}: {e}")
+            return
+        if self.total_bytes is not None:
+            self.total_bytes += os.path.getsize(data_path) + os.path.getsize(meta_path)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    # -------------------------
+    # Maintenance
+    # -------------------------
+    def entries(self):
+        """[(key, bytes, last used)] of complete entries, least recently used first."""
+        entries = []
+        for filename in os.listdir(self.folder):
+            if not filename.endswith(".json"):
+                continue
+            key = filename[:-len(".json")]
+            data_path, meta_path = self._paths(key)
+            try:
+                meta_stat = os.stat(meta_path)
+                size = meta_stat.st_size + os.path.getsize(data_path)
+            except OSError:
+                continue
+            entries.append((key, size, meta_stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self, max_bytes=None):
+        """Delete least recently used entries until the cache fits in max_bytes. Returns (entries, bytes) removed."""
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = freed = 0
+        for key, size, _ in entries:
+            if total <= max_bytes:
+                break
+            try:
+                for path in self._paths(key)[::-1]:
+                    os.remove(path)
+            except OSError:
+                continue  # still memory-mapped by a running process (Windows) - try next time
+            total -= size
+            removed += 1
+            freed += size
+        self.total_bytes = total
+        return removed, freed
+
+    def clear(self):
+        self.stamps, self.new_stamps = {}, {}
+        try:
+            os.remove(self.stamps_path)
+        except OSError:
+            pass
+        return self.evict(0)
+
+    def summary(self):
+        if self.hits or self.misses:
+            print(f"Measurement cache: {self.hits} hits, {self.misses} parsed and stored")
+
+# -------------------------
+# CLI
+# -------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or clear the parsed measurement cache")
+    parser.add_argument("folder", help="cache folder (Part2 uses 'Script Output/Measurement Cache')")
+    parser.add_argument("command", choices=["stats", "list", "evict", "clear"], nargs="?", default="stats")
+    parser.add_argument("--max-mb", type=float, help="evict: size limit in MB (default: the cache's limit)")
+    args = parser.parse_args(argv)
+
+    cache = MeasurementCache(args.folder)
+    if args.command == "clear":
+        removed, freed = cache.clear()
+        print(f"Removed {removed} entries ({freed / 1e6:.1f} MB)")
+    elif args.command == "evict":
+        max_bytes = int(args.max_mb * 1e6) if args.max_mb is not None else None
+        removed, freed = cache.evict(max_bytes)
+        print(f"Removed {removed} entries ({freed / 1e6:.1f} MB)")
+    else:
+        entries = cache.entries()
+        if args.command == "list":
+            for key, size, last_used in entries:
+                print(f"{key}  {size / 1e3:10.1f} kB  last used {time.strftime('%Y-%m-%d %H:%M', time.localtime(last_used))}")
+        total = sum(size for _, size, _ in entries)
+        print(f"{len(entries)} entries, {total / 1e6:.1f} MB of {cache.max_bytes / 1e6:.0f} MB")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,254 @@
+import io
+import os
+import warnings
+from itertools import groupby
+
+import numpy as np
+
+# -------------------------
+# RAW MEASUREMENT FILE PARSING
+# -------------------------
+# LIV_vs_Temp, WLT_Wave and WLT_SMSR files share one layout:
+#   header lines (title, Lot id, Device number, dates, sweep settings, ...)
+#   data
+#   <number of temperatures> <number of currents>
+#   <temperatures>
+#   <currents>
+#   one row per temperature (wavelength / SMSR), or power and voltage rows (LIV)
+#   trailing single values (LIV fit results: Ith, slope, rs, ...)
+#
+# Only the handful of header lines are split in Python. The full-width rows are read in one
+# np.loadtxt call (its C tokenizer) straight into a 2-D float64 array, so sweeps with thousands
+# of points never become lists of Python strings; only the few leading and trailing lines are
+# converted one by one, and ragged lines need no padding. Blank and non-numeric lines keep
+# their place in block["layout"], so the block pastes back with the raw file's row layout.
+
+DATA_MARKER = b"data"
+
+# Bump whenever the parsed block changes shape or content, so cached blocks are not reused
+PARSER_VERSION = 2
+
+def find_data_line(content, end=None):
+    """Byte offset of the last line before end that is exactly 'data' (the latest sweep), or -1."""
+    if end is None:
+        end = len(content)
+    while True:
+        pos = content.rfind(DATA_MARKER, 0, end)
+        if pos < 0:
+            return -1
+        line_end = content.find(b"\n", pos)
+        rest = content[pos + len(DATA_MARKER):line_end if line_end >= 0 else len(content)]
+        if (pos == 0 or content[pos - 1:pos] == b"\n") and not rest.strip():
+            return pos
+        end = pos
+
+def _parse_numeric_lines(lines, name):
+    """
+    Turn the lines after 'data' into the measurement block. Each line is a float64 array, or the
+    token list of a blank or non-numeric line. layout has one entry per line, in file order:
+    "counts", "temperatures", "currents", "row", the number of extra values on the line, or the
+    tokens of a text line ([] for a blank one).
+    """
+    numeric_lines = [values for values in lines if isinstance(values, np.ndarray)]
+    if len(numeric_lines) < 3:
+        raise ValueError(f"Incomplete data section in {name}")
+
+    num_temps, num_currents = int(numeric_lines[0][0]), int(numeric_lines[0][1])
+    temperatures = numeric_lines[1][:num_temps]
+    currents = numeric_lines[2][:num_currents]
+
+    # Full-width lines are the per-temperature rows; everything from the first short line on is extra
+    leading = ["counts", "temperatures", "currents"]
+    layout, rows, tail = [], [], []
+    for values in lines:
+        if not isinstance(values, np.ndarray):
+            layout.append(list(values))
+        elif leading:
+            layout.append(leading.pop(0))
+        elif not tail and values.size == num_currents:
+            layout.append("row")
+            rows.append(values)
+        else:
+            layout.append(int(values.size))
+            tail.append(values)
+    rows = np.vstack(rows) if rows else np.empty((0, num_currents))
+    extra = np.concatenate(tail) if tail else np.empty(0)
+
+    return {
+        "counts": (num_temps, num_currents),
+        "temperatures": temperatures,
+        "currents": currents,
+        "rows": rows,
+        "extra": extra,
+        "layout": layout,
+    }
+
+def _numeric_line(line):
+    """A line after 'data' as a float64 array, or as its tokens when it is blank or not all numbers."""
+    if not line.strip():
+        return []
+    try:
+        return np.fromstring(line, sep=" ")
+    except ValueError:
+        return line.split()
+
+def _parse_rows_at_once(content, begin):
+    """
+    The block of the numeric section starting at byte offset begin, with all full-width rows read
+    by a single NumPy call. Only the leading lines (counts, temperatures, currents) and the short
+    or text lines at the end are looked at one by one. Returns None when the rows are not one
+    clean rectangle (a blank, text or short line among them); the caller then goes line by line.
+    """
+    layout, leading = [], []
+    offset = begin
+    while len(leading) < 3:
+        if offset >= len(content):
+            return None
+        end = content.find(b"\n", offset)
+        end = len(content) if end < 0 else end
+        values = _numeric_line(content[offset:end].decode("ascii", errors="replace"))
+        if isinstance(values, np.ndarray):
+            layout.append(["counts", "temperatures", "currents"][len(leading)])
+            leading.append(values)
+        else:
+            layout.append(list(values))
+        offset = end + 1
+    num_temps, num_currents = int(leading[0][0]), int(leading[0][1])
+
+    # Walk back from the end over the trailing lines until the last full-width one
+    tail = []
+    end = len(content) - 1 if content.endswith(b"\n") else len(content)
+    rows_end = offset
+    last_row = None
+    while end > offset:
+        line_start = max(content.rfind(b"\n", offset, end) + 1, offset)
+        values = _numeric_line(content[line_start:end].decode("ascii", errors="replace"))
+        if isinstance(values, np.ndarray) and values.size == num_currents:
+            # Already converted - the single call reads the rows before it
+            last_row = values
+            rows_end = max(line_start - 1, offset)
+            break
+        tail.append(values)
+        end = line_start - 1
+    tail.reverse()
+
+    span = content[offset:rows_end]
+    num_rows = span.count(b"\n") + 1 if span else 0
+    # loadtxt's C tokenizer rejects rows of different widths (ValueError); it skips blank lines,
+    # which the row count catches
+    rows = np.loadtxt(io.BytesIO(span), dtype=np.float64, ndmin=2) if span else np.empty((0, num_currents))
+    if rows.shape != (num_rows, num_currents):
+        return None
+    if last_row is not None:
+        rows = np.vstack([rows, last_row])
+    layout += ["row"] * len(rows)
+    layout += [int(values_.size) if isinstance(values_, np.ndarray) else list(values_) for values_ in tail]
+    extra = [values_ for values_ in tail if isinstance(values_, np.ndarray)]
+
+    return {
+        "counts": (num_temps, num_currents),
+        "temperatures": leading[1][:num_temps],
+        "currents": leading[2][:num_currents],
+        "rows": rows,
+        "extra": np.concatenate(extra) if extra else np.empty(0),
+        "layout": layout,
+    }
+
+def parse_measurement_bytes(content, name="block", start=0):
+    """Parse the raw bytes of a measurement file from byte offset start (see parse_measurement_file)."""
+    pos = find_data_line(content)
+    if pos < start:
+        raise ValueError(f"No data section found in {name}")
+
+    # Header lines stay as token lists - they are pasted into Excel as text
+    header_text = content[start:pos].decode("utf-8", errors="replace")
+    header = [line.split() for line in header_text.splitlines()] + [["data"]]
+
+    numeric_start = content.find(b"\n", pos)
+    numeric_start = len(content) if numeric_start < 0 else numeric_start + 1
+    with warnings.catch_warnings():
+        # NumPy only warns (and returns what it read so far) on a line with text in it
+        warnings.simplefilter("error", DeprecationWarning)
+        try:
+            block = _parse_rows_at_once(content, numeric_start)
+        except ValueError:
+            block = None
+        if block is None:
+            numeric_text = content[numeric_start:].decode("ascii", errors="replace")
+            block = _parse_numeric_lines([_numeric_line(line) for line in numeric_text.splitlines()], name)
+    block["header"] = header
+    return block
+
+def parse_measurement_file(file_path, sweep=None):
+    """
+    Parse a raw measurement .txt file into its header rows and numeric block.
+    Returns a dict with path, header (token lists), counts, temperatures, currents,
+    rows (2-D float64) and extra. sweep (a SweepIndex section) reads just that sweep with one
+    seek; without it the whole file is read and its last data section parsed.
+    """
+    with open(file_path, 'rb') as f:
+        if sweep is None:
+            content = f.read()
+        else:
+            f.seek(sweep["offset"])
+            content = f.read(sweep["end"] - sweep["offset"])
+
+    block = parse_measurement_bytes(content, os.path.basename(file_path))
+    block["path"] = file_path
+    return block
+
+def parse_measurement_lines(lines, name="block"):
+    """Parse already tokenized lines (one list of strings per line) of a raw measurement file."""
+    data_line = None
+    for i, tokens in enumerate(lines):
+        if tokens == ["data"]:
+            data_line = i
+    if data_line is None:
+        raise ValueError(f"No data section found in {name}")
+
+    numeric_lines = []
+    for tokens in lines[data_line + 1:]:
+        try:
+            numeric_lines.append(np.array(tokens, dtype=np.float64) if tokens else tokens)
+        except ValueError:
+            numeric_lines.append(tokens)
+    block = _parse_numeric_lines(numeric_lines, name)
+    block["header"] = lines[:data_line + 1]
+    return block
+
+def excel_blocks(block):
+    """
+    The parsed file as (row offset, rows) rectangles for pasting into Excel, in file order.
+    Header rows go in as text; the numbers go in typed so Excel does not re-parse strings.
+    Every line lands on its row in the raw file; blank lines are left out (nothing to write).
+    """
+    header = block["header"]
+    width = max(len(tokens) for tokens in header)
+    blocks = [(0, [tokens + [""] * (width - len(tokens)) for tokens in header])]
+
+    rows = iter(block["rows"].tolist())
+    extra = block["extra"].tolist()
+    taken = 0
+    lines = []
+    for item in block["layout"]:
+        if item == "counts":
+            lines.append(list(block["counts"]))
+        elif item in ("temperatures", "currents"):
+            lines.append(block[item].tolist())
+        elif item == "row":
+            lines.append(next(rows))
+        elif isinstance(item, int):
+            lines.append(extra[taken:taken + item])
+            taken += item
+        else:
+            lines.append(item)
+
+    # Consecutive lines of one width (all numbers or all text) go in as one rectangle
+    offset = len(header)
+    kind = lambda values: (len(values), bool(values) and isinstance(values[0], str))
+    for (size, _), group in groupby(lines, key=kind):
+        group = list(group)
+        if size:
+            blocks.append((offset, group))
+        offset += len(group)
+    return blocks
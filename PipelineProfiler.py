@@ -0,0 +1,287 @@
+import os
+import sys
+import json
+import types
+import pstats
+import cProfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from PipelineTrace import PipelineTrace
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+# Profiling is off unless this variable (or Part2's --profile flag) holds a spec such as
+#   "mode=sample;stages=parse,excel_axes;every=10"
+# mode:   cprofile (deterministic, .prof for snakeviz / pstats) or sample (collapsed stacks for
+#         flamegraph.pl / speedscope)
+# stages: trace stages to profile; without it every selected device is profiled as a whole
+# every:  profile every Nth device only (1 = every device)
+# com:    count COM property and method calls per device (on by default)
+PROFILE_ENV_VAR = "DATASHEET_PROFILE"
+PROFILE_FOLDER_NAME = "profile"
+SAMPLE_INTERVAL_SECONDS = 0.005
+COM_CALLS_FILENAME = "com_calls.jsonl"
+
+# COM results that are plain values are returned as they are; anything else is an object to count on
+PLAIN_VALUES = (str, int, float, bool, bytes, tuple, list, dict, type(None))
+
+def parse_profile_spec(spec):
+    """'mode=sample;stages=parse,excel_axes;every=10' -> settings dict. '1' or 'on' means the defaults."""
+    settings = {"mode": "cprofile", "stages": None, "every": 1, "com": True}
+    for item in spec.split(";"):
+        item = item.strip()
+        if not item or item.lower() in ("1", "on", "true"):
+            continue
+        name, _, value = item.partition("=")
+        name, value = name.strip().lower(), value.strip()
+        if name == "mode":
+            if value not in ("cprofile", "sample"):
+                raise ValueError(f"Unknown profile mode {value!r} (use cprofile or sample)")
+            settings["mode"] = value
+        elif name == "stages":
+            settings["stages"] = {stage.strip() for stage in value.split(",") if stage.strip()}
+        elif name == "every":
+            settings["every"] = max(1, int(value))
+        elif name == "com":
+            settings["com"] = value.lower() not in ("0", "off", "false")
+        else:
+            raise ValueError(f"Unknown profile setting {name!r}")
+    return settings
+
+# -------------------------
+# COM CALL COUNTING
+# -------------------------
+class ComCallCounter:
+    """
+    Proxy around a COM object (Excel.Application and everything reached from it) that counts
+    property reads, property writes and method calls by name. Only installed while profiling.
+    """
+
+    def __init__(self, target, name, counts):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_counts", counts)
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        name = f"{self._name}.{attr}"
+        # win32com returns bound methods for COM methods and values / CDispatch objects for properties
+        if isinstance(value, (types.MethodType, types.BuiltinMethodType, types.FunctionType)):
+            return _counted_method(value, name, self._counts)
+        self._counts[name] += 1
+        return _wrap(value, attr, self._counts)
+
+    def __setattr__(self, attr, value):
+        self._counts[f"{self._name}.{attr}="] += 1
+        setattr(self._target, attr, _unwrap(value))
+
+def _counted_method(method, name, counts):
+    def call(*args, **kwargs):
+        counts[f"{name}()"] += 1
+        result = method(*[_unwrap(a) for a in args], **{k: _unwrap(v) for k, v in kwargs.items()})
+        return _wrap(result, name.rsplit(".", 1)[-1], counts)
+    return call
+
+def _wrap(value, name, counts):
+    return value if isinstance(value, PLAIN_VALUES) else ComCallCounter(value, name, counts)
+
+def _unwrap(value):
+    return object.__getattribute__(value, "_target") if isinstance(value, ComCallCounter) else value
+
+# -------------------------
+# SAMPLING PROFILER
+# -------------------------
+def collapse_stack(frame):
+    """Frames root-first as 'file:function:line;...', the collapsed-stack format flame graph tools read."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+class StackSampler:
+    """Background thread that samples the stacks of the threads currently inside a profiled stage."""
+
+    def __init__(self, interval=SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.active = {}            # thread id -> stage being profiled on it
+        self.stacks = {}            # stage -> Counter of collapsed stacks
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self, stage):
+        self.active[threading.get_ident()] = stage
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frames = sys._current_frames()
+            for thread_id, stage in list(self.active.items()):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks.setdefault(stage, Counter())[collapse_stack(frame)] += 1
+
+    def close(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+# -------------------------
+# PIPELINE PROFILER
+# -------------------------
+class PipelineProfiler:
+    """
+    Profiles selected trace stages (or whole devices) of every Nth device and writes one .prof
+    (cProfile) or .collapsed (sampling) file per stage, plus COM call counts per device.
+    """
+
+    def __init__(self, settings, folder, prefix=""):
+        self.mode = settings["mode"]
+        self.stages = settings["stages"]
+        self.every = settings["every"]
+        self.count_com = settings["com"]
+        self.folder = folder
+        self.prefix = prefix
+        self.profiles = {}          # (stage, thread id) -> cProfile.Profile (cprofile mode)
+        self.sampler = StackSampler() if self.mode == "sample" else None
+        self.com_counts = Counter()
+        self.com_thread = None      # COM objects are only used on the thread that created them
+        self.com_devices = []
+        self.device_numbers = {}    # (Lot_ID, Dev#) -> order of first appearance
+        self.lock = threading.Lock()
+        self.profiled_devices = Counter()
+        self.local = threading.local()
+
+    @classmethod
+    def from_spec(cls, spec, folder, prefix=""):
+        """A profiler for the spec, or None when profiling is off (the default)."""
+        if not spec:
+            return None
+        return cls(parse_profile_spec(spec), folder, prefix)
+
+    def wrap_com(self, excel):
+        if not self.count_com:
+            return excel
+        self.com_thread = threading.get_ident()
+        return ComCallCounter(excel, "Application", self.com_counts)
+
+    @contextmanager
+    def profile(self, stage):
+        """Profile the block as stage if this device and stage are selected (nested stages are not)."""
+        if not getattr(self.local, "selected", False) or getattr(self.local, "profiling", False) \
+                or (self.stages is not None and stage not in self.stages):
+            yield
+            return
+        self.local.profiling = True
+        self.profiled_devices[stage] += 1
+        if self.sampler is not None:
+            self.sampler.start(stage)
+        else:
+            # cProfile only sees the thread that enabled it: pipeline stages get one profile per thread
+            profile = self.profiles.setdefault((stage, threading.get_ident()), cProfile.Profile())
+            profile.enable()
+        try:
+            yield
+        finally:
+            if self.sampler is not None:
+                self.sampler.stop()
+            else:
+                profile.disable()
+            self.local.profiling = False
+
+    @contextmanager
+    def device(self, lot_id, dev_num, sku):
+        """Select every Nth device; record the COM calls each device made."""
+        # A device passes through several pipeline stages (threads); it is numbered once
+        with self.lock:
+            number = self.device_numbers.setdefault((lot_id, dev_num), len(self.device_numbers))
+        self.local.selected = number % self.every == 0
+        com_before = Counter(self.com_counts) if self.com_thread == threading.get_ident() else None
+        try:
+            if self.stages is None:
+                with self.profile("device"):
+                    yield
+            else:
+                yield
+        finally:
+            self.local.selected = False
+            if com_before is not None:
+                calls = self.com_counts - com_before
+                self.com_devices.append({"Lot_ID": lot_id, "Dev#": dev_num, "SKU": sku,
+                                         "com_calls": sum(calls.values()), "by_name": dict(calls.most_common())})
+
+    def save(self):
+        """Write the per-stage profiles and COM counts; returns the paths written."""
+        if self.sampler is not None:
+            self.sampler.close()
+        os.makedirs(self.folder, exist_ok=True)
+        written = []
+        by_stage = {}
+        for (stage, _), profile in self.profiles.items():
+            by_stage.setdefault(stage, []).append(profile)
+        for stage, profiles in by_stage.items():
+            path = os.path.join(self.folder, f"{self.prefix}{stage}.prof")
+            pstats.Stats(*profiles).dump_stats(path)
+            written.append(path)
+        for stage, stacks in (self.sampler.stacks if self.sampler is not None else {}).items():
+            path = os.path.join(self.folder, f"{self.prefix}{stage}.collapsed")
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(f"{stack} {count}\n" for stack, count in stacks.items())
+            written.append(path)
+        if self.com_devices:
+            path = os.path.join(self.folder, f"{self.prefix}{COM_CALLS_FILENAME}")
+            with open(path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(device) + "\n" for device in self.com_devices)
+            written.append(path)
+        return written
+
+    def summary(self):
+        written = self.save()
+        for stage, count in sorted(self.profiled_devices.items()):
+            print(f"Profiled {stage}: {count} span(s)")
+        if self.com_devices:
+            per_device = [device["com_calls"] for device in self.com_devices]
+            print(f"COM calls per device: {min(per_device)} to {max(per_device)} "
+                  f"(mean {sum(per_device) / len(per_device):.0f}); most frequent:")
+            for name, count in self.com_counts.most_common(8):
+                print(f"  {name:40s} {count}")
+        for path in written:
+            print(f"Profile written to {path}")
+
+class ProfiledTrace(PipelineTrace):
+    """PipelineTrace whose device and stage blocks also drive a PipelineProfiler."""
+
+    def __init__(self, profiler, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.profiler = profiler
+
+    @contextmanager
+    def device(self, lot_id, dev_num, sku=""):
+        with super().device(lot_id, dev_num, sku), self.profiler.device(lot_id, dev_num, sku):
+            yield
+
+    @contextmanager
+    def span(self, stage, **fields):
+        with super().span(stage, **fields) as span_fields, self.profiler.profile(stage):
+            yield span_fields
+
+    def summary(self):
+        stats = super().summary()
+        self.profiler.summary()
+        return stats
+
+def make_trace(profile_spec, profile_folder, *args, prefix="", **kwargs):
+    """A plain PipelineTrace, or a ProfiledTrace when a profile spec is given."""
+    profiler = PipelineProfiler.from_spec(profile_spec, profile_folder, prefix)
+    if profiler is None:
+        return PipelineTrace(*args, **kwargs)
+    return ProfiledTrace(profiler, *args, **kwargs)
@@ -0,0 +1,205 @@
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+TRACE_FILENAME = "pipeline_trace.jsonl"
+
+# Progress lines are printed at most this often while a batch runs
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+# -------------------------
+# PIPELINE TRACE
+# -------------------------
+# Spans are small dicts appended to a list and written as JSON lines in batches, so a span costs
+# two clock reads per timer and one dict - cheap enough to leave on for every batch.
+
+class PipelineTrace:
+    """
+    Per-stage, per-device timing for one run of Part1 or Part2.
+    Each span records the stage, the device (Lot_ID, Dev#, SKU), wall and CPU seconds and status.
+    Spans are appended to a JSON lines file; summary() prints p50/p95 per stage.
+    """
+
+    # Set by PipelineProfiler.ProfiledTrace when profiling is switched on
+    profiler = None
+
+    def __init__(self, path=None, script="", total_devices=None, verbose=False, label=""):
+        self.path = path
+        self.label = label
+        self.run_id = uuid.uuid4().hex[:12]
+        self.script = script
+        self.total_devices = total_devices
+        self.verbose = verbose
+        self.spans = []
+        self.pending = []
+        self.devices_done = 0
+        self.started = time.perf_counter()
+        self.last_progress = self.started
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        if path:
+            self._write([{"type": "run", "run": self.run_id, "script": script, "start": time.time(),
+                          "devices": total_devices}])
+
+    # -------------------------
+    # Recording
+    # -------------------------
+    @contextmanager
+    def device(self, lot_id, dev_num, sku=""):
+        """Attribute the spans recorded inside the block (on this thread) to one device."""
+        previous = getattr(self.local, "device", None)
+        self.local.device = {"Lot_ID": lot_id, "Dev#": dev_num, "SKU": sku}
+        try:
+            yield
+        finally:
+            self.local.device = previous
+
+    @contextmanager
+    def span(self, stage, **fields):
+        """
+        Time the block as one span of stage; an exception marks it as failed and is re-raised.
+        Yields the span's fields dict, so the block can add values it only knows at the end.
+        """
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        status = "ok"
+        try:
+            yield fields
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - wall_start, time.thread_time() - cpu_start, status, **fields)
+
+    def record(self, stage, wall, cpu, status="ok", **fields):
+        span = {"type": "span", "run": self.run_id, "stage": stage, "wall": round(wall, 6), "cpu": round(cpu, 6),
+                "status": status}
+        device = getattr(self.local, "device", None)
+        if device:
+            span.update(device)
+        span.update(fields)
+        with self.lock:
+            self.spans.append(span)
+            self.pending.append(span)
+
+    def extend(self, spans):
+        """Add spans recorded elsewhere (e.g. returned by a worker process)."""
+        with self.lock:
+            for span in spans:
+                span = dict(span, run=self.run_id)
+                self.spans.append(span)
+                self.pending.append(span)
+
+    def debug(self, message):
+        """Detail that used to be printed for every device; shown only in verbose mode."""
+        if self.verbose:
+            print(message)
+
+    # -------------------------
+    # Progress and output
+    # -------------------------
+    def device_done(self, count=1):
+        """Count finished devices; every few seconds print throughput and ETA and flush the spans."""
+        self.devices_done += count
+        now = time.perf_counter()
+        if now - self.last_progress < PROGRESS_INTERVAL_SECONDS and self.devices_done != self.total_devices:
+            return
+        self.last_progress = now
+        elapsed = now - self.started
+        rate = self.devices_done / elapsed if elapsed > 0 else 0
+        line = f"  {self.label + ': ' if self.label else ''}{self.devices_done}"
+        if self.total_devices:
+            remaining = self.total_devices - self.devices_done
+            line += f"/{self.total_devices} devices, {rate:.2f} devices/s"
+            if rate > 0 and remaining > 0:
+                line += f", ETA {remaining / rate:.0f} s"
+        else:
+            line += f" devices, {rate:.2f} devices/s"
+        print(line)
+        self.flush()
+
+    def _write(self, records):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if self.path and pending:
+            self._write(pending)
+
+    def stage_stats(self):
+        """{stage: {count, total, p50, p95, cpu}} over the spans of this run."""
+        by_stage = {}
+        for span in self.spans:
+            by_stage.setdefault(span["stage"], []).append(span)
+        stats = {}
+        for stage, spans in by_stage.items():
+            walls = sorted(span["wall"] for span in spans)
+            stats[stage] = {
+                "count": len(walls),
+                "total": sum(walls),
+                "p50": percentile(walls, 50),
+                "p95": percentile(walls, 95),
+                "cpu": sum(span["cpu"] for span in spans),
+                "errors": sum(1 for span in spans if span["status"] != "ok"),
+            }
+        return stats
+
+    def summary(self):
+        """Print p50/p95 per stage, slowest total first, and flush the remaining spans."""
+        self.flush()
+        stats = self.stage_stats()
+        if not stats:
+            return stats
+        print(f"{'Stage':18s} {'count':>6s} {'total s':>9s} {'p50 ms':>9s} {'p95 ms':>9s} {'cpu s':>8s}")
+        for stage, s in sorted(stats.items(), key=lambda item: -item[1]["total"]):
+            print(f"{stage:18s} {s['count']:6d} {s['total']:9.2f} {s['p50'] * 1000:9.1f} {s['p95'] * 1000:9.1f} {s['cpu']:8.2f}"
+                  + (f"  ({s['errors']} failed)" if s["errors"] else ""))
+        if self.path:
+            print(f"Trace written to {self.path}")
+        return stats
+
+def percentile(sorted_values, percent):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(percent / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+def trace_path_for(folder):
+    return os.path.join(folder, TRACE_FILENAME)
+
+# -------------------------
+# ACTIVE TRACE
+# -------------------------
+# Helpers deep in the pipeline call span() / debug() without a trace being passed down to them.
+# With no active trace they do nothing beyond entering a context manager.
+
+class _NullTrace(PipelineTrace):
+    def __init__(self):
+        super().__init__(path=None)
+
+    def record(self, stage, wall, cpu, status="ok", **fields):
+        pass
+
+_active = _NullTrace()
+
+def set_active_trace(trace):
+    global _active
+    _active = trace if trace is not None else _NullTrace()
+    return _active
+
+def active_trace():
+    return _active
+
+def span(stage, **fields):
+    return _active.span(stage, **fields)
+
+def debug(message):
+    _active.debug(message)
@@ -0,0 +1,157 @@
+import os
+import re
+import json
+import bisect
+
+from BuildManifest import file_hash
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+CACHE_VERSION = 1
+CACHE_SUFFIX = ".keycache.json"
+
+# Allowed distance between the Lot_ID wavelength and a SKU's wavelength
+WAVELENGTH_WINDOW_NM = 5
+
+# Pattern: "795-DBRL051525B-G11X" -> wavelength=795, type=DBRL
+LOT_ID_PATTERN = re.compile(r'(\d+(?:\.\d+)?)-([A-Z]+)')
+SKU_WAVELENGTH_PATTERN = re.compile(r'(\d+(?:\.\d+)?)')
+SKU_DEVICE_PATTERN = re.compile(r'[A-Z]+(?:LITE)?')
+
+# -------------------------
+# COMPILED KEY SHEET CACHE
+# -------------------------
+# Reading the Key sheet means opening the whole macro workbook with pandas. The sheet is read once,
+# then kept in a JSON file next to the template until the template's size/mtime (and, if those
+# changed, its content hash) no longer match.
+
+def cache_path_for(template_path):
+    return template_path + CACHE_SUFFIX
+
+def _json_value(value):
+    """Key sheet cells as plain JSON values (NaN stays NaN, so the snl maths behaves as with pandas)."""
+    if hasattr(value, "item"):
+        return value.item()
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return value
+    return str(value)
+
+def compile_key_table(template_path):
+    """Read the Key sheet into {"skus": [SKU cells in sheet order], "rows": {SKU: row dict}}."""
+    # pandas is only needed when the cache is out of date, so it is imported here
+    import pandas as pd
+
+    key_df = pd.read_excel(template_path, sheet_name='Key')
+    skus = [_json_value(sku) for sku in key_df['SKU'].dropna()]
+    rows = {}
+    for _, row in key_df.dropna(subset=["SKU"]).iterrows():
+        rows[str(row["SKU"]).strip()] = {str(name): _json_value(value) for name, value in row.items()}
+    return {"skus": skus, "rows": rows}
+
+def load_key_table(template_path, cache_path=None):
+    """Load the compiled Key sheet, recompiling it only when the template has changed."""
+    if cache_path is None:
+        cache_path = cache_path_for(template_path)
+    stat = os.stat(template_path)
+    stamp = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+    cached = None
+    try:
+        with open(cache_path, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if cached and cached.get("version") == CACHE_VERSION:
+        if cached.get("stamp") == stamp:
+            return cached["table"]
+        # Touched but not edited (e.g. copied back from a share): the hash decides
+        if cached.get("sha256") == file_hash(template_path):
+            _save_cache(cache_path, stamp, cached["sha256"], cached["table"])
+            return cached["table"]
+
+    print(f"Compiling Key sheet of {os.path.basename(template_path)}...")
+    table = compile_key_table(template_path)
+    _save_cache(cache_path, stamp, file_hash(template_path), table)
+    return table
+
+def _save_cache(cache_path, stamp, sha256, table):
+    payload = {"version": CACHE_VERSION, "stamp": stamp, "sha256": sha256, "table": table}
+    tmp_path = cache_path + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        # A read-only template folder only costs the cache, not the lookup
+        print(f"Warning: Could not write Key sheet cache {cache_path}: {e}")
+
+# -------------------------
+# SKU LOOKUP
+# -------------------------
+def parse_lot_id(lot_id):
+    """Return (wavelength, device type) from a Lot_ID, or None if it does not match."""
+    match = LOT_ID_PATTERN.match(lot_id)
+    if not match:
+        return None
+    return float(match.group(1)), match.group(2)
+
+class SkuResolver:
+    """
+    Finds the SKU for a (wavelength, device type), with the same rules as the original loop:
+    SKU wavelength within 5 nm, device type contained in the SKU, then closest wavelength,
+    most specific device part (DBRLITE > DBRL), shortest name, and earliest row in the Key sheet.
+    SKUs are parsed once, bucketed per device type on first use and searched with bisect.
+    """
+
+    def __init__(self, skus):
+        # (wavelength, specificity, sku, position) for every SKU that starts with a wavelength
+        self.entries = []
+        for position, sku in enumerate(skus):
+            sku_text = str(sku)
+            sku_match = SKU_WAVELENGTH_PATTERN.match(sku_text)
+            if not sku_match:
+                continue
+            sku_device_part = SKU_DEVICE_PATTERN.search(sku_text)
+            specificity = len(sku_device_part.group()) if sku_device_part else 0
+            self.entries.append((float(sku_match.group(1)), specificity, sku, position))
+        self.buckets = {}
+        self.memo = {}
+
+    @classmethod
+    def from_template(cls, template_path):
+        return cls(load_key_table(template_path)["skus"])
+
+    def _bucket(self, device_type):
+        """SKUs containing device_type, sorted by wavelength, plus their wavelengths for bisect."""
+        if device_type not in self.buckets:
+            entries = sorted((e for e in self.entries if device_type in str(e[2])), key=lambda e: (e[0], e[3]))
+            self.buckets[device_type] = (entries, [e[0] for e in entries])
+        return self.buckets[device_type]
+
+    def resolve(self, wavelength, device_type):
+        """Return (best SKU or None, number of matching SKUs); memoized per (wavelength, type)."""
+        key = (wavelength, device_type)
+        if key not in self.memo:
+            entries, wavelengths = self._bucket(device_type)
+            # Widen the bisect window slightly, then apply the exact test the original loop used
+            lo = bisect.bisect_left(wavelengths, wavelength - WAVELENGTH_WINDOW_NM - 1e-9)
+            hi = bisect.bisect_right(wavelengths, wavelength + WAVELENGTH_WINDOW_NM + 1e-9)
+            candidates = [(abs(w - wavelength), -specificity, len(sku), position, sku)
+                          for w, specificity, sku, position in entries[lo:hi]
+                          if abs(w - wavelength) <= WAVELENGTH_WINDOW_NM]
+            self.memo[key] = (min(candidates)[4] if candidates else None, len(candidates))
+        return self.memo[key]
+
+    def resolve_batch(self, lot_ids):
+        """
+        Resolve many Lot_IDs in one pass: each distinct (wavelength, type) is searched once.
+        Returns {lot_id: (wavelength, device type, best SKU or None, number of matches)}; Lot_IDs
+        that cannot be parsed map to None.
+        """
+        results = {}
+        for lot_id in dict.fromkeys(lot_ids):
+            parsed = parse_lot_id(lot_id)
+            results[lot_id] = (parsed + self.resolve(*parsed)) if parsed else None
+        return results
@@ -0,0 +1,160 @@
+import sys
+import argparse
+
+import numpy as np
+
+from MeasurementParser import parse_measurement_lines
+from SkuResolver import load_key_table
+
+# -------------------------
+# NumPy port of the "snl" sheet calculation chain
+# -------------------------
+# The Excel template recomputes "snl" after every paste just so Part2 can read the CHART BOUNDS
+# block (D7:E13) and the chart series. The same values are computed here from the parsed raw
+# files and the SKU's Key sheet row:
+#   B8      MATCH(TRUE, ABS(row 103 - Output_max/1000) <= 0.008, 0)
+#   D7:E7   SMSR-Current     MAX(ROUND(E7-0.06,2), ROUND(A69,2))  /  ROUND(INDEX(102,B8),3)+0.01
+#   D8:E8   LIV-OutputPower  Output_min/1000                     /  ROUND(INDEX(103,B8)+0.02,2)
+#   D9:E9   LIV-Voltage      ROUND(A104-0.2,1)                   /  ROUND(INDEX(104,B8)+0.2,1)
+#   D10:E10 SMSR             SMSR_min                            /  SMSR_max
+#   D11:E11 LIV-Wavelength   ROUND(Wave_min,1)                   /  ROUND(Wave_max,1)
+#   D12:E12 LIV-Current      0                                   /  E7+0.02
+#   D13:E13 SMSR-Wavelength  D11                                 /  E11
+#   L3:L5   series names     CONCAT(temperature, " C")
+#   74:76   SMSR series      rows 70:72 + 5
+
+# Rows of the "snl" sheet where each raw file is pasted
+WAVE_START_ROW = 17
+SMSR_START_ROW = 46
+LIV_START_ROW = 79
+
+def load_key_rows(template_path):
+    """Load the Key sheet of the Excel template as {SKU: row dict} (from the compiled Key sheet cache)."""
+    return load_key_table(template_path)["rows"]
+
+def excel_round(values, digits):
+    """Vectorized ROUND() as Excel does it: half away from zero, ignoring binary noise."""
+    values = np.asarray(values, dtype=np.float64)
+    factor = 10.0 ** digits
+    # Round the scaled value to 8 places first so 2.675*100 = 267.49999999999997 rounds up like Excel
+    rounded = np.floor(np.round(np.abs(values) * factor, 8) + 0.5) / factor
+    return np.copysign(rounded, values)
+
+def _as_arrays(block):
+    return np.asarray(block["currents"], dtype=np.float64), np.atleast_2d(np.asarray(block["rows"], dtype=np.float64))
+
+def compute_snl(wave, smsr, liv, key_row):
+    """
+    Compute the derived "snl" values for one device.
+    Returns a dict with bounds ({row: (Min Spec, Max Spec)} for rows 7-13), labels, series and liv_column.
+    """
+    wave_currents, wave_rows = _as_arrays(wave)
+    smsr_currents, smsr_rows = _as_arrays(smsr)
+    liv_currents, liv_rows = _as_arrays(liv)
+    power, voltage = liv_rows[0], liv_rows[1]
+
+    # B8: first LIV point within 8 mW of the SKU's maximum output power
+    target = key_row["Output_max"] / 1000
+    within = np.flatnonzero(np.abs(power - target) <= 0.008)
+    if within.size == 0:
+        raise ValueError(f"No LIV point within 8 mW of Output_max {target} W (Excel shows #N/A)")
+    column = int(within[0])
+
+    e7 = float(excel_round(liv_currents[column], 3)) + 0.01
+    d7 = max(float(excel_round(e7 - 0.06, 2)), float(excel_round(smsr_currents[0], 2)))
+    wave_min, wave_max = (float(v) for v in excel_round([key_row["Wave_min"], key_row["Wave_max"]], 1))
+
+    bounds = {
+        7: (d7, e7),
+        8: (key_row["Output_min"] / 1000, float(excel_round(power[column] + 0.02, 2))),
+        9: (float(excel_round(voltage[0] - 0.2, 1)), float(excel_round(voltage[column] + 0.2, 1))),
+        10: (key_row["SMSR_min"], key_row["SMSR_max"]),
+        11: (wave_min, wave_max),
+        12: (0, e7 + 0.02),
+        13: (wave_min, wave_max),
+    }
+
+    return {
+        "bounds": bounds,
+        "labels": [f"{t:g} C" for t in wave["temperatures"]],
+        "series": {
+            "wavelength": (wave_currents, wave_rows),   # rows 40 / 41-43
+            "smsr": (smsr_currents, smsr_rows + 5),     # rows 69 / 74-76
+            "power": (liv_currents, power),             # rows 102 / 103
+            "voltage": (liv_currents, voltage),         # rows 102 / 104
+        },
+        "liv_column": column + 1,  # 1-based, as MATCH returns it
+    }
+
+def compare_bounds(expected, computed, tolerance=1e-9):
+    """Compare CHART BOUNDS blocks. Returns a list of mismatch descriptions (empty when equal)."""
+    mismatches = []
+    for row in range(7, 14):
+        for col, label in ((0, "D"), (1, "E")):
+            want = expected[row][col]
+            got = computed[row][col]
+            if want is None or got is None or abs(float(want) - float(got)) > tolerance:
+                mismatches.append(f"{label}{row}: Excel={want} NumPy={got}")
+    return mismatches
+
+# -------------------------
+# CROSS-CHECK AGAINST THE TEMPLATE
+# -------------------------
+def _sheet_block(ws, start_row):
+    """Rebuild the tokenized raw file lines pasted at start_row from the sheet's cached values."""
+    lines = []
+    seen_data = False
+    for row in ws.iter_rows(min_row=start_row, values_only=True):
+        tokens = [str(v) for v in row if v is not None]
+        if seen_data and not tokens:
+            break
+        seen_data = seen_data or tokens == ["data"]
+        lines.append(tokens)
+    return parse_measurement_lines(lines, f"snl row {start_row}")
+
+def cross_check(template_path):
+    """
+    Recompute "snl" from the data saved in the template and compare it with Excel's cached values.
+    Returns True when everything matches.
+    """
+    import openpyxl
+
+    wb = openpyxl.load_workbook(template_path, data_only=True, read_only=False)
+    ws = wb["snl"]
+    sku = str(ws["B1"].value).strip()
+    key_rows = load_key_rows(template_path)
+
+    result = compute_snl(_sheet_block(ws, WAVE_START_ROW), _sheet_block(ws, SMSR_START_ROW),
+                         _sheet_block(ws, LIV_START_ROW), key_rows[sku])
+
+    expected = {row: (ws.cell(row, 4).value, ws.cell(row, 5).value) for row in range(7, 14)}
+    mismatches = compare_bounds(expected, result["bounds"])
+
+    if ws["B8"].value != result["liv_column"]:
+        mismatches.append(f"B8: Excel={ws['B8'].value} NumPy={result['liv_column']}")
+
+    for i, label in enumerate(result["labels"]):
+        if ws.cell(3 + i, 12).value != label:
+            mismatches.append(f"L{3 + i}: Excel={ws.cell(3 + i, 12).value!r} NumPy={label!r}")
+
+    smsr_currents, smsr_series = result["series"]["smsr"]
+    cached = np.array([[ws.cell(74 + i, 1 + j).value for j in range(smsr_series.shape[1])] for i in range(smsr_series.shape[0])], dtype=np.float64)
+    if not np.allclose(cached, smsr_series):
+        mismatches.append("rows 74-76: SMSR series differs")
+
+    print(f"Cross-check of {template_path} (SKU {sku}):")
+    for row, (lo, hi) in result["bounds"].items():
+        print(f"  Row {row}: {lo} to {hi}")
+    if mismatches:
+        for mismatch in mismatches:
+            print(f"  MISMATCH {mismatch}")
+    else:
+        print("  All values match Excel's cached results.")
+    return not mismatches
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="NumPy port of the 'snl' sheet calculations")
+    parser.add_argument("--cross-check", metavar="TEMPLATE", required=True,
+                        help="compare against the values cached in an Excel graph template")
+    args = parser.parse_args()
+    sys.exit(0 if cross_check(args.cross_check) else 1)
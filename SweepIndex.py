@@ -0,0 +1,207 @@
+import os
+import sys
+import json
+import mmap
+import tempfile
+import threading
+import argparse
+
+from MeasurementParser import find_data_line
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+SWEEP_INDEX_FILENAME = "sweep_index.json"
+SWEEP_INDEX_VERSION = 1
+
+# Serialises the read-merge-replace of writers in this process (other processes re-read too)
+_save_lock = threading.Lock()
+
+# -------------------------
+# SWEEP SECTIONS
+# -------------------------
+# The test station appends a new sweep (header phrase, header lines, "data", numbers) to the same
+# raw file when a measurement is repeated. Instead of cutting the earlier sweeps off, every sweep is
+# located once and the offsets are kept in a sidecar index, so readers seek straight to the sweep
+# they want and the raw files stay as the station wrote them.
+#
+# One entry per raw file:
+#   size, mtime_ns     the file the entry describes (a changed file is rescanned, never misread)
+#   phrase, count      sweep header phrase and how many times it occurs
+#   sweeps             one per header, in file order (empty when the file holds a single sweep):
+#     offset, line       byte offset and 0-based line of the header line
+#     end, end_line      where the next sweep (or the end of the file) starts
+#     data, data_line    the "data" line, or None for a sweep cut off before its numbers
+#     blocks             per temperature: {temperature, offset, line, rows} of its rows
+#                        (one row for WLT files, power and voltage rows for LIV)
+
+def file_stamp(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _temperature_blocks(mm, data_pos, end, line):
+    """Per-temperature row offsets of one sweep's numbers, or [] if they are cut off or malformed."""
+    def next_line(pos):
+        line_end = mm.find(b"\n", pos, end)
+        return mm[pos:line_end if line_end >= 0 else end], (line_end + 1 if line_end >= 0 else end)
+
+    try:
+        pos = mm.find(b"\n", data_pos, end) + 1
+        if pos <= 0:
+            return []
+        counts, pos = next_line(pos)
+        num_temps, num_currents = (int(float(value)) for value in counts.split()[:2])
+        temperatures_line, pos = next_line(pos)
+        temperatures = [float(value) for value in temperatures_line.split()[:num_temps]]
+        _, pos = next_line(pos)
+        line += 4
+        rows = []
+        while pos < end:
+            row, row_end = next_line(pos)
+            if len(row.split()) != num_currents:
+                break
+            rows.append((pos, line))
+            pos, line = row_end, line + 1
+    except ValueError:
+        return []
+    if not temperatures or not rows:
+        return []
+    per_temperature = max(1, len(rows) // len(temperatures))
+    return [{"temperature": temperature, "offset": rows[i * per_temperature][0], "line": rows[i * per_temperature][1],
+             "rows": per_temperature}
+            for i, temperature in enumerate(temperatures) if i * per_temperature < len(rows)]
+
+def scan_sweeps(file_path, phrase):
+    """Locate every sweep section of one raw file (one pass over a memory map). Returns its index entry."""
+    size, mtime_ns = file_stamp(file_path)
+    entry = {"size": size, "mtime_ns": mtime_ns, "phrase": phrase, "count": 0, "sweeps": []}
+    if size == 0:
+        return entry
+
+    needle = phrase.encode("utf-8")
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        starts = []
+        pos = mm.find(needle)
+        while pos >= 0:
+            starts.append(mm.rfind(b"\n", 0, pos) + 1)
+            line_end = mm.find(b"\n", pos + len(needle))
+            if line_end < 0:
+                break
+            pos = mm.find(needle, line_end)
+        entry["count"] = len(starts)
+        if len(starts) <= 1:
+            return entry
+
+        line = mm[:starts[0]].count(b"\n")
+        for start, end in zip(starts, starts[1:] + [size]):
+            end_line = line + mm[start:end].count(b"\n")
+            data_pos = find_data_line(mm, end)
+            sweep = {"offset": start, "line": line, "end": end, "end_line": end_line, "data": None, "data_line": None,
+                     "blocks": []}
+            if data_pos >= start:
+                sweep["data"] = data_pos
+                sweep["data_line"] = line + mm[start:data_pos].count(b"\n")
+                sweep["blocks"] = _temperature_blocks(mm, data_pos, end, sweep["data_line"])
+            entry["sweeps"].append(sweep)
+            line = end_line
+    return entry
+
+def select_sweep(entry, which=-1):
+    """The chosen sweep of an entry (-1: the latest, 0: the first, ...); None for a single-sweep file."""
+    if entry["count"] <= 1 or not entry["sweeps"]:
+        return None
+    return entry["sweeps"][which]
+
+def read_sweep(file_path, sweep):
+    """The bytes of one sweep section, read with a single seek."""
+    with open(file_path, "rb") as f:
+        f.seek(sweep["offset"])
+        return f.read(sweep["end"] - sweep["offset"])
+
+# -------------------------
+# INDEX LOAD / SAVE / LOOKUP
+# -------------------------
+def index_path_for(folder):
+    """The sidecar lives next to the folder it describes, like the device file index."""
+    return os.path.join(os.path.dirname(os.path.abspath(folder)), SWEEP_INDEX_FILENAME)
+
+def load_sweep_index(folder, index_path=None):
+    """{filename: entry} for the folder's raw files; empty when the sidecar is missing or unreadable."""
+    try:
+        with open(index_path or index_path_for(folder), "r", encoding="utf-8") as f:
+            payload = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if payload.get("version") != SWEEP_INDEX_VERSION or payload.get("folder") != os.path.abspath(folder):
+        return {}
+    return payload.get("files", {})
+
+def save_sweep_index(index, folder, index_path=None):
+    """
+    Merge {filename: entry} into the folder's sidecar and write it back. The entries on disk are
+    re-read just before the replace, so files another writer indexed meanwhile are kept.
+    """
+    index_path = index_path or index_path_for(folder)
+    # A unique temp file per writer: two processes saving at once must not share one
+    fd, tmp_path = tempfile.mkstemp(prefix=".sweep_index_", suffix=".tmp", dir=os.path.dirname(index_path) or ".")
+    try:
+        with _save_lock:
+            files = load_sweep_index(folder, index_path)
+            files.update(index)
+            payload = {"version": SWEEP_INDEX_VERSION, "folder": os.path.abspath(folder), "files": files}
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(payload, f)
+            os.replace(tmp_path, index_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return index_path
+
+def single_sweep_entry(file_path, phrase, count):
+    """Entry for a file already known (e.g. from the copy) to hold at most one sweep - no scan needed."""
+    size, mtime_ns = file_stamp(file_path)
+    return {"size": size, "mtime_ns": mtime_ns, "phrase": phrase, "count": count, "sweeps": []}
+
+def sweep_for(index, file_path, phrase, which=-1):
+    """
+    The sweep of file_path to read, or None when the whole file is one sweep. A file that is not
+    in the index or changed since it was indexed is scanned here (the index itself is not rewritten).
+    """
+    entry = index.get(os.path.basename(file_path))
+    if entry is None or (entry["size"], entry["mtime_ns"]) != file_stamp(file_path) or entry["phrase"] != phrase:
+        entry = scan_sweeps(file_path, phrase)
+    return select_sweep(entry, which)
+
+# -------------------------
+# CLI
+# -------------------------
+def main(argv=None):
+    from CountandFixtxtfiles import phrase_for
+
+    parser = argparse.ArgumentParser(description="List the sweep sections of raw measurement files")
+    parser.add_argument("path", help="a raw .txt file, or a folder of them")
+    parser.add_argument("--extract", type=int, metavar="N",
+                        help="file only: write sweep N (0 = first, -1 = latest) to stdout")
+    args = parser.parse_args(argv)
+
+    paths = [args.path] if os.path.isfile(args.path) else \
+        [os.path.join(args.path, name) for name in sorted(os.listdir(args.path)) if name.endswith(".txt")]
+    for path in paths:
+        match = phrase_for(os.path.basename(path))
+        if match is None:
+            continue
+        entry = scan_sweeps(path, match[1])
+        if args.extract is not None:
+            sweep = select_sweep(entry, args.extract)
+            sys.stdout.buffer.write(read_sweep(path, sweep) if sweep else open(path, "rb").read())
+            return
+        print(f"{os.path.basename(path)}: {entry['count']} sweep(s)")
+        for number, sweep in enumerate(entry["sweeps"]):
+            state = f"data at line {sweep['data_line'] + 1}" if sweep["data"] is not None else "no data (cut off)"
+            temperatures = ", ".join(f"{block['temperature']:g} C @ line {block['line'] + 1}" for block in sweep["blocks"])
+            print(f"  {number}: lines {sweep['line'] + 1}-{sweep['end_line']}, bytes {sweep['offset']}-{sweep['end']}, "
+                  f"{state}" + (f"; {temperatures}" if temperatures else ""))
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
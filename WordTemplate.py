@@ -0,0 +1,368 @@
+import io
+import os
+import re
+import sys
+import time
+import struct
+import zipfile
+import argparse
+from xml.sax.saxutils import escape
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+# Text placeholders in the Word template and the image slots (whole paragraphs replaced by a picture)
+TEXT_FIELDS = ["DEV-HERE", "SN-HERE", "SKU-HERE", "TODAYS-DATE"]
+IMAGE_SLOTS = ["LIV-IMAGE-HERE", "SMSR-IMAGE-HERE"]
+
+# Parts whose text is searched for placeholders (headers and footers included)
+STORY_PART_PATTERN = re.compile(r'^word/(document|header\d*|footer\d*|footnotes|endnotes)\.xml$')
+DOCUMENT_PART = "word/document.xml"
+DOCUMENT_RELS_PART = "word/_rels/document.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+
+EMU_PER_INCH = 914400
+IMAGE_RELATIONSHIP_TYPE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/image"
+
+# An empty paragraph or text node is written self-closing (<w:p .../>); (?<!/) keeps it from
+# opening a match that would run on through the next element's closing tag
+PARAGRAPH_PATTERN = re.compile(r'<w:p(?:\s[^>]*)?(?<!/)>.*?</w:p>', re.S)
+TEXT_NODE_PATTERN = re.compile(r'(<w:t(?:\s[^>]*)?(?<!/)>)(.*?)(</w:t>)', re.S)
+PARAGRAPH_PROPERTIES_PATTERN = re.compile(r'^(<w:p(?: [^>]*)?>)(<w:pPr>.*?</w:pPr>|<w:pPr/>)?', re.S)
+
+# -------------------------
+# PNG SIZE (as python-docx computes it)
+# -------------------------
+def png_size(data):
+    """(px_width, px_height, horz_dpi, vert_dpi) from a PNG's IHDR and pHYs chunks; dpi defaults to 72."""
+    if data[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError("Chart image is not a PNG")
+    px_width, px_height = struct.unpack(">II", data[16:24])
+    horz_dpi = vert_dpi = 72
+    pos = 8
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        if kind == b"pHYs":
+            x, y, unit = struct.unpack(">IIB", data[pos + 8:pos + 17])
+            if unit == 1:
+                horz_dpi = int(round(x * 0.0254)) if x else 72
+                vert_dpi = int(round(y * 0.0254)) if y else 72
+            break
+        if kind in (b"IDAT", b"IEND"):
+            break
+        pos += 12 + length
+    return px_width, px_height, horz_dpi, vert_dpi
+
+def picture_extent(data, width_inches):
+    """(cx, cy) in EMU for a picture scaled to width_inches, keeping its aspect ratio."""
+    px_width, px_height, horz_dpi, vert_dpi = png_size(data)
+    native_width = int(px_width / horz_dpi * EMU_PER_INCH)
+    native_height = int(px_height / vert_dpi * EMU_PER_INCH)
+    cx = int(width_inches * EMU_PER_INCH)
+    return cx, round(native_height * (cx / native_width))
+
+def inline_picture_run(shape_id, rel_id, name, cx, cy):
+    """A run holding one inline picture, the same markup python-docx's add_picture() writes."""
+    return (
+        '<w:r><w:drawing>'
+        '<wp:inline xmlns:wp="http://schemas.openxmlformats.org/drawingml/2006/wordprocessingDrawing">'
+        f'<wp:extent cx="{cx}" cy="{cy}"/>'
+        f'<wp:docPr id="{shape_id}" name="Picture {shape_id}"/>'
+        '<wp:cNvGraphicFramePr><a:graphicFrameLocks xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" noChangeAspect="1"/></wp:cNvGraphicFramePr>'
+        '<a:graphic xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+        '<a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        '<pic:pic xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        f'<pic:nvPicPr><pic:cNvPr id="0" name="{escape(name)}"/><pic:cNvPicPr/></pic:nvPicPr>'
+        f'<pic:blipFill><a:blip xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships" r:embed="{rel_id}"/>'
+        '<a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+        f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm><a:prstGeom prst="rect"/></pic:spPr>'
+        '</pic:pic></a:graphicData></a:graphic></wp:inline></w:drawing></w:r>'
+    )
+
+# -------------------------
+# TEMPLATE COMPILATION
+# -------------------------
+def merge_split_placeholders(paragraph, placeholders):
+    """
+    Word often splits a typed placeholder over several runs (spell check, edits, rsids).
+    Move every placeholder found in the paragraph's text into the first text node it starts in,
+    so it can be replaced as one piece.
+    """
+    nodes = list(TEXT_NODE_PATTERN.finditer(paragraph))
+    if len(nodes) < 2:
+        return paragraph
+    texts = [node.group(2) for node in nodes]
+    joined = "".join(texts)
+    if not any(p in joined for p in placeholders):
+        return paragraph
+
+    changed = False
+    for placeholder in placeholders:
+        search_from = 0
+        while True:
+            joined = "".join(texts)
+            start = joined.find(placeholder, search_from)
+            if start < 0:
+                break
+            end = start + len(placeholder)
+            search_from = end
+            # Locate the nodes holding the first and the last character
+            offsets = []
+            pos = 0
+            for text in texts:
+                offsets.append(pos)
+                pos += len(text)
+            first = next(i for i, text in enumerate(texts) if offsets[i] <= start < offsets[i] + len(text))
+            last = next(i for i, text in enumerate(texts) if offsets[i] < end <= offsets[i] + len(text))
+            if first == last:
+                continue
+            texts[first] = texts[first][:start - offsets[first]] + placeholder
+            for i in range(first + 1, last):
+                texts[i] = ""
+            texts[last] = texts[last][end - offsets[last]:]
+            changed = True
+
+    if not changed:
+        return paragraph
+    pieces = []
+    pos = 0
+    for node, text in zip(nodes, texts):
+        pieces.append(paragraph[pos:node.start()])
+        opening = node.group(1)
+        if text != node.group(2) and "xml:space" not in opening:
+            opening = opening[:-1] + ' xml:space="preserve">'
+        pieces.append(opening + text + node.group(3))
+        pos = node.end()
+    pieces.append(paragraph[pos:])
+    return "".join(pieces)
+
+def _split_fields(xml, names):
+    """Split XML text into a list of literal strings and ("field", name) markers."""
+    pattern = re.compile("|".join(re.escape(name) for name in names))
+    segments = []
+    pos = 0
+    for match in pattern.finditer(xml):
+        segments.append(xml[pos:match.start()])
+        segments.append(("field", match.group()))
+        pos = match.end()
+    segments.append(xml[pos:])
+    return segments
+
+class WordTemplate:
+    """
+    The datasheet Word template, compiled once: every zip entry is read into memory, split
+    placeholders are merged, and each story part is pre-split around its fields, so writing
+    a document is string joining plus one zip write, without parsing any XML.
+    """
+
+    def __init__(self, template_path):
+        self.template_path = template_path
+        self.entries = []       # (ZipInfo, bytes) in the template's order
+        self.story_parts = {}   # part name -> segments
+        self.image_slots = []   # slot names found in document.xml, in document order
+        self.next_shape_id = 1
+        self.next_rel_number = 1
+        self.next_media_number = 1
+        self.compile()
+
+    def compile(self):
+        with zipfile.ZipFile(self.template_path) as z:
+            self.entries = [(info, z.read(info.filename)) for info in z.infolist()]
+
+        names = {info.filename for info, _ in self.entries}
+        for info, data in self.entries:
+            if not STORY_PART_PATTERN.match(info.filename):
+                continue
+            xml = data.decode("utf-8")
+            slots = IMAGE_SLOTS if info.filename == DOCUMENT_PART else []
+            xml = PARAGRAPH_PATTERN.sub(lambda m: self._compile_paragraph(m.group(), slots), xml)
+            # Shape ids must be unique within the document (python-docx uses max(@id) + 1)
+            if info.filename == DOCUMENT_PART:
+                ids = [int(i) for i in re.findall(r'\sid="(\d+)"', xml)]
+                self.next_shape_id = max(ids) + 1 if ids else 1
+            self.story_parts[info.filename] = _split_fields(xml, TEXT_FIELDS + [f"{{{slot}}}" for slot in slots])
+
+        self.image_slots = [segment[1][1:-1] for segment in self.story_parts.get(DOCUMENT_PART, [])
+                            if isinstance(segment, tuple) and segment[1].startswith("{")]
+
+        rels = dict(self.entries_by_name())[DOCUMENT_RELS_PART].decode("utf-8")
+        rel_numbers = [int(n) for n in re.findall(r'Id="rId(\d+)"', rels)]
+        self.next_rel_number = max(rel_numbers) + 1 if rel_numbers else 1
+        media_numbers = [int(n) for n in re.findall(r'^word/media/image(\d+)\.\w+$', "\n".join(names), re.M)]
+        self.next_media_number = max(media_numbers) + 1 if media_numbers else 1
+        return self
+
+    def entries_by_name(self):
+        return [(info.filename, data) for info, data in self.entries]
+
+    def _compile_paragraph(self, paragraph, slots):
+        paragraph = merge_split_placeholders(paragraph, TEXT_FIELDS + slots)
+        for slot in slots:
+            if slot in paragraph:
+                # Like para.text = "" + add_run().add_picture(): keep the paragraph properties only
+                head = PARAGRAPH_PROPERTIES_PATTERN.match(paragraph)
+                return head.group(1) + (head.group(2) or "") + f"{{{slot}}}" + "</w:p>"
+        return paragraph
+
+    def render(self, fields, images, width_inches=6):
+        """
+        Build the output .docx in memory and return its bytes.
+        fields maps placeholders to text; images maps image slots to PNG bytes or file paths.
+        """
+        pictures = {}
+        new_media = []
+        new_rels = []
+        for i, slot in enumerate(self.image_slots):
+            data = images.get(slot)
+            if data is None:
+                continue
+            if not isinstance(data, (bytes, bytearray)):
+                with open(data, "rb") as f:
+                    data = f.read()
+            rel_id = f"rId{self.next_rel_number + i}"
+            media_name = f"image{self.next_media_number + i}.png"
+            cx, cy = picture_extent(data, width_inches)
+            pictures[f"{{{slot}}}"] = inline_picture_run(self.next_shape_id + i, rel_id, media_name, cx, cy)
+            new_media.append((f"word/media/{media_name}", data))
+            new_rels.append(f'<Relationship Id="{rel_id}" Type="{IMAGE_RELATIONSHIP_TYPE}" Target="media/{media_name}"/>')
+
+        values = {name: escape(str(value)) for name, value in fields.items()}
+        values.update(pictures)
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as out:
+            for info, data in self.entries:
+                name = info.filename
+                if name in self.story_parts:
+                    data = "".join(seg if isinstance(seg, str) else values.get(seg[1], "" if seg[1].startswith("{") else seg[1])
+                                   for seg in self.story_parts[name]).encode("utf-8")
+                elif name == DOCUMENT_RELS_PART and new_rels:
+                    data = data.replace(b"</Relationships>", "".join(new_rels).encode("utf-8") + b"</Relationships>")
+                elif name == CONTENT_TYPES_PART and new_media and b'Extension="png"' not in data:
+                    data = data.replace(b"<Default ", b'<Default Extension="png" ContentType="image/png"/><Default ', 1)
+                out.writestr(info, data)
+            for name, data in new_media:
+                # PNGs are already compressed
+                out.writestr(zipfile.ZipInfo(name, date_time=time.localtime()[:6]), data)
+        return buffer.getvalue()
+
+    def write(self, output_path, fields, images, width_inches=6):
+        """Write the output .docx; returns its size in bytes."""
+        data = self.render(fields, images, width_inches)
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, output_path)
+        return len(data)
+
+# Compiled templates per process, recompiled when the template file changes
+_templates = {}
+
+def load_word_template(template_path):
+    stat = os.stat(template_path)
+    key = os.path.abspath(template_path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _templates.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, WordTemplate(template_path))
+        _templates[key] = cached
+    return cached[1]
+
+# -------------------------
+# PARITY CHECK AGAINST python-docx
+# -------------------------
+def render_with_python_docx(template_path, output_path, fields, images, width_inches=6):
+    """The original per-device python-docx path (copy, parse, replace per run, add_picture, save)."""
+    import shutil
+    from docx import Document
+    from docx.shared import Inches
+
+    shutil.copyfile(template_path, output_path)
+    doc = Document(output_path)
+    paragraphs = list(doc.paragraphs)
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                paragraphs.extend(cell.paragraphs)
+    for para in paragraphs:
+        for search_text, replace_text in fields.items():
+            for run in para.runs:
+                run.text = run.text.replace(search_text, replace_text)
+    for para in doc.paragraphs:
+        for slot, image in images.items():
+            if slot in para.text:
+                para.text = ""
+                para.add_run().add_picture(image if isinstance(image, str) else io.BytesIO(image), width=Inches(width_inches))
+                break
+    doc.save(output_path)
+
+def describe_docx(path):
+    """Text of every paragraph (body, tables, headers, footers) and every inline picture's size and bytes."""
+    import hashlib
+    from docx import Document
+
+    doc = Document(path)
+    paragraphs = list(doc.paragraphs)
+    for table in doc.tables:
+        for row in table.rows:
+            for cell in row.cells:
+                paragraphs.extend(cell.paragraphs)
+    for section in doc.sections:
+        for part in (section.header, section.footer, section.first_page_header, section.first_page_footer):
+            paragraphs.extend(part.paragraphs)
+    pictures = []
+    for shape in doc.inline_shapes:
+        rel_id = shape._inline.graphic.graphicData.pic.blipFill.blip.embed
+        blob = doc.part.related_parts[rel_id].blob
+        pictures.append((shape.width, shape.height, hashlib.sha256(blob).hexdigest()))
+    return {"text": [p.text for p in paragraphs], "pictures": pictures}
+
+# The sample device both renderers are compared on (tests/test_word_template.py uses it too)
+SAMPLE_FIELDS = {"DEV-HERE": "16-66", "SN-HERE": "1066", "SKU-HERE": "780.241DBRH-CS", "TODAYS-DATE": "01/02/2025"}
+
+def parity_check(template_path, liv_image, smsr_image, repeat=50):
+    """Write one datasheet with python-docx and with the compiled template and compare them."""
+    import tempfile
+
+    fields = SAMPLE_FIELDS
+    images = {"LIV-IMAGE-HERE": liv_image, "SMSR-IMAGE-HERE": smsr_image}
+    with tempfile.TemporaryDirectory() as folder:
+        reference_path = os.path.join(folder, "python-docx.docx")
+        compiled_path = os.path.join(folder, "compiled.docx")
+
+        start = time.perf_counter()
+        render_with_python_docx(template_path, reference_path, fields, images)
+        reference_seconds = time.perf_counter() - start
+
+        template = WordTemplate(template_path)
+        template.write(compiled_path, fields, images)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            template.write(compiled_path, fields, images)
+        compiled_seconds = (time.perf_counter() - start) / repeat
+
+        expected, got = describe_docx(reference_path), describe_docx(compiled_path)
+
+    print(f"python-docx: {reference_seconds * 1000:.1f} ms per document")
+    print(f"compiled:    {compiled_seconds * 1000:.1f} ms per document (mean of {repeat})")
+    ok = True
+    for key in ("text", "pictures"):
+        if expected[key] != got[key]:
+            ok = False
+            print(f"MISMATCH in {key}:")
+            for a, b in zip(expected[key], got[key]):
+                if a != b:
+                    print(f"  python-docx={a!r}\n  compiled   ={b!r}")
+            if len(expected[key]) != len(got[key]):
+                print(f"  {len(expected[key])} vs {len(got[key])} items")
+    if ok:
+        print("Parity check passed: text and pictures match python-docx.")
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compiled Word datasheet template")
+    parser.add_argument("--parity-check", nargs=3, metavar=("TEMPLATE", "LIV_PNG", "SMSR_PNG"), required=True,
+                        help="compare the compiled renderer with python-docx on two chart images")
+    parser.add_argument("--repeat", type=int, default=50, help="documents written for the timing")
+    args = parser.parse_args()
+    sys.exit(0 if parity_check(*args.parity_check, repeat=args.repeat) else 1)
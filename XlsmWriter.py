@@ -0,0 +1,484 @@
+import io
+import os
+import re
+import math
+import sys
+import time
+import zlib
+import struct
+import zipfile
+import argparse
+from datetime import date
+from xml.sax.saxutils import escape
+
+from ExcelSession import BASELINE_CLEAR_RANGES
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+# The sheet the raw files and the SKU are pasted into (the same cells the Excel backend fills)
+SNL_SHEET_NAME = "snl"
+SKU_CELL = (1, 2)
+
+WORKBOOK_PART = "xl/workbook.xml"
+WORKBOOK_RELS_PART = "xl/_rels/workbook.xml.rels"
+CONTENT_TYPES_PART = "[Content_Types].xml"
+CALC_CHAIN_PART = "xl/calcChain.xml"
+
+# Patched parts are compressed at zlib's default level; every other part is copied still compressed
+COMPRESS_LEVEL = 6
+
+ROW_PATTERN = re.compile(r'<row r="(\d+)"[^>]*?(?:/>|>.*?</row>)', re.S)
+CELL_PATTERN = re.compile(r'<c r="([A-Z]+)(\d+)"([^>]*?)(?:/>|>(.*?)</c>)', re.S)
+STYLE_PATTERN = re.compile(r'\ss="(\d+)"')
+NUMBER_PATTERN = re.compile(r'^[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?$')
+DATE_PATTERN = re.compile(r'^(\d{1,2})/(\d{1,2})/(\d{4})$')
+TIME_PATTERN = re.compile(r'^(\d{1,2}):(\d{2})(?::(\d{2}))?$')
+EXCEL_EPOCH = date(1899, 12, 30)
+
+# Excel keeps 15 significant digits of a number; the parity check allows for that rounding
+NUMBER_FORMAT = ".15g"
+PARITY_REL_TOL = 1e-14
+
+# -------------------------
+# CELL REFERENCES AND VALUES
+# -------------------------
+def column_number(letters):
+    number = 0
+    for letter in letters:
+        number = number * 26 + ord(letter) - 64
+    return number
+
+def column_letters(number):
+    letters = ""
+    while number:
+        number, remainder = divmod(number - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+def parse_range(address):
+    """'A69:CB72' -> (first row, first column, last row, last column)."""
+    first, _, last = address.replace("$", "").partition(":")
+    first_match = re.match(r"([A-Z]+)(\d+)", first)
+    last_match = re.match(r"([A-Z]+)(\d+)", last or first)
+    return (int(first_match.group(2)), column_number(first_match.group(1)),
+            int(last_match.group(2)), column_number(last_match.group(1)))
+
+def header_value(token):
+    """
+    A header token as Excel stores it when the text is pasted through Range.Value: numbers and
+    US dates / times are converted (dates become serial numbers), everything else stays text.
+    """
+    if token == "":
+        return None
+    if NUMBER_PATTERN.match(token):
+        return float(token)
+    match = DATE_PATTERN.match(token)
+    if match:
+        month, day, year = (int(part) for part in match.groups())
+        try:
+            return float((date(year, month, day) - EXCEL_EPOCH).days)
+        except ValueError:
+            return token
+    match = TIME_PATTERN.match(token)
+    if match and int(match.group(1)) < 24 and int(match.group(2)) < 60:
+        seconds = int(match.group(1)) * 3600 + int(match.group(2)) * 60 + int(match.group(3) or 0)
+        return seconds / 86400
+    return token
+
+def cell_xml(ref, value, style):
+    """
+    One <c> element: numbers as numbers, text as an inline string (sharedStrings.xml is left alone).
+    Numbers keep 15 significant digits, what Excel stores for a value pasted through COM.
+    """
+    style = f' s="{style}"' if style is not None else ""
+    if isinstance(value, str):
+        return f'<c r="{ref}"{style} t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+    value = float(value)
+    if value != value or value in (float("inf"), float("-inf")):
+        return f'<c r="{ref}"{style}/>' if style else ""
+    text = format(value, NUMBER_FORMAT)
+    return f'<c r="{ref}"{style}><v>{text}</v></c>'
+
+def paste_cells(pastes, sku):
+    """
+    {row: {column: value}} of everything one device writes to the sheet: each parsed raw file at
+    its start row (like paste_text_file_fast) and the SKU. None clears a cell.
+    """
+    from MeasurementParser import excel_blocks
+
+    cells = {}
+    for start_row, block in pastes:
+        if block is None:
+            continue
+        for offset, rows in excel_blocks(block):
+            for i, values in enumerate(rows):
+                row = cells.setdefault(start_row + offset + i, {})
+                for j, value in enumerate(values):
+                    row[1 + j] = header_value(value) if isinstance(value, str) else value
+    cells.setdefault(SKU_CELL[0], {})[SKU_CELL[1]] = sku
+    return cells
+
+# -------------------------
+# RAW ZIP ENTRIES
+# -------------------------
+# The template's parts are kept as their compressed bytes, so an unchanged part (vbaProject.bin,
+# the 500 KB+ Key and catalog sheets, sharedStrings) is copied into each workbook byte for byte
+# without being inflated or deflated again.
+LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+END_RECORD = struct.Struct("<4s4H2LH")
+
+def dos_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+class ZipEntry:
+    """One stored part: its name, compression method, CRC and compressed bytes."""
+
+    def __init__(self, name, method, crc, size, data, date_time, flags=0, external_attr=0):
+        self.name = name.encode("utf-8")
+        self.method = method
+        self.crc = crc
+        self.size = size
+        self.data = data
+        self.date_time = date_time
+        # Sizes go in the local header, so no data descriptor (bit 3); bit 11 marks UTF-8 names
+        self.flags = (flags & ~0x08) | (0x800 if not name.isascii() else 0)
+        self.external_attr = external_attr
+
+    @classmethod
+    def compressed(cls, name, content, date_time):
+        compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, -15)
+        data = compressor.compress(content) + compressor.flush()
+        return cls(name, zipfile.ZIP_DEFLATED, zlib.crc32(content), len(content), data, date_time)
+
+    def local_record(self):
+        mod_time, mod_date = dos_time(self.date_time)
+        return LOCAL_HEADER.pack(b"PK\x03\x04", 20, self.flags, self.method, mod_time, mod_date, self.crc,
+                                 len(self.data), self.size, len(self.name), 0) + self.name + self.data
+
+    def central_record(self, offset):
+        mod_time, mod_date = dos_time(self.date_time)
+        return CENTRAL_HEADER.pack(b"PK\x01\x02", 20, 20, self.flags, self.method, mod_time, mod_date, self.crc,
+                                   len(self.data), self.size, len(self.name), 0, 0, 0, 0, self.external_attr,
+                                   offset) + self.name
+
+def read_raw_entries(path):
+    """[(ZipInfo, ZipEntry)] of a package in its own order, with each part still compressed."""
+    entries = []
+    with zipfile.ZipFile(path) as z, open(path, "rb") as f:
+        for info in z.infolist():
+            f.seek(info.header_offset)
+            header = f.read(LOCAL_HEADER.size)
+            name_length, extra_length = struct.unpack("<2H", header[26:30])
+            f.seek(info.header_offset + LOCAL_HEADER.size + name_length + extra_length)
+            data = f.read(info.compress_size)
+            entries.append((info, ZipEntry(info.filename, info.compress_type, info.CRC, info.file_size, data,
+                                           info.date_time, info.flag_bits, info.external_attr)))
+    return entries
+
+def write_zip(out, entries):
+    """Write ZipEntry objects as a complete zip file to a binary stream."""
+    offsets = []
+    position = 0
+    for entry in entries:
+        offsets.append(position)
+        record = entry.local_record()
+        out.write(record)
+        position += len(record)
+    directory = b"".join(entry.central_record(offset) for entry, offset in zip(entries, offsets))
+    out.write(directory)
+    out.write(END_RECORD.pack(b"PK\x05\x06", 0, 0, len(entries), len(entries), len(directory), position, 0))
+
+# -------------------------
+# TEMPLATE COMPILATION
+# -------------------------
+class XlsmTemplate:
+    """
+    The graph template, split once: every part is kept compressed, and the "snl" sheet XML is
+    pre-split into its rows, so writing a device's workbook rewrites only the rows the device
+    pastes into (and B1), copies every other row and part unchanged, and flags the workbook for
+    a full recalculation when Excel opens it. The VBA project is never touched.
+    """
+
+    def __init__(self, template_path):
+        self.template_path = template_path
+        self.entries = []           # (part name, ZipEntry) in the template's order
+        self.sheet_part = None
+        self.sheet_head = ""        # up to and including <sheetData>, without the <dimension> ref
+        self.sheet_tail = ""        # from </sheetData> on
+        self.rows = []              # (row number, row XML) in sheet order
+        self.row_cells = {}         # row number -> (opening tag, {column: (ref, attributes, cell XML)})
+        self.dimension = None       # (last row, last column) of the template sheet
+        self.calc_chain = False
+        self.parts = {}             # workbook.xml, its rels and [Content_Types].xml, decoded
+        self.compile()
+
+    def compile(self):
+        raw = read_raw_entries(self.template_path)
+        self.entries = [(info.filename, entry) for info, entry in raw]
+        with zipfile.ZipFile(self.template_path) as z:
+            for name in (WORKBOOK_PART, WORKBOOK_RELS_PART, CONTENT_TYPES_PART):
+                self.parts[name] = z.read(name).decode("utf-8")
+            self.sheet_part = self._sheet_part(SNL_SHEET_NAME)
+            sheet = z.read(self.sheet_part).decode("utf-8")
+        self.calc_chain = any(name == CALC_CHAIN_PART for name, _ in self.entries)
+
+        data_start = sheet.index("<sheetData>") + len("<sheetData>") if "<sheetData>" in sheet else None
+        if data_start is None:
+            # An empty sheet: rows are added where the empty element was
+            data_start = sheet.index("<sheetData/>")
+            sheet = sheet[:data_start] + "<sheetData></sheetData>" + sheet[data_start + len("<sheetData/>"):]
+            data_start += len("<sheetData>")
+        data_end = sheet.index("</sheetData>")
+        self.sheet_head, self.sheet_tail = sheet[:data_start], sheet[data_end:]
+        self.rows = [(int(match.group(1)), match.group()) for match in ROW_PATTERN.finditer(sheet, data_start, data_end)]
+
+        last_row = last_column = 1
+        for number, xml in self.rows:
+            opening = xml[:xml.index(">") + 1]
+            if opening.endswith("/>"):
+                opening = opening[:-2] + ">"
+            cells = {}
+            for match in CELL_PATTERN.finditer(xml):
+                column = column_number(match.group(1))
+                cells[column] = (match.group(1) + match.group(2), match.group(3), match.group())
+                last_column = max(last_column, column)
+            self.row_cells[number] = (opening, cells)
+            last_row = max(last_row, number)
+        self.dimension = (last_row, last_column)
+        return self
+
+    def _sheet_part(self, sheet_name):
+        """Part name of a worksheet, looked up through workbook.xml and its relationships."""
+        match = re.search(rf'<sheet [^>]*name="{re.escape(sheet_name)}"[^>]*r:id="(rId\d+)"', self.parts[WORKBOOK_PART])
+        if match is None:
+            raise KeyError(f'Sheet "{sheet_name}" not found in {os.path.basename(self.template_path)}')
+        target = re.search(rf'<Relationship [^>]*Id="{match.group(1)}"[^>]*/>', self.parts[WORKBOOK_RELS_PART])
+        return "xl/" + re.search(r'Target="/?(?:xl/)?([^"]+)"', target.group()).group(1)
+
+    # -------------------------
+    # Sheet patching
+    # -------------------------
+    def _patched_row(self, number, values, cleared):
+        """
+        Row XML with values written and cleared columns emptied (their style kept, as ClearContents
+        does). Returns (XML, True if a formula cell was overwritten).
+        """
+        opening, cells = self.row_cells.get(number, (f'<row r="{number}">', {}))
+        # The template's spans would no longer describe the row
+        opening = re.sub(r'\sspans="[^"]*"', "", opening)
+        overwritten_formula = False
+        pieces = []
+        for column in sorted(set(cells) | set(values) | set(cleared)):
+            ref, attributes, xml = cells.get(column, (f"{column_letters(column)}{number}", "", ""))
+            if column not in values and column not in cleared:
+                pieces.append(xml)
+                continue
+            if "<f" in xml:
+                if 't="shared"' in xml and " ref=" in xml:
+                    raise ValueError(f"{ref} holds a shared formula other cells use - it cannot be pasted over")
+                overwritten_formula = True
+            style = STYLE_PATTERN.search(attributes)
+            style = style.group(1) if style else None
+            value = values.get(column)
+            if value is None:
+                pieces.append(f'<c r="{ref}" s="{style}"/>' if style is not None else "")
+            else:
+                pieces.append(cell_xml(ref, value, style))
+        return opening + "".join(pieces) + "</row>", overwritten_formula
+
+    def patch_sheet(self, cells):
+        """The sheet XML with the baseline ranges cleared and cells written ({row: {column: value}})."""
+        cleared = {}
+        for address in BASELINE_CLEAR_RANGES:
+            first_row, first_column, last_row, last_column = parse_range(address)
+            for number in range(first_row, last_row + 1):
+                if number in self.row_cells or number in cells:
+                    cleared.setdefault(number, set()).update(range(first_column, last_column + 1))
+
+        touched = set(cells) | set(cleared)
+        template_rows = dict(self.rows)
+        pieces = []
+        overwritten_formula = False
+        for number in sorted(set(template_rows) | touched):
+            if number not in touched:
+                pieces.append(template_rows[number])
+                continue
+            xml, overwritten = self._patched_row(number, cells.get(number, {}), cleared.get(number, set()))
+            pieces.append(xml)
+            overwritten_formula |= overwritten
+
+        last_row = max([self.dimension[0]] + list(cells))
+        last_column = max([self.dimension[1]] + [max(row) for row in cells.values() if row])
+        head = re.sub(r'<dimension ref="[^"]*"/>', f'<dimension ref="A1:{column_letters(last_column)}{last_row}"/>',
+                      self.sheet_head, count=1)
+        return head + "".join(pieces) + self.sheet_tail, overwritten_formula
+
+    # -------------------------
+    # Workbook parts
+    # -------------------------
+    def _workbook_xml(self):
+        """workbook.xml with fullCalcOnLoad set, so Excel recalculates every formula on open."""
+        xml = self.parts[WORKBOOK_PART]
+        match = re.search(r"<calcPr\b[^>]*?/?>", xml)
+        if match is None:
+            anchor = xml.find("<extLst>") if "<extLst>" in xml else xml.index("</workbook>")
+            return xml[:anchor] + '<calcPr fullCalcOnLoad="1"/>' + xml[anchor:]
+        calc = re.sub(r'\sfullCalcOnLoad="[^"]*"', "", match.group())
+        calc = calc[:-2] + ' fullCalcOnLoad="1"/>' if calc.endswith("/>") else calc[:-1] + ' fullCalcOnLoad="1">'
+        return xml[:match.start()] + calc + xml[match.end():]
+
+    def render(self, sku, pastes):
+        """
+        Build one device's workbook in memory and return its bytes.
+        pastes is [(start row, parsed raw file or None)], as the Excel backend pastes them.
+        """
+        sheet, overwritten_formula = self.patch_sheet(paste_cells(pastes, sku))
+        # Excel rebuilds a missing calculation chain; one naming a cell that no longer holds a
+        # formula is reported as corrupt
+        drop_calc_chain = overwritten_formula and self.calc_chain
+        date_time = time.localtime()[:6]
+        patched = {self.sheet_part: sheet, WORKBOOK_PART: self._workbook_xml()}
+        if drop_calc_chain:
+            patched[WORKBOOK_RELS_PART] = re.sub(r'<Relationship [^>]*Target="/?(?:xl/)?calcChain\.xml"[^>]*/>', "",
+                                                 self.parts[WORKBOOK_RELS_PART])
+            patched[CONTENT_TYPES_PART] = re.sub(r'<Override [^>]*PartName="/xl/calcChain\.xml"[^>]*/>', "",
+                                                 self.parts[CONTENT_TYPES_PART])
+
+        entries = []
+        for name, entry in self.entries:
+            if name == CALC_CHAIN_PART and drop_calc_chain:
+                continue
+            if name in patched:
+                entry = ZipEntry.compressed(name, patched[name].encode("utf-8"), date_time)
+            entries.append(entry)
+        buffer = io.BytesIO()
+        write_zip(buffer, entries)
+        return buffer.getvalue()
+
+    def write(self, output_path, sku, pastes):
+        """Write one device's workbook; returns its size in bytes."""
+        data = self.render(sku, pastes)
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, output_path)
+        return len(data)
+
+# Compiled templates per process, recompiled when the template file changes
+_templates = {}
+
+def load_xlsm_template(template_path):
+    stat = os.stat(template_path)
+    key = os.path.abspath(template_path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    cached = _templates.get(key)
+    if cached is None or cached[0] != stamp:
+        cached = (stamp, XlsmTemplate(template_path))
+        _templates[key] = cached
+    return cached[1]
+
+# -------------------------
+# PARITY CHECK AGAINST openpyxl
+# -------------------------
+def render_with_openpyxl(template_path, output_path, sku, pastes):
+    """The same paste done cell by cell with openpyxl (load the whole template, write, save)."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(template_path, keep_vba=True)
+    sheet = workbook[SNL_SHEET_NAME]
+    for address in BASELINE_CLEAR_RANGES:
+        for row in sheet[address]:
+            for cell in row:
+                cell.value = None
+    for number, values in paste_cells(pastes, sku).items():
+        for column, value in values.items():
+            sheet.cell(number, column).value = value
+    workbook.save(output_path)
+
+def sheet_values(path):
+    """{(row, column): value} of the "snl" sheet; formulas as their text, empty strings as empty."""
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, keep_vba=True)
+    values = {}
+    for row in workbook[SNL_SHEET_NAME].iter_rows():
+        for cell in row:
+            value = cell.value
+            # Array formulas come back as objects; compare their formula text
+            value = getattr(value, "text", value)
+            if value is not None and value != "":
+                values[(cell.row, cell.column)] = value if isinstance(value, str) else float(value) \
+                    if isinstance(value, (int, float)) else str(value)
+    return values
+
+def same_value(expected, got):
+    """Equal text, or numbers equal to the 15 significant digits cell_xml writes."""
+    if isinstance(expected, float) and isinstance(got, float):
+        return math.isclose(expected, got, rel_tol=PARITY_REL_TOL, abs_tol=0.0)
+    return expected == got
+
+def parity_check(template_path, raw_files, sku, repeat=20):
+    """Write one workbook with openpyxl and with the split template and compare them."""
+    import tempfile
+    from MeasurementParser import parse_measurement_file
+    from Datasheet_Automation_Part2_FINAL_V3 import RAW_FILE_ROWS
+
+    pastes = [(start_row, parse_measurement_file(path)) for (_, start_row), path in zip(RAW_FILE_ROWS, raw_files)]
+    with tempfile.TemporaryDirectory() as folder:
+        reference_path = os.path.join(folder, "openpyxl.xlsm")
+        patched_path = os.path.join(folder, "patched.xlsm")
+
+        start = time.perf_counter()
+        render_with_openpyxl(template_path, reference_path, sku, pastes)
+        reference_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        template = XlsmTemplate(template_path)
+        compile_seconds = time.perf_counter() - start
+        template.write(patched_path, sku, pastes)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            template.write(patched_path, sku, pastes)
+        patched_seconds = (time.perf_counter() - start) / repeat
+
+        expected, got = sheet_values(reference_path), sheet_values(patched_path)
+        with zipfile.ZipFile(template_path) as original, zipfile.ZipFile(patched_path) as patched:
+            if patched.testzip() is not None:
+                print("ERROR: the written workbook fails its CRC check")
+                return False
+            changed = [name for name in original.namelist()
+                       if name not in patched.namelist() or original.read(name) != patched.read(name)]
+            workbook_xml = patched.read(WORKBOOK_PART).decode("utf-8")
+
+    print(f"openpyxl: {reference_seconds * 1000:.0f} ms per workbook")
+    print(f"patched:  {patched_seconds * 1000:.1f} ms per workbook (mean of {repeat}; template split once in "
+          f"{compile_seconds * 1000:.0f} ms)")
+    print(f"Parts rewritten: {', '.join(changed)}")
+    ok = True
+    mismatched = [key for key in sorted(set(expected) | set(got)) if not same_value(expected.get(key), got.get(key))]
+    if mismatched:
+        ok = False
+        for key in mismatched:
+            print(f"  MISMATCH {column_letters(key[1])}{key[0]}: openpyxl={expected.get(key)!r} patched={got.get(key)!r}")
+    allowed = {template.sheet_part, WORKBOOK_PART, WORKBOOK_RELS_PART, CONTENT_TYPES_PART, CALC_CHAIN_PART}
+    if set(changed) - allowed or "xl/vbaProject.bin" in changed:
+        ok = False
+        print(f"  Unexpected parts changed: {', '.join(sorted(set(changed) - allowed))}")
+    if 'fullCalcOnLoad="1"' not in workbook_xml:
+        ok = False
+        print("  fullCalcOnLoad is not set")
+    if ok:
+        print(f'Parity check passed: "{SNL_SHEET_NAME}" values match openpyxl (to 15 significant digits), every other part is byte-identical.')
+    return ok
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless per-device .xlsm writer for the graph template")
+    parser.add_argument("--parity-check", nargs=4, metavar=("TEMPLATE", "WLT_WAVE", "WLT_SMSR", "LIV"), required=True,
+                        help="compare the patched workbook with an openpyxl-written one for three raw files")
+    parser.add_argument("--sku", default="780.241DBRH-CS")
+    parser.add_argument("--repeat", type=int, default=20, help="workbooks written for the timing")
+    args = parser.parse_args()
+    sys.exit(0 if parity_check(args.parity_check[0], args.parity_check[1:], args.sku, args.repeat) else 1)
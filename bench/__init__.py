@@ -0,0 +1,9 @@
+"""
+Benchmark suite for the datasheet pipeline.
+
+    python -m bench.generate OUT_FOLDER --devices 100     synthetic raw data
+    python -m bench.run --devices 100 --baseline bench/baseline.json
+
+bench/baseline.json is a --devices 100 --no-memory run on a 1-CPU Linux machine (no Excel). Store
+a baseline on the machine you compare on (--save-baseline) before reading much into the changes.
+"""
@@ -0,0 +1,136 @@
+import os
+import random
+import argparse
+
+import numpy as np
+
+# -------------------------
+# SYNTHETIC RAW DATA
+# -------------------------
+# Files look like the test station's output: ~20 header lines, "data", the sweep counts,
+# temperatures, currents, then one row per temperature (Wave/SMSR) or power + voltage rows
+# and the fit results (LIV).
+
+# (wavelength, Lot_ID device type) pairs that resolve to SKUs in the graph template's Key sheet
+DEVICE_PROFILES = [(780, "DBRL"), (795, "DBRL"), (852, "DBRL"), (1064, "DBRL"), (780, "DBR"), (730, "DBR")]
+
+# Name formats parse_filename() handles: G11X_DryEtch, G2X and the generic "...X-<dev>" fallback
+NAME_FORMATS = ["dryetch", "g2x", "generic"]
+
+WAVE_CURRENTS = 37
+LIV_CURRENTS = 501
+TEMPERATURES = (15, 25, 35)
+JPEG_PLACEHOLDER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00\xff\xd9"
+
+def device_names(index, rng):
+    """(Lot_ID, Dev#, filename stem) for the index-th synthetic device, cycling the name formats."""
+    wavelength, device_type = DEVICE_PROFILES[index % len(DEVICE_PROFILES)]
+    name_format = NAME_FORMATS[index % len(NAME_FORMATS)]
+    lot_number = 1 + index // 200
+    dev_num = f"{10 + (index // 100) % 90}-{index % 100 + 1}"
+    if name_format == "dryetch":
+        lot_id = f"{wavelength}-{device_type}0515{lot_number:02d}B-G11X"
+        stem = f"{lot_id}_DryEtch-{dev_num}"
+    elif name_format == "g2x":
+        lot_id = f"{wavelength}-{device_type}0517{lot_number:02d}C-G2X"
+        stem = f"{lot_id}-{dev_num}"
+    else:
+        lot_id = f"{wavelength}-{device_type}0224{lot_number:02d}C-G4TX"
+        stem = f"{lot_id}-{dev_num}"
+    return lot_id, dev_num, stem
+
+def _header(title, lot_id, dev_num, rng, start_temperature, end_temperature, start_current, end_current, wavelength):
+    return [
+        title,
+        f"Lot id:{lot_id}",
+        f"Device number:{dev_num}",
+        "Wafer number:",
+        "Responsivity:0.008880000000000001",
+        f"Operator:{rng.choice(['LJ', 'Lv', 'CR'])}",
+        "Ridge Width:4.599999904632568",
+        f"Bar Width:{rng.choice([1500, 2000])}",
+        "07/18/2024 11:39:41 AM",
+        f"Start Temperature:{start_temperature}",
+        f"End Temperature:{end_temperature}",
+        f"Start Current:{start_current}",
+        f"End Current:{end_current}",
+        "DC-Pulse:DC",
+        "Pulse Width:0.0002",
+        "Pulse Delay:0.001000000047497451",
+        "Compliance:9",
+        f"Start Wavelength:{wavelength - 2}",
+        f"End Wavelength:{wavelength + 2}",
+        "",
+        "data",
+    ]
+
+def _row(values):
+    return "\t".join(repr(float(v)) for v in values)
+
+def liv_text(lot_id, dev_num, wavelength, rng, max_power=0.6):
+    """LIV sweep at 25 C reaching max_power, so every Output_max up to 600 mW has a point within 8 mW."""
+    threshold = rng.uniform(0.02, 0.06)
+    slope = rng.uniform(0.8, 1.0)
+    end_current = round(threshold + max_power / slope, 3)
+    currents = np.linspace(0.001, end_current, LIV_CURRENTS)
+    power = np.maximum(slope * (currents - threshold), 0) + 0.0005 + rng.gauss(0, 1e-5)
+    voltage = 1.3 + 2.0 * currents + 0.05 * np.log1p(currents * 100)
+    lines = _header("LIV Sweep vs Temperature", lot_id, dev_num, rng, 25, 25, 0.001, end_current, wavelength)
+    lines += ["1\t%d" % LIV_CURRENTS, "25", _row(currents), _row(power), _row(voltage)]
+    lines += [repr(threshold * 1000), repr(slope), repr(float(voltage[-1])), repr(rng.uniform(150, 250))]
+    return "\n".join(lines) + "\n"
+
+def wave_text(lot_id, dev_num, wavelength, rng):
+    currents = np.linspace(0.1, 0.28, WAVE_CURRENTS)
+    lines = _header("Peak Wavelength vs I &T", lot_id, f"{dev_num}-rd", rng, TEMPERATURES[0], TEMPERATURES[-1], 0.1, 0.28, wavelength)
+    lines += [f"{len(TEMPERATURES)}\t{WAVE_CURRENTS}", _row(TEMPERATURES), _row(currents)]
+    for temperature in TEMPERATURES:
+        lines.append(_row(wavelength + 0.06 * (temperature - 25) + 4.0 * (currents - 0.1) + rng.gauss(0, 0.01)))
+    return "\n".join(lines) + "\n"
+
+def smsr_text(lot_id, dev_num, wavelength, rng):
+    currents = np.linspace(0.1, 0.28, WAVE_CURRENTS)
+    lines = _header("SMSR vs I &T", lot_id, f"{dev_num}-rd", rng, TEMPERATURES[0], TEMPERATURES[-1], 0.1, 0.28, wavelength)
+    lines += [f"{len(TEMPERATURES)}\t{WAVE_CURRENTS}", _row(TEMPERATURES), _row(currents)]
+    for _ in TEMPERATURES:
+        lines.append(_row(np.clip(40 + 5 * np.sin(currents * 60) + rng.gauss(0, 1), 0, 50)))
+    return "\n".join(lines) + "\n"
+
+def generate(folder, devices=100, duplicate_rate=0.1, seed=1):
+    """
+    Write raw files for the given number of devices into folder (the "Paste Raw Data HERE" layout).
+    A duplicate_rate share of the .txt files gets an aborted earlier sweep in front, as the station
+    writes when a measurement is repeated. Returns [(Lot_ID, Dev#)].
+    """
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    generated = []
+    for index in range(devices):
+        lot_id, dev_num, stem = device_names(index, rng)
+        wavelength = DEVICE_PROFILES[index % len(DEVICE_PROFILES)][0]
+        files = {
+            f"{stem}_LIV_vs_Temp.txt": liv_text(lot_id, dev_num, wavelength, rng),
+            f"{stem}_WLT_Wave.txt": wave_text(lot_id, dev_num, wavelength, rng),
+            f"{stem}_WLT_SMSR.txt": smsr_text(lot_id, dev_num, wavelength, rng),
+        }
+        for filename, text in files.items():
+            if rng.random() < duplicate_rate:
+                # An earlier sweep cut off part way through the numbers
+                text = text[:len(text) // 2] + "\n" + text
+            with open(os.path.join(folder, filename), "w", newline="\n") as f:
+                f.write(text)
+        for filename in (f"{stem}_0.1500A_LIV_vs_Temp.jpg", f"{stem}_0.1500A_Wave-SMSR_vs_Temp.jpg"):
+            with open(os.path.join(folder, filename), "wb") as f:
+                f.write(JPEG_PLACEHOLDER)
+        generated.append((lot_id, dev_num))
+    return generated
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate synthetic raw measurement files")
+    parser.add_argument("folder", help="output folder (created if missing)")
+    parser.add_argument("--devices", type=int, default=100, help="number of devices (10 to 10,000)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="share of .txt files with a repeated sweep header")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    generated = generate(args.folder, args.devices, args.duplicate_rate, args.seed)
+    print(f"Generated {len(generated)} devices ({len(generated) * 5} files) in {args.folder}")
@@ -0,0 +1,253 @@
+import os
+import sys
+import json
+import time
+import shutil
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime
+from contextlib import redirect_stdout
+
+from bench.generate import generate
+
+# -------------------------
+# CONFIGURATION
+# -------------------------
+REPO_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_EXCEL_TEMPLATE = os.path.join(REPO_FOLDER, "Datasheet Graph Template 1.xlsm")
+DEFAULT_WORD_TEMPLATE = os.path.join(REPO_FOLDER, "Datasheet Template.docx")
+
+# A stage is reported as a regression when it is this much slower than the baseline
+REGRESSION_THRESHOLD = 0.20
+
+# Run settings that must match the baseline's for the stage times to be comparable
+# (tracemalloc alone slows Python-heavy stages several times over)
+COMPARABLE_META = ["devices", "render_sample", "duplicate_rate", "memory_tracked", "cpus"]
+
+class StageTimer:
+    """Times named stages (wall and CPU) and, optionally, their peak Python memory via tracemalloc."""
+
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.stages = {}
+
+    def run(self, name, function, *args, items=None, quiet=False, **kwargs):
+        """Time function(*args, **kwargs); quiet discards what the function prints, not the timing line."""
+        if self.track_memory:
+            tracemalloc.start()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            if quiet:
+                with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+                    result = function(*args, **kwargs)
+            else:
+                result = function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - wall_start
+            cpu_seconds = time.process_time() - cpu_start
+            peak = tracemalloc.get_traced_memory()[1] if self.track_memory else None
+            if self.track_memory:
+                tracemalloc.stop()
+        count = items(result) if callable(items) else items
+        self.stages[name] = {
+            "seconds": round(seconds, 6),
+            "cpu_seconds": round(cpu_seconds, 6),
+            "peak_bytes": peak,
+            "items": count,
+            "ms_per_item": round(seconds * 1000 / count, 4) if count else None,
+        }
+        print(f"  {name:14s} {seconds:8.3f} s" + (f"  ({count} items, {seconds * 1000 / count:.2f} ms each)" if count else "")
+              + (f"  peak {peak / 1e6:.1f} MB" if peak is not None else ""))
+        return result
+
+# -------------------------
+# STAGES
+# -------------------------
+def configure(work_folder, excel_template_path, word_template_path):
+    """Point Part1 / Part2 at the benchmark folders (their paths are module-level settings)."""
+    import DatasheetAutomationPart1FINAL as part1
+    import Datasheet_Automation_Part2_FINAL_V3 as part2
+
+    part1.source_folder = os.path.join(work_folder, "source")
+    part1.destination_folder = os.path.join(work_folder, "Script Output")
+    part1.liv_folder = os.path.join(part1.destination_folder, "LIV")
+    part1.smsr_folder = os.path.join(part1.destination_folder, "SMSR")
+    part1.other_folder = os.path.join(part1.destination_folder, "Other")
+    part1.sku_template_path = excel_template_path
+
+    part2.destination_folder = part1.destination_folder
+    part2.data_package_folder = os.path.join(part1.destination_folder, "Data Package")
+    part2.other_folder = part1.other_folder
+    part2.measurement_cache_folder = os.path.join(part1.destination_folder, "Measurement Cache")
+    part2.excel_template_path = excel_template_path
+    part2.word_template_path = word_template_path
+    os.makedirs(part2.data_package_folder, exist_ok=True)
+    return part1, part2
+
+def parse_names(liv_folder):
+    from DeviceFileIndex import parse_filename
+
+    devices = {}
+    for filename in sorted(os.listdir(liv_folder)):
+        if filename.endswith(".jpg"):
+            devices.setdefault(parse_filename(filename), filename)
+    return list(devices)
+
+def look_up_files(part2, device_keys):
+    from DeviceFileIndex import load_or_build_device_index
+
+    index = load_or_build_device_index(part2.other_folder)
+    return {key: part2.find_raw_files(index, *key) for key in device_keys}
+
+def parse_files(part2, raw_files, cache=None):
+    from SweepIndex import load_sweep_index
+
+    # Files with a repeated sweep are read at the latest sweep through the index the fix stage wrote
+    sweeps = load_sweep_index(part2.other_folder)
+    parsed = {key: part2.parse_raw_files(files, cache, sweeps) for key, files in raw_files.items()}
+    return {key: {phrase: block for phrase, block in blocks.items() if block is not None} for key, blocks in parsed.items()}
+
+def render_charts(part2, blocks, skus, key_rows, sample):
+    from SnlCalculation import compute_snl
+
+    charts = {}
+    for key in list(blocks)[:sample]:
+        sku = skus.get(key[0])
+        device_blocks = blocks[key]
+        if sku not in key_rows or len(device_blocks) < 3:
+            continue
+        snl = compute_snl(device_blocks["WLT_Wave"], device_blocks["WLT_SMSR"], device_blocks["LIV_vs_Temp"], key_rows[sku])
+        charts[key] = (sku, part2.export_charts_matplotlib(snl))
+    return charts
+
+def build_documents(part2, charts, date_text):
+    for (lot_id, dev_num), (sku, (liv_chart_png, smsr_chart_png)) in charts.items():
+        output_path = part2.output_path_for(dev_num, dev_num, sku)
+        part2.build_word_document(output_path, dev_num, dev_num, sku, liv_chart_png, smsr_chart_png, date_text)
+    return charts
+
+def run_benchmark(devices, work_folder, excel_template_path, word_template_path, render_sample=20,
+                  duplicate_rate=0.1, track_memory=True):
+    """Generate a batch, run every pipeline stage over it and return the results dict."""
+    import BuildManifest
+    from SkuResolver import SkuResolver, load_key_table
+
+    part1, part2 = configure(work_folder, excel_template_path, word_template_path)
+    timer = StageTimer(track_memory)
+
+    print(f"Benchmark: {devices} devices in {work_folder}")
+    timer.run("generate", generate, part1.source_folder, devices, duplicate_rate, items=devices)
+    fix_file_paths, header_counts = timer.run("ingest", part1.ingest_files, items=devices * 5, quiet=True)
+    device_keys = timer.run("filename_parse", parse_names, part1.liv_folder, items=len)
+    resolver = timer.run("sku_compile", SkuResolver.from_template, excel_template_path, items=1)
+    resolved = timer.run("sku_resolve", resolver.resolve_batch, [lot_id for lot_id, _ in device_keys], items=len(device_keys))
+    timer.run("fix", part1.run_fix_step, fix_file_paths, header_counts, items=len(fix_file_paths), quiet=True)
+    raw_files = timer.run("file_lookup", look_up_files, part2, device_keys, items=len)
+    count_blocks = lambda result: sum(len(b) for b in result.values())
+    blocks = timer.run("parse", parse_files, part2, raw_files, items=count_blocks)
+    # Cold: parse and store every block; warm: what a re-run reads instead of the text files
+    cache = part2.open_measurement_cache()
+    timer.run("cache_fill", parse_files, part2, raw_files, cache, items=count_blocks)
+    cache.save_stamps()
+    # A re-run starts without this process's in-memory file hashes
+    BuildManifest._hash_cache.clear()
+    cache = part2.open_measurement_cache()
+    timer.run("cache_warm", parse_files, part2, raw_files, cache, items=count_blocks)
+
+    key_rows = load_key_table(excel_template_path)["rows"]
+    skus = {lot_id: entry[2] for lot_id, entry in resolved.items() if entry}
+    charts = timer.run("render", render_charts, part2, blocks, skus, key_rows, render_sample, items=len, quiet=True)
+    timer.run("docx_build", build_documents, part2, charts, "01/01/2025", items=len, quiet=True)
+
+    return {
+        "meta": {
+            "devices": devices,
+            "render_sample": render_sample,
+            "duplicate_rate": duplicate_rate,
+            "memory_tracked": track_memory,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+        },
+        "stages": timer.stages,
+    }
+
+# -------------------------
+# BASELINE COMPARISON
+# -------------------------
+def compare_to_baseline(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """
+    Print per-stage changes against a baseline run. Returns the names of regressed stages.
+    Runs made with different COMPARABLE_META settings are not compared.
+    """
+    regressions = []
+    differences = [f"{key} {baseline['meta'].get(key)} -> {results['meta'].get(key)}" for key in COMPARABLE_META
+                   if baseline["meta"].get(key) != results["meta"].get(key)]
+    if differences:
+        print(f"Not compared with the baseline - the runs differ in: {', '.join(differences)}")
+        return regressions
+    print(f"Compared with baseline from {baseline['meta'].get('timestamp')} ({baseline['meta'].get('devices')} devices):")
+    for name, stage in results["stages"].items():
+        base = baseline["stages"].get(name)
+        if not base:
+            print(f"  {name:14s} (not in baseline)")
+            continue
+        # Per-item times compare runs of different sizes; totals are used for single-shot stages
+        key = "ms_per_item" if stage["ms_per_item"] is not None and base.get("ms_per_item") else "seconds"
+        if not base[key]:
+            continue
+        change = stage[key] / base[key] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(f"  {name:14s} {base[key]:10.4f} -> {stage[key]:10.4f} {key:12s} {change:+7.1%}{flag}")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the datasheet pipeline")
+    parser.add_argument("--devices", type=int, default=100, help="synthetic batch size (10 to 10,000)")
+    parser.add_argument("--render-sample", type=int, default=20, help="devices rendered and written as docx")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1)
+    parser.add_argument("--excel-template", default=DEFAULT_EXCEL_TEMPLATE)
+    parser.add_argument("--word-template", default=DEFAULT_WORD_TEMPLATE)
+    parser.add_argument("--work-folder", help="keep the generated batch here instead of a temp folder")
+    parser.add_argument("--no-memory", action="store_true", default=None,
+                        help="skip tracemalloc (it slows Python-heavy stages; default: as in --baseline)")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="compare with a stored results JSON")
+    parser.add_argument("--save-baseline", help="also store these results as the new baseline")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 when a stage regressed")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    if args.no_memory is not None:
+        track_memory = not args.no_memory
+    else:
+        track_memory = baseline["meta"].get("memory_tracked", True) if baseline else True
+
+    work_folder = args.work_folder or tempfile.mkdtemp(prefix="datasheet_bench_")
+    try:
+        results = run_benchmark(args.devices, work_folder, args.excel_template, args.word_template,
+                                args.render_sample, args.duplicate_rate, track_memory)
+    finally:
+        if not args.work_folder:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2)
+            print(f"Results written to {path}")
+
+    regressions = compare_to_baseline(results, baseline) if baseline else []
+    sys.exit(1 if regressions and args.fail_on_regression else 0)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
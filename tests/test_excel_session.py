@@ -0,0 +1,127 @@
+import os
+
+import pytest
+
+from ExcelSession import BASELINE_CLEAR_RANGES, FORMULA_RANGES, XL_CALCULATION_MANUAL, ExcelSession
+from FakeExcel import FakeAxis, FakeExcelApplication
+
+LIMITS = {
+    'primary_y': (778.7, 782.2, 0.5, 0.1),
+    'primary_x': (0.18, 0.255, 0.01, 0.002),
+    'secondary_y': (-50, 60, 10, 2),
+}
+
+@pytest.fixture
+def excel():
+    return FakeExcelApplication(calculating_polls=3)
+
+@pytest.fixture
+def session(excel):
+    session = ExcelSession(excel, "template.xlsm", poll_interval=0)
+    session.open()
+    yield session
+    session.close()
+
+def test_open_looks_up_charts_and_axes_once(excel, session):
+    assert excel.calls["Workbooks.Open"] == 1
+    assert excel.calls["Chart.Axes"] == 6
+    assert excel.Calculation == XL_CALCULATION_MANUAL
+    # Devices after the first reuse the cached axis objects
+    session.apply_axis_limits(1, LIMITS)
+    session.apply_axis_limits(2, LIMITS)
+    assert excel.calls["Chart.Axes"] == 6
+    assert excel.calls["Range.Formula.get"] == len(FORMULA_RANGES)
+
+def test_close_restores_calculation_mode(excel, session):
+    session.close()
+    assert excel.Calculation == -4105
+    assert excel.Workbooks.opened[0].closed
+    assert excel.calls["Application.Quit"] == 0
+
+def test_write_block_is_one_com_call(excel, session):
+    session.write_block(17, 1, [["Peak", "Wavelength", "nm"], [1.0, 2.0, 3.0]])
+    assert excel.calls["Range.Value"] == 1
+    assert session.sheet.cells[(18, 3)] == 3.0
+    assert session.dirty_ranges == ["$A$17:$C$18"]
+
+def test_write_block_skips_empty_data(excel, session):
+    assert session.write_block(17, 1, []) is None
+    assert session.write_block(17, 1, [[]]) is None
+    assert excel.calls["Range.Value"] == 0
+
+def test_reset_clears_baseline_and_dirty_ranges(excel, session):
+    session.write_block(17, 1, [[1.0, 2.0]])
+    session.set_cell(40, 2, 5.0)
+    session.set_cell(44, 2, 7.0)
+    session.reset()
+    assert excel.calls["Range.ClearContents"] == len(BASELINE_CLEAR_RANGES) + 1
+    assert session.sheet.cells == {(44, 2): 7.0}
+    assert session.dirty_ranges == []
+
+    # Nothing written since: only the baseline ranges are cleared
+    session.reset()
+    assert excel.calls["Range.ClearContents"] == 2 * len(BASELINE_CLEAR_RANGES) + 1
+
+def test_reset_leaves_formula_values_untracked(session):
+    session.write_values(74, 1, [[5.0, 6.0]])
+    session.reset()
+    assert session.sheet.cells[(74, 1)] == 5.0
+    assert session.overwritten_ranges == ["$A$74:$B$74"]
+
+def test_calculate_restores_overwritten_formulas():
+    excel = FakeExcelApplication(sheet_cells={"snl": {(74, 1): "=A75+5", (3, 12): "=B1"}})
+    session = ExcelSession(excel, "template.xlsm", poll_interval=0).open()
+    sheet = session.sheet
+
+    session.write_values(74, 1, [[5.0] * 60])
+    session.write_values(3, 12, [["label"]])
+    assert sheet.cells[(74, 55)] == 5.0
+    session.calculate()
+    assert sheet.cells[(74, 1)] == "=A75+5"
+    assert sheet.cells[(3, 12)] == "=B1"
+    # The NumPy block was wider than the formula range: the extra cells are cleared too
+    assert (74, 55) not in sheet.cells
+    assert session.overwritten_ranges == []
+    assert excel.calls["Range.Formula"] == len(FORMULA_RANGES)
+
+    # Nothing overwritten since: no formula writes
+    session.calculate()
+    assert excel.calls["Range.Formula"] == len(FORMULA_RANGES)
+    session.close()
+
+def test_calculate_waits_for_calculation_state(excel, session):
+    session.calculate()
+    assert excel.calls["Application.CalculateFull"] == 1
+    assert excel.calls["Application.CalculationState"] == 4
+
+def test_calculation_timeout(session):
+    session.excel.calculating_polls = 10 ** 9
+    session.calculation_timeout = 0
+    with pytest.raises(TimeoutError):
+        session.calculate()
+
+def test_unchanged_axis_limits_are_not_written_again(excel, session):
+    writes = session.apply_axis_limits(1, LIMITS, minor_ticks_outside=True)
+    assert writes == 3 * 4 + 2
+    axis_writes = sum(count for call, count in excel.calls.items() if call.startswith("Axis."))
+    assert axis_writes == writes
+
+    assert session.apply_axis_limits(1, LIMITS, minor_ticks_outside=True) == 0
+    assert sum(count for call, count in excel.calls.items() if call.startswith("Axis.")) == axis_writes
+
+    changed = dict(LIMITS, primary_y=(779.0, 782.2, 0.5, 0.1))
+    assert session.apply_axis_limits(1, changed) == 1
+
+def test_axis_maximum_moves_first_when_range_moves_up(monkeypatch, session):
+    session.apply_axis_limits(1, LIMITS)
+    order = []
+    original = FakeAxis.__setattr__
+    monkeypatch.setattr(FakeAxis, "__setattr__", lambda self, attr, value: (order.append(attr), original(self, attr, value)))
+    session.apply_axis_limits(1, dict(LIMITS, primary_y=(790.0, 795.0, 0.5, 0.1)))
+    assert order[:2] == ['MaximumScale', 'MinimumScale']
+
+def test_export_png_returns_bytes_and_removes_the_file(excel, session):
+    data = session.export_png(1)
+    assert data.startswith(b"\x89PNG")
+    assert excel.calls["Chart.Export"] == 1
+    assert os.listdir(session.export_folder) == []
@@ -0,0 +1,87 @@
+import io
+import os
+import re
+import zipfile
+
+import pytest
+from PIL import Image
+
+from WordTemplate import (DOCUMENT_PART, IMAGE_SLOTS, SAMPLE_FIELDS, TEXT_FIELDS, WordTemplate, describe_docx,
+                          load_word_template, render_with_python_docx)
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Datasheet Template.docx")
+
+def chart_png(width, height, color):
+    # Chart exports are 96 dpi images upscaled to 130%; two sizes and colours keep the slots apart
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+@pytest.fixture(scope="module")
+def images():
+    return {"LIV-IMAGE-HERE": chart_png(780, 585, (255, 255, 255)), "SMSR-IMAGE-HERE": chart_png(780, 520, (0, 90, 160))}
+
+@pytest.fixture(scope="module")
+def rendered(tmp_path_factory, images):
+    folder = tmp_path_factory.mktemp("datasheets")
+    reference_path = str(folder / "python-docx.docx")
+    compiled_path = str(folder / "compiled.docx")
+    render_with_python_docx(TEMPLATE_PATH, reference_path, SAMPLE_FIELDS, images)
+    WordTemplate(TEMPLATE_PATH).write(compiled_path, SAMPLE_FIELDS, images)
+    return describe_docx(reference_path), describe_docx(compiled_path)
+
+def test_text_matches_python_docx(rendered):
+    expected, got = rendered
+    assert got["text"] == expected["text"]
+
+def test_pictures_match_python_docx(rendered):
+    expected, got = rendered
+    assert len(got["pictures"]) == len(IMAGE_SLOTS)
+    assert got["pictures"] == expected["pictures"]
+
+def test_no_placeholder_is_left(rendered):
+    _, got = rendered
+    text = "\n".join(got["text"])
+    for placeholder in TEXT_FIELDS + IMAGE_SLOTS:
+        assert placeholder not in text
+    for value in SAMPLE_FIELDS.values():
+        assert value in text
+
+def test_image_paths_and_bytes_render_the_same(tmp_path, images):
+    paths = {}
+    for slot, data in images.items():
+        paths[slot] = str(tmp_path / f"{slot}.png")
+        with open(paths[slot], "wb") as f:
+            f.write(data)
+    template = WordTemplate(TEMPLATE_PATH)
+    assert template.render(SAMPLE_FIELDS, paths) == template.render(SAMPLE_FIELDS, images)
+
+def test_load_word_template_compiles_once(tmp_path):
+    path = str(tmp_path / "template.docx")
+    with open(TEMPLATE_PATH, "rb") as source, open(path, "wb") as f:
+        f.write(source.read())
+    template = load_word_template(path)
+    assert load_word_template(path) is template
+
+    # A changed template file is compiled again
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert load_word_template(path) is not template
+
+def test_self_closing_paragraphs_stay_separate(tmp_path, images):
+    # Word writes an empty paragraph as <w:p .../>; put one in front of every paragraph of the template
+    template_path = str(tmp_path / "template.docx")
+    with zipfile.ZipFile(TEMPLATE_PATH) as source, zipfile.ZipFile(template_path, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            data = source.read(info.filename)
+            if info.filename == DOCUMENT_PART:
+                data = re.sub(rb'(<w:p[ >])', rb'<w:p w:rsidR="00AB0001"/>\1', data)
+            target.writestr(info, data)
+
+    reference_path = str(tmp_path / "python-docx.docx")
+    compiled_path = str(tmp_path / "compiled.docx")
+    render_with_python_docx(template_path, reference_path, SAMPLE_FIELDS, images)
+    WordTemplate(template_path).write(compiled_path, SAMPLE_FIELDS, images)
+    expected, got = describe_docx(reference_path), describe_docx(compiled_path)
+    assert got["text"] == expected["text"]
+    assert got["pictures"] == expected["pictures"]